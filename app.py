@@ -6,15 +6,17 @@ import ssl_bootstrap  # noqa: F401  # Google API 接続前に SSL 証明書を
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import datetime, date, timedelta
 import uuid
+import hashlib
 import html
 import re
 from streamlit_calendar import calendar
 import jpholiday
 from database import (
     read_attendance_logs,
-    write_attendance_log,
+    write_attendance_logs,
     read_overtime_logs,
     write_overtime_log,
     update_overtime_log,
@@ -42,10 +44,12 @@ from utils import (
     calculate_duration_hours,
     calculate_day_equivalent,
     calculate_compensatory_balance,
+    calculate_compensatory_balances,
+    compensatory_balance_for,
     compensatory_days_to_hours,
     COMPENSATORY_LEAVE_EFFECTIVE_DATE,
     build_staff_full_day_leave_dates_from_logs,
-    japanese_business_calendar_dates_in_month,
+    AttendanceDayGrid,
 )
 from auth_cookie import (
     save_login_cookie,
@@ -96,18 +100,6 @@ SPECIAL_HOLIDAY_EVENT_TYPE = "special_holiday"
 SPECIAL_HOLIDAY_DEFAULT_COLOR = "#FF9800"
 
 
-def _expand_date_range_to_dates(start: date, end: date) -> set[date]:
-    """開始日〜終了日（両端含む）を日付集合に展開する。"""
-    if end < start:
-        start, end = end, start
-    out: set[date] = set()
-    cur = start
-    while cur <= end:
-        out.add(cur)
-        cur += timedelta(days=1)
-    return out
-
-
 def _is_weekday(d: date) -> bool:
     """土日以外の平日かどうか（月=0 … 金=4）。"""
     return d.weekday() < 5
@@ -148,38 +140,98 @@ def _split_date_range_weekday_segments(start: date, end: date) -> list[tuple[dat
         segments.append((seg_start, end))
     return segments
 
-def _build_special_holiday_dates_from_events(df_events) -> frozenset[date]:
-    """events シートの特休日（event_type=special_holiday）を日付集合にまとめる。"""
-    if df_events is None or getattr(df_events, "empty", True):
-        return frozenset()
-    if "event_type" not in df_events.columns:
-        return frozenset()
-
-    dates: set[date] = set()
-    for _, row in df_events.iterrows():
-        if str(row.get("event_type", "")).strip() != SPECIAL_HOLIDAY_EVENT_TYPE:
-            continue
-        start_raw = row.get("start_date", "")
-        end_raw = row.get("end_date", "") or start_raw
-        try:
-            start_d = pd.to_datetime(start_raw).date()
-            end_d = pd.to_datetime(end_raw).date()
-        except Exception:
-            continue
-        dates |= _expand_date_range_to_dates(start_d, end_d)
-    return frozenset(dates)
 
+class EventIntervalIndex:
+    """
+    events シートの期間（開始日〜終了日、両端含む）の索引。
+    開始日順に並べた配列と終了日の累積最大値を二分探索して期間と重なるイベントを求め、
+    特休日（event_type=special_holiday）は日単位に展開した昇順の配列から範囲で取り出す。
+    """
 
-def _count_presumed_attendance_days_in_month(
-    year: int,
-    month: int,
-    full_day_leave_dates: set[date],
-    special_holiday_dates: set[date],
-) -> int:
-    """営業日から終日休暇と特休日を除いた出勤可能日数。"""
-    workdays = japanese_business_calendar_dates_in_month(year, month)
-    excluded = set(full_day_leave_dates) | set(special_holiday_dates)
-    return len(workdays - excluded)
+    def __init__(self, df_events: pd.DataFrame):
+        empty_days = np.array([], dtype="datetime64[D]")
+        self._positions = np.array([], dtype=np.int64)
+        self._starts = self._ends = self._max_ends = empty_days
+        self._special_days = empty_days
+        if df_events is None or df_events.empty:
+            return
+
+        # カレンダー表示と同じく、列名のバリエーションも含めて最初に値がある列を使う
+        start_text = _first_nonempty_text(df_events, "start_date")
+        end_text = _first_nonempty_text(df_events, "end_date")
+        end_given = end_text != ""
+        start = pd.to_datetime(start_text, errors="coerce", format="mixed").dt.normalize()
+        end = pd.to_datetime(end_text.where(end_given, start_text), errors="coerce", format="mixed").dt.normalize()
+        start_days = start.to_numpy(dtype="datetime64[D]")
+        end_days = end.to_numpy(dtype="datetime64[D]")
+
+        # 重なり判定用: 開始日が読めるイベントの期間（終了日が読めなければ開始日1日、逆順なら入れ替え）
+        valid = start.notna().to_numpy()
+        lo = start_days[valid]
+        hi = np.where(end.notna().to_numpy()[valid], end_days[valid], lo)
+        lo, hi = np.minimum(lo, hi), np.maximum(lo, hi)
+        order = np.argsort(lo, kind="stable")
+        self._positions = np.flatnonzero(valid)[order]
+        self._starts = lo[order]
+        self._ends = hi[order]
+        self._max_ends = np.maximum.accumulate(self._ends) if len(self._ends) else self._ends
+
+        # 特休日: 開始日・終了日の両方が読める期間を日単位に展開
+        is_special = (_calendar_text_column(df_events, "event_type") == SPECIAL_HOLIDAY_EVENT_TYPE).to_numpy()
+        special = is_special & start.notna().to_numpy() & end.notna().to_numpy()
+        if special.any():
+            s_lo = np.minimum(start_days[special], end_days[special])
+            s_hi = np.maximum(start_days[special], end_days[special])
+            lengths = (s_hi - s_lo).astype(np.int64) + 1
+            offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            self._special_days = np.unique(np.repeat(s_lo, lengths) + offsets)
+
+    def overlapping(self, start: date, end: date) -> np.ndarray:
+        """期間 start〜end（両端含む）と重なるイベントの行位置（df_events の iloc、昇順）。"""
+        lower = np.datetime64(start, "D")
+        upper = np.datetime64(end, "D")
+        # 開始日が end 以前のイベントのうち、終了日が start 以降のもの
+        stop = np.searchsorted(self._starts, upper, side="right")
+        first = np.searchsorted(self._max_ends[:stop], lower, side="left")
+        hits = self._positions[first:stop][self._ends[first:stop] >= lower]
+        return np.sort(hits)
+
+    @property
+    def special_holiday_days(self) -> np.ndarray:
+        """特休日（重複なし・昇順の datetime64[D] 配列）。"""
+        return self._special_days
+
+    def special_holiday_dates(self, start: date, end: date) -> frozenset[date]:
+        """期間 start〜end（両端含む）に含まれる特休日。"""
+        lo = np.searchsorted(self._special_days, np.datetime64(start, "D"), side="left")
+        hi = np.searchsorted(self._special_days, np.datetime64(end, "D"), side="right")
+        return frozenset(self._special_days[lo:hi].astype(object))
+
+    def special_holiday_dates_in_month(self, year: int, month: int) -> frozenset[date]:
+        """指定月の特休日。"""
+        month_start = date(year, month, 1)
+        return self.special_holiday_dates(month_start, _add_months(month_start, 1) - timedelta(days=1))
+
+
+def _frame_version(df: pd.DataFrame) -> str:
+    """DataFrame の内容（行の並び・列を含む）から版キーを作る（内容が同じなら同じキー）。"""
+    digest = hashlib.sha1()
+    digest.update(repr((df.shape, [str(c) for c in df.columns])).encode())
+    if not df.empty:
+        digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _cached_event_interval_index(events_version: str, _df_events: pd.DataFrame) -> EventIntervalIndex:
+    return EventIntervalIndex(_df_events)
+
+
+def get_event_interval_index(df_events: pd.DataFrame) -> EventIntervalIndex:
+    """events の内容（スナップショット）ごとに1回だけ索引を作って使い回す。"""
+    if df_events is None:
+        df_events = pd.DataFrame()
+    return _cached_event_interval_index(_frame_version(df_events), df_events)
 
 
 def staff_has_unrestricted_compensatory_leave(staff_name: str) -> bool:
@@ -522,390 +574,256 @@ def _inject_streamlit_calendar_iframe_resize(min_height: int = 900) -> None:
     )
 
 
-def show_calendar_page():
-    """カレンダーページを表示"""
-    st.header("🗓 カレンダー")
-    
-    spreadsheet_id = get_spreadsheet_id()
-    if not spreadsheet_id:
-        st.error("スプレッドシートIDが設定されていません。サイドバーで設定してください。")
-        return
-    
-    # 休暇種別ごとの色設定
-    leave_type_colors = {
-        "年休": "#FF6B6B",      # 赤
-        "夏休み": "#4ECDC4",    # 青緑
-        "代休": "#9370DB",      # 紫
-        "病休": "#95A5A6",      # グレー
-        "盆休": "#FFA500",      # オレンジ
-        "忌引き": "#696969",    # ディムグレー（弔事）
-        "その他": "#87CEEB"     # 薄い青（スカイブルー）
-    }
-    
-    # 勤怠ログを読み込む
-    df_logs = read_attendance_logs(spreadsheet_id)
-    
-    # イベントデータを読み込む
-    df_events = read_events(spreadsheet_id)
-    
-    if df_logs.empty and df_events.empty:
-        st.info("まだ予定が登録されていません。")
-        return
-    
-    # カレンダー用のイベントデータを作成
-    calendar_events = []
-    
-    # 休暇ログを各日ごとに個別のイベントとして変換（グループ化しない）
-    if not df_logs.empty:
-        # 日付をdatetime型に変換
-        df_logs["date"] = pd.to_datetime(df_logs["date"], errors="coerce")
-        # 時系列順にソート（日付と時間を組み合わせて）
-        def get_sort_datetime(row):
-            """日付と時間を組み合わせてdatetimeオブジェクトを作成（ソート用）"""
-            event_date = row.get("date")
-            start_time = str(row.get("start_time", "")).strip()
-            
-            if pd.isna(event_date):
-                return pd.NaT
-            
-            # start_timeが空の場合は00:00として扱う
-            if not start_time or start_time == "" or start_time.lower() == "nan":
-                return pd.to_datetime(event_date)
-            
-            try:
-                # 時間をパース
-                time_parts = start_time.split(":")
-                if len(time_parts) >= 2:
-                    hour = int(time_parts[0])
-                    minute = int(time_parts[1])
-                    if isinstance(event_date, pd.Timestamp):
-                        return event_date.replace(hour=hour, minute=minute)
-                    else:
-                        date_obj = pd.to_datetime(event_date)
-                        return date_obj.replace(hour=hour, minute=minute)
-                else:
-                    return pd.to_datetime(event_date)
-            except:
-                return pd.to_datetime(event_date)
-        
-        df_logs["sort_datetime"] = df_logs.apply(get_sort_datetime, axis=1)
-        df_logs = df_logs.sort_values("sort_datetime", na_position='last')
-        df_logs = df_logs.drop(columns=["sort_datetime"])
-        
-        # 各日を個別のイベントとして処理
-        for _, row in df_logs.iterrows():
-            event_date = row.get("date")
-            event_id = _normalize_event_id(row.get("event_id", ""))
-            staff_name = str(row.get("staff_name", "")).strip()
-            leave_type = str(row.get("type", "")).strip()
-            start_time = str(row.get("start_time", "")).strip()
-            end_time = str(row.get("end_time", "")).strip()
-            duration_hours = row.get("duration_hours", 0)
-            remarks = row.get("remarks", "")
-            
-            if pd.isna(event_date) or not event_id:
-                continue
-            
-            # タイトルの生成（時間指定がある場合は時間も表示）
-            # 1日休みかどうかを判定（08:30-17:00）
-            is_full_day_leave = (start_time == "08:30" and end_time == "17:00")
-            
-            if is_full_day_leave:
-                # 1日休みの場合: 名前 - one day
-                title = f"{staff_name} - one day"
-            elif start_time and end_time:
-                # 時間指定の場合: 名前：開始時間-終了時間
-                title = f"{staff_name}：{start_time}-{end_time}"
-            else:
-                # 時間が設定されていない場合: 名前 - 休暇種別
-                title = f"{staff_name} - {leave_type}"
-            
-            # FullCalendarのstart/endフィールドの設定
-            # 時間指定がある場合はallDay: Falseにして時間を含める
-            if start_time and end_time and not is_full_day_leave:
-                # 時間指定がある場合: 日付と時間を含める
-                try:
-                    time_parts = start_time.split(":")
-                    end_time_parts = end_time.split(":")
-                    if len(time_parts) >= 2 and len(end_time_parts) >= 2:
-                        hour = int(time_parts[0])
-                        minute = int(time_parts[1])
-                        end_hour = int(end_time_parts[0])
-                        end_minute = int(end_time_parts[1])
-                        
-                        start_datetime = event_date.replace(hour=hour, minute=minute)
-                        end_datetime = event_date.replace(hour=end_hour, minute=end_minute)
-                        
-                        event_date_str = start_datetime.strftime("%Y-%m-%dT%H:%M:%S")
-                        end_date_str = end_datetime.strftime("%Y-%m-%dT%H:%M:%S")
-                        all_day = False
-                    else:
-                        event_date_str = event_date.strftime("%Y-%m-%d")
-                        end_date_str = (event_date + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
-                        all_day = True
-                except:
-                    event_date_str = event_date.strftime("%Y-%m-%d")
-                    end_date_str = (event_date + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
-                    all_day = True
-            else:
-                # 終日イベントの場合
-                event_date_str = event_date.strftime("%Y-%m-%d")
-                # FullCalendarではendは終了日の翌日を指定（排他的）
-                end_date_str = (event_date + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
-                all_day = True
-            
-            event = {
-                "id": event_id,
-                "title": title,
-                "start": event_date_str,
-                "end": end_date_str,
-                "allDay": all_day,
-                "color": leave_type_colors.get(leave_type, "#95A5A6"),
-                "resource": leave_type,
-                "extendedProps": {
-                    "event_id": event_id,
-                    "staff_name": staff_name,
-                    "leave_type": leave_type,
-                    "start_date_display": event_date.strftime("%Y年%m月%d日"),
-                    "end_date_display": event_date.strftime("%Y年%m月%d日"),
-                    "time_range": f"{start_time} - {end_time}" if start_time and end_time else "",
-                    "remarks": remarks,
-                    "event_type": "attendance"
-                }
-            }
-            calendar_events.append(event)
-    
-    # イベントをカレンダーイベントに変換（職員名なし、複数日対応）
-    # イベントデータを時系列順にソート
-    if not df_events.empty:
-        # 日付と時間を組み合わせてソート用のdatetime列を作成
-        def get_event_sort_datetime(row):
-            """イベントの日付と時間を組み合わせてdatetimeオブジェクトを作成（ソート用）"""
-            start_date_str = ""
-            start_time = ""
-            
-            # start_dateの取得
-            for col_name in df_events.columns:
-                if "start_date" in col_name.lower():
-                    val = row.get(col_name)
-                    if val is not None and str(val).strip() != "" and str(val).strip().lower() != "nan":
-                        start_date_str = str(val).strip()
-                        break
-            
-            # start_timeの取得
-            start_time = str(row.get("start_time", "")).strip() if row.get("start_time") and str(row.get("start_time")).strip() != "" and str(row.get("start_time")).strip().lower() != "nan" else ""
-            
-            if not start_date_str:
-                return pd.NaT
-            
-            try:
-                start_date = pd.to_datetime(start_date_str)
-                
-                # start_timeが空の場合は00:00として扱う
-                if not start_time or start_time == "" or start_time.lower() == "nan":
-                    return pd.to_datetime(start_date)
-                
-                # 時間をパース
-                time_parts = start_time.split(":")
-                if len(time_parts) >= 2:
-                    hour = int(time_parts[0])
-                    minute = int(time_parts[1])
-                    if isinstance(start_date, pd.Timestamp):
-                        return start_date.replace(hour=hour, minute=minute)
-                    else:
-                        date_obj = pd.to_datetime(start_date)
-                        return date_obj.replace(hour=hour, minute=minute)
-                else:
-                    return pd.to_datetime(start_date)
-            except:
-                return pd.NaT
-        
-        df_events["sort_datetime"] = df_events.apply(get_event_sort_datetime, axis=1)
-        df_events = df_events.sort_values("sort_datetime", na_position='last')
-        df_events = df_events.drop(columns=["sort_datetime"])
-    
-    for _, row in df_events.iterrows():
-        event_id = _normalize_event_id(row.get("event_id", ""))
-        # 列名にスペースや特殊文字が含まれている可能性があるので、複数のパターンで取得を試みる
-        start_date_str = ""
-        end_date_str = ""
-        
-        # start_dateの取得を試みる（列名のバリエーションをチェック）
-        for col_name in df_events.columns:
-            if "start_date" in col_name.lower():
-                val = row.get(col_name)
-                if val is not None and str(val).strip() != "" and str(val).strip().lower() != "nan":
-                    start_date_str = str(val).strip()
-                    break
-        
-        # end_dateの取得を試みる（列名のバリエーションをチェック）
-        # "end_date |" のような特殊文字を含む列名にも対応
-        for col_name in df_events.columns:
-            if "end_date" in col_name.lower():
-                val = row.get(col_name)
-                if val is not None and str(val).strip() != "" and str(val).strip().lower() != "nan":
-                    end_date_str = str(val).strip()
-                    break
-        
-        title = row.get("title", "")
-        description = row.get("description", "")
-        color = row.get("color", "#95A5A6")
-        event_type = str(row.get("event_type", "")).strip()
-        is_special_holiday = event_type == SPECIAL_HOLIDAY_EVENT_TYPE
-        if is_special_holiday and (not color or str(color).strip() in ("", "#95A5A6")):
-            color = SPECIAL_HOLIDAY_DEFAULT_COLOR
-        start_time = str(row.get("start_time", "")).strip() if row.get("start_time") and str(row.get("start_time")).strip() != "" and str(row.get("start_time")).strip().lower() != "nan" else ""
-        end_time = str(row.get("end_time", "")).strip() if row.get("end_time") and str(row.get("end_time")).strip() != "" and str(row.get("end_time")).strip().lower() != "nan" else ""
-        
-        if not start_date_str:
-            continue
-        
-        # 終了日が設定されていない場合は開始日と同じにする
-        if not end_date_str or end_date_str == "" or pd.isna(end_date_str) or end_date_str == "nan":
-            end_date_str = start_date_str
-        
-        # 日付をdatetime型に変換
-        try:
-            start_date = pd.to_datetime(start_date_str)
-            end_date = pd.to_datetime(end_date_str)
-            end_date_formatted = end_date.strftime("%Y-%m-%d")
-        except Exception as e:
-            # 日付の変換に失敗した場合はそのまま使用
-            start_date = pd.to_datetime(start_date_str) if start_date_str else None
-            end_date = pd.to_datetime(end_date_str) if end_date_str and end_date_str != "" else start_date
-            end_date_formatted = end_date_str if end_date_str and end_date_str != "" else start_date_str
-        
-        if start_date is None:
+# 休暇種別ごとの色設定
+LEAVE_TYPE_COLORS = {
+    "年休": "#FF6B6B",      # 赤
+    "夏休み": "#4ECDC4",    # 青緑
+    "代休": "#9370DB",      # 紫
+    "病休": "#95A5A6",      # グレー
+    "盆休": "#FFA500",      # オレンジ
+    "忌引き": "#696969",    # ディムグレー（弔事）
+    "その他": "#87CEEB"     # 薄い青（スカイブルー）
+}
+CALENDAR_DEFAULT_EVENT_COLOR = "#95A5A6"
+
+_CALENDAR_TIME_PATTERN = r"^(\d{1,2}):(\d{2})(?::\d{2})?$"
+
+
+def _calendar_text_column(df: pd.DataFrame, col: str) -> pd.Series:
+    """列を前後空白除去済みの文字列にする（欠損・'nan' は空文字、列が無ければ全行空文字）。"""
+    if col not in df.columns:
+        return pd.Series("", index=df.index, dtype=object)
+    values = df[col]
+    text = values.astype(str).str.strip()
+    blank = values.isna() | (text.str.lower() == "nan")
+    return text.mask(blank, "").astype(object)
+
+
+def _first_nonempty_text(df: pd.DataFrame, name_part: str) -> pd.Series:
+    """列名に name_part を含む列のうち、左から見て最初に値がある列の文字列を行ごとに返す。"""
+    result = pd.Series("", index=df.index, dtype=object)
+    for col in reversed([c for c in df.columns if name_part in str(c).lower()]):
+        text = _calendar_text_column(df, col)
+        result = text.where(text != "", result)
+    return result
+
+
+def _time_of_day_offsets(times: pd.Series) -> pd.Series:
+    """'HH:MM' を 0 時からの経過時間（Timedelta）にする。解釈できない値は NaT。"""
+    parts = times.astype(str).str.extract(_CALENDAR_TIME_PATTERN)
+    hours = pd.to_numeric(parts[0], errors="coerce")
+    minutes = pd.to_numeric(parts[1], errors="coerce")
+    valid = (hours < 24) & (minutes < 60)
+    return pd.to_timedelta((hours * 60 + minutes).where(valid), unit="m")
+
+
+def _calendar_records(top: pd.DataFrame, props: pd.DataFrame) -> list[dict]:
+    """フラットな2つの DataFrame から FullCalendar のイベント dict（extendedProps 入れ子）を作る。"""
+    records = top.to_dict("records")
+    for record, extended in zip(records, props.to_dict("records")):
+        record["extendedProps"] = extended
+    return records
+
+
+def _attendance_calendar_events(df_logs: pd.DataFrame) -> tuple[list[dict], list[pd.Timestamp]]:
+    """
+    勤怠ログ（read_attendance_logs の型付け済み DataFrame）を1行1件のカレンダーイベントにする。
+    戻り値は (イベントのリスト, 各イベントの並び替えキー)。
+    """
+    if df_logs.empty or "date" not in df_logs.columns:
+        return [], []
+
+    event_ids = _calendar_text_column(df_logs, "event_id")
+    df = df_logs[df_logs["date"].notna() & (event_ids != "")]
+    if df.empty:
+        return [], []
+    event_ids = event_ids[df.index]
+
+    day = df["date"].dt.normalize()
+    start_time = _calendar_text_column(df, "start_time")
+    end_time = _calendar_text_column(df, "end_time")
+    start_offset = _time_of_day_offsets(start_time)
+    end_offset = _time_of_day_offsets(end_time)
+
+    # 日付＋開始時刻の時系列順（開始時刻が無い・解釈できない場合は 0:00）
+    sort_datetime = df["date"] + start_offset.fillna(pd.Timedelta(0))
+    order = sort_datetime.sort_values(kind="stable").index
+    df, day, event_ids = df.loc[order], day.loc[order], event_ids.loc[order]
+    start_time, end_time = start_time.loc[order], end_time.loc[order]
+    start_offset, end_offset = start_offset.loc[order], end_offset.loc[order]
+
+    staff_name = _calendar_text_column(df, "staff_name")
+    leave_type = _calendar_text_column(df, "type")
+    has_times = (start_time != "") & (end_time != "")
+    # 1日休み（08:30-17:00）は終日表示
+    is_full_day_leave = (start_time == "08:30") & (end_time == "17:00")
+    timed = has_times & ~is_full_day_leave & start_offset.notna() & end_offset.notna()
+
+    title = (staff_name + " - " + leave_type).where(
+        ~has_times, staff_name + "：" + start_time + "-" + end_time
+    ).where(~is_full_day_leave, staff_name + " - one day")
+
+    day_str = day.dt.strftime("%Y-%m-%d")
+    # FullCalendar の終日イベントの end は終了日の翌日（排他的）
+    start_str = day_str.where(~timed, (day + start_offset).dt.strftime("%Y-%m-%dT%H:%M:%S"))
+    end_str = (day + pd.Timedelta(days=1)).dt.strftime("%Y-%m-%d").where(
+        ~timed, (day + end_offset).dt.strftime("%Y-%m-%dT%H:%M:%S")
+    )
+    display_date = day.dt.strftime("%Y年%m月%d日")
+    remarks = df["remarks"] if "remarks" in df.columns else pd.Series("", index=df.index)
+
+    top = pd.DataFrame({
+        "id": event_ids,
+        "title": title,
+        "start": start_str,
+        "end": end_str,
+        "allDay": ~timed,
+        "color": leave_type.map(LEAVE_TYPE_COLORS).fillna(CALENDAR_DEFAULT_EVENT_COLOR),
+        "resource": leave_type,
+    })
+    props = pd.DataFrame({
+        "event_id": event_ids,
+        "staff_name": staff_name,
+        "leave_type": leave_type,
+        "start_date_display": display_date,
+        "end_date_display": display_date,
+        "time_range": (start_time + " - " + end_time).where(has_times, ""),
+        "remarks": remarks,
+        "event_type": "attendance",
+    })
+    sort_key = day + start_offset.where(has_times, pd.NaT).fillna(pd.Timedelta(0))
+    return _calendar_records(top, props), list(sort_key)
+
+
+def _general_calendar_events(df_events: pd.DataFrame) -> tuple[list[dict], list[pd.Timestamp]]:
+    """
+    events シート（職員名なし、複数日対応）をカレンダーイベントにする。
+    戻り値は (イベントのリスト, 各イベントの並び替えキー)。
+    """
+    if df_events.empty:
+        return [], []
+
+    # 列名のバリエーション（"end_date |" など）も含めて最初に値がある列を使う
+    start_date_str = _first_nonempty_text(df_events, "start_date")
+    df = df_events[start_date_str != ""]
+    if df.empty:
+        return [], []
+    start_date_str = start_date_str[df.index]
+    end_date_str = _first_nonempty_text(df, "end_date")
+    # 終了日が設定されていない場合は開始日と同じにする
+    end_date_str = end_date_str.where(end_date_str != "", start_date_str)
+
+    start_date = pd.to_datetime(start_date_str, errors="coerce", format="mixed")
+    end_date = pd.to_datetime(end_date_str, errors="coerce", format="mixed")
+    valid = start_date.notna()
+    df, start_date_str, end_date_str = df[valid], start_date_str[valid], end_date_str[valid]
+    start_date = start_date[valid].dt.normalize()
+    end_date_ok = end_date[valid].notna()
+    end_date_formatted = end_date[valid].dt.strftime("%Y-%m-%d").where(end_date_ok, end_date_str)
+    end_date = end_date[valid].dt.normalize().where(end_date_ok, start_date)
+
+    start_time = _calendar_text_column(df, "start_time")
+    end_time = _calendar_text_column(df, "end_time")
+    start_offset = _time_of_day_offsets(start_time)
+    end_offset = _time_of_day_offsets(end_time)
+
+    # 日付＋開始時刻の時系列順（開始時刻が解釈できない行は末尾）
+    sort_datetime = (start_date + start_offset.fillna(pd.Timedelta(0))).mask((start_time != "") & start_offset.isna())
+    order = sort_datetime.sort_values(kind="stable", na_position="last").index
+    df = df.loc[order]
+    start_date, end_date, end_date_formatted = start_date.loc[order], end_date.loc[order], end_date_formatted.loc[order]
+    start_time, end_time = start_time.loc[order], end_time.loc[order]
+    start_offset, end_offset = start_offset.loc[order], end_offset.loc[order]
+
+    event_ids = _calendar_text_column(df, "event_id")
+    title = df["title"] if "title" in df.columns else pd.Series("", index=df.index)
+    description = df["description"] if "description" in df.columns else pd.Series("", index=df.index)
+    color = df["color"] if "color" in df.columns else pd.Series(CALENDAR_DEFAULT_EVENT_COLOR, index=df.index)
+    is_special_holiday = _calendar_text_column(df, "event_type") == SPECIAL_HOLIDAY_EVENT_TYPE
+    default_color = color.astype(str).str.strip().isin(["", CALENDAR_DEFAULT_EVENT_COLOR])
+    color = color.mask(is_special_holiday & default_color, SPECIAL_HOLIDAY_DEFAULT_COLOR)
+
+    has_times = (start_time != "") & (end_time != "")
+    # calculate_duration_hours と同じく 12:00-13:00 を跨ぐ場合は昼休み1時間を除外
+    hours = (end_offset - start_offset).dt.total_seconds() / 3600
+    spans_lunch = (start_offset < pd.Timedelta(hours=12)) & (end_offset > pd.Timedelta(hours=13))
+    duration_hours = (hours - spans_lunch.astype(float)).clip(lower=0).round(2).fillna(0.0)
+
+    # タイトルの生成（1日休み 08:30-17:00 は時間を表示しない、8時間未満の時間指定は時間も表示）
+    is_full_day_event = is_special_holiday | (has_times & (start_time == "08:30") & (end_time == "17:00"))
+    title_text = title.astype(str)
+    special_title = title_text.where(title_text.str.strip() != "", "特休日")
+    special_title = special_title.where(special_title.str.startswith("🏖"), "🏖 " + special_title)
+    is_partial_day = has_times & ~is_full_day_event & (duration_hours < 8.0)
+    display_title = title.where(~is_partial_day, title_text + "：" + start_time + "-" + end_time)
+    display_title = display_title.where(~is_special_holiday, special_title)
+
+    timed = has_times & ~is_full_day_event & start_offset.notna() & end_offset.notna()
+    start_datetime = start_date + start_offset
+    end_datetime = start_date + end_offset
+    # 終了時間が開始時間より前の場合は翌日とする
+    end_datetime = end_datetime.where(~(end_datetime < start_datetime), end_datetime + pd.Timedelta(days=1))
+    # 時間指定があるが解釈できない場合は開始日1日のみ、それ以外の終日イベントは終了日の翌日（排他的）
+    all_day_end = (end_date + pd.Timedelta(days=1)).where(~has_times | is_full_day_event, start_date + pd.Timedelta(days=1))
+    start_day_str = start_date.dt.strftime("%Y-%m-%d")
+    start_str = start_day_str.where(~timed, start_datetime.dt.strftime("%Y-%m-%dT%H:%M:%S"))
+    end_str = all_day_end.dt.strftime("%Y-%m-%d").where(~timed, end_datetime.dt.strftime("%Y-%m-%dT%H:%M:%S"))
+
+    top = pd.DataFrame({
+        "id": event_ids,
+        "title": display_title,
+        "start": start_str,
+        "end": end_str,
+        "allDay": ~timed,
+        "color": color,
+        "resource": "event",
+    })
+    props = pd.DataFrame({
+        "event_id": event_ids,
+        "start_date": start_day_str,
+        "end_date": end_date_formatted,
+        "event_title": title,
+        "description": description,
+        "event_color": color,
+        "time_range": (start_time + " - " + end_time).where(has_times, ""),
+        "event_type": is_special_holiday.map({True: SPECIAL_HOLIDAY_EVENT_TYPE, False: "general_event"}),
+    })
+    time_of_day = start_offset.where(has_times, pd.NaT).fillna(pd.Timedelta(0))
+    sort_keys = list(start_date + time_of_day)
+    # 複数日の一般イベントは土日を空欄にする（平日セグメントごとに分割表示）
+    split_candidates = list(~is_special_holiday & ~timed & (end_date > start_date))
+
+    events: list[dict] = []
+    keys: list[pd.Timestamp] = []
+    rows = zip(
+        _calendar_records(top, props), sort_keys, time_of_day,
+        split_candidates, start_date.dt.date, end_date.dt.date,
+    )
+    for event, key, offset, candidate, start_d, end_d in rows:
+        segments = _split_date_range_weekday_segments(start_d, end_d) if candidate else []
+        if not segments:
+            events.append(event)
+            keys.append(key)
             continue
-        
-        # end_dateがNoneの場合はstart_dateと同じにする
-        if end_date is None or pd.isna(end_date):
-            end_date = start_date
-        
-        # 時間指定がある場合は時間を計算して判定
-        duration_hours = 0
-        if start_time and end_time:
-            duration_hours = calculate_duration_hours(start_time, end_time)
-        
-        # タイトルの生成（時間指定がある場合は時間も表示）
-        # 1日休み（08:30-17:00）の場合は時間を表示しない
-        display_title = title
-        is_full_day_event = False
-        if is_special_holiday:
-            display_title = title if str(title).strip() else "特休日"
-            if not str(display_title).startswith("🏖"):
-                display_title = f"🏖 {display_title}"
-            is_full_day_event = True
-        elif start_time and end_time:
-            # 1日休みかどうかを判定（08:30-17:00）
-            is_full_day_event = (start_time == "08:30" and end_time == "17:00")
-            
-            if not is_full_day_event:
-                try:
-                    duration_float = float(duration_hours)
-                    is_partial_day = (duration_float < 8.0)
-                except (ValueError, TypeError):
-                    is_partial_day = False
-                
-                if is_partial_day:
-                    # 時間指定の場合: イベント名：開始時間-終了時間
-                    display_title = f"{title}：{start_time}-{end_time}"
-        
-        # FullCalendarのstart/endフィールドの設定
-        # 時間指定がある場合はallDay: Falseにして時間を含める
-        if start_time and end_time and not is_full_day_event:
-            # 時間指定がある場合: 日付と時間を含める
-            try:
-                time_parts = start_time.split(":")
-                end_time_parts = end_time.split(":")
-                if len(time_parts) >= 2 and len(end_time_parts) >= 2:
-                    hour = int(time_parts[0])
-                    minute = int(time_parts[1])
-                    end_hour = int(end_time_parts[0])
-                    end_minute = int(end_time_parts[1])
-                    
-                    start_datetime = start_date.replace(hour=hour, minute=minute)
-                    end_datetime = start_date.replace(hour=end_hour, minute=end_minute)
-                    
-                    # 終了時間が開始時間より前の場合は翌日とする
-                    if end_datetime < start_datetime:
-                        end_datetime = end_datetime + pd.Timedelta(days=1)
-                    
-                    start_date_formatted = start_datetime.strftime("%Y-%m-%dT%H:%M:%S")
-                    end_date_exclusive = end_datetime.strftime("%Y-%m-%dT%H:%M:%S")
-                    all_day = False
-                else:
-                    start_date_formatted = start_date.strftime("%Y-%m-%d")
-                    end_date_exclusive = (start_date + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
-                    all_day = True
-            except:
-                start_date_formatted = start_date.strftime("%Y-%m-%d")
-                end_date_exclusive = (start_date + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
-                all_day = True
-        else:
-            # 終日イベントの場合
-            start_date_formatted = start_date.strftime("%Y-%m-%d")
-            # FullCalendarではendは終了日の翌日を指定（排他的）
-            end_date_exclusive = (end_date + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
-            all_day = True
-        
-        # イベントオブジェクトの共通 extendedProps
-        extended_props = {
-            "event_id": event_id,
-            "start_date": start_date.strftime("%Y-%m-%d"),
-            "end_date": end_date_formatted,
-            "event_title": title,
-            "description": description,
-            "event_color": color,
-            "time_range": f"{start_time} - {end_time}" if start_time and end_time else "",
-            "event_type": SPECIAL_HOLIDAY_EVENT_TYPE if is_special_holiday else "general_event",
-        }
+        for seg_start, seg_end in segments:
+            events.append({
+                **event,
+                "start": seg_start.strftime("%Y-%m-%d"),
+                "end": (seg_end + timedelta(days=1)).strftime("%Y-%m-%d"),
+            })
+            keys.append(pd.Timestamp(seg_start) + offset)
+    return events, keys
 
-        # 複数日の一般イベントは土日を空欄にする（平日セグメントごとに分割表示）
-        start_d = start_date.date() if hasattr(start_date, "date") else start_date
-        end_d = end_date.date() if hasattr(end_date, "date") else end_date
-        split_segments = (
-            not is_special_holiday
-            and all_day
-            and end_d > start_d
-            and _split_date_range_weekday_segments(start_d, end_d)
-        )
 
-        if split_segments:
-            for seg_start, seg_end in split_segments:
-                calendar_events.append({
-                    "id": event_id,
-                    "title": display_title,
-                    "start": seg_start.strftime("%Y-%m-%d"),
-                    "end": (seg_end + timedelta(days=1)).strftime("%Y-%m-%d"),
-                    "allDay": True,
-                    "color": color,
-                    "resource": "event",
-                    "extendedProps": extended_props,
-                })
-        else:
-            event = {
-                "id": event_id,
-                "title": display_title,
-                "start": start_date_formatted,
-                "end": end_date_exclusive,
-                "allDay": all_day,
-                "color": color,
-                "resource": "event",
-                "extendedProps": extended_props,
-            }
-            calendar_events.append(event)
-    
-    # 日本の祝日を追加（前後1年分）
-    today = date.today()
-    start_range = date(today.year - 1, 1, 1)
-    end_range = date(today.year + 1, 12, 31)
-    
+def _holiday_calendar_events(start_range: date, end_range: date) -> tuple[list[dict], list[pd.Timestamp]]:
+    """期間内の日本の祝日を終日イベントにする。"""
+    events: list[dict] = []
+    keys: list[pd.Timestamp] = []
     current_date = start_range
     while current_date <= end_range:
         holiday_name = jpholiday.is_holiday_name(current_date)
         if holiday_name:
-            holiday_event = {
+            events.append({
                 "title": f"🎌 {holiday_name}",
                 "start": current_date.strftime("%Y-%m-%d"),
                 "end": (current_date + timedelta(days=1)).strftime("%Y-%m-%d"),
@@ -917,41 +835,178 @@ def show_calendar_page():
                     "holiday_name": holiday_name,
                     "event_type": "holiday"
                 }
-            }
-            calendar_events.append(holiday_event)
+            })
+            keys.append(pd.Timestamp(current_date))
         current_date += timedelta(days=1)
+    return events, keys
+
+
+CALENDAR_WINDOW_MONTHS = 2  # 表示月の前後に読み込む月数
+CALENDAR_ANCHOR_SESSION_KEY = "calendar_anchor_date"  # 表示中の日付（この日の月を中心に読み込む）
+CALENDAR_VIEW_SESSION_KEY = "calendar_view_type"
+CALENDAR_NAV_SESSION_KEY = "calendar_nav_count"  # ボタンで移動した回数（コンポーネントの作り直しに使う）
+# ビューの種類 → (ボタン表示, 前へ, 現在, 次へ)
+CALENDAR_VIEWS = {
+    "dayGridMonth": ("月", "前月", "今月", "翌月"),
+    "timeGridWeek": ("週", "前週", "今週", "翌週"),
+    "timeGridDay": ("日", "前日", "今日", "翌日"),
+}
+
+
+def _add_months(month_start: date, months: int) -> date:
+    """月初日 month_start から months か月ずらした月初日を返す。"""
+    index = month_start.year * 12 + month_start.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _step_calendar_date(view_type: str, anchor: date, steps: int) -> date:
+    """表示中の日付 anchor を、ビューの単位（月・週・日）で steps 回分ずらす。"""
+    if view_type == "timeGridWeek":
+        return anchor + timedelta(weeks=steps)
+    if view_type == "timeGridDay":
+        return anchor + timedelta(days=steps)
+    return _add_months(anchor.replace(day=1), steps)
+
+
+def _calendar_window(anchor: date) -> tuple[date, date]:
+    """表示月の前後 CALENDAR_WINDOW_MONTHS か月の範囲（開始日, 終了日の翌日）を返す。"""
+    month_start = anchor.replace(day=1)
+    return (
+        _add_months(month_start, -CALENDAR_WINDOW_MONTHS),
+        _add_months(month_start, CALENDAR_WINDOW_MONTHS + 1),
+    )
+
+
+def _calendar_view_from_result(calendar_result) -> tuple[str, date, date, date] | None:
+    """
+    コンポーネントの戻り値（eventsSet / dateClick / eventClick など）に含まれる view から
+    (ビューの種類, 表示範囲の開始日, 終了日, 表示中の期間の代表日) を返す。view が無ければ None。
+    view の日時は UTC の ISO 文字列なので、日付は前後1日の誤差を見込んで扱う。
+    """
+    if not calendar_result or not isinstance(calendar_result, dict):
+        return None
+    payload = calendar_result.get(calendar_result.get("callback", ""))
+    view = payload.get("view") if isinstance(payload, dict) else None
+    if not isinstance(view, dict):
+        return None
+    try:
+        active_start = pd.Timestamp(view["activeStart"]).date()
+        active_end = pd.Timestamp(view["activeEnd"]).date()
+        current_start = pd.Timestamp(view["currentStart"])
+        current_end = pd.Timestamp(view["currentEnd"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    middle = (current_start + (current_end - current_start) / 2).date()
+    return str(view.get("type", "")), active_start, active_end, middle
+
+
+def _calendar_data_version(df_logs: pd.DataFrame, df_events: pd.DataFrame) -> str:
+    """カレンダーに載せるデータの内容から版キーを作る（UI 操作だけの再実行では変わらない）。"""
+    return "/".join(_frame_version(df) for df in (df_logs, df_events))
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _build_calendar_events(
+    data_version: str,
+    window_start: date,
+    window_end: date,
+    _df_logs: pd.DataFrame,
+    _df_events: pd.DataFrame,
+) -> list[dict]:
+    """
+    表示範囲（window_start 〜 window_end の前日）にかかる勤怠ログ・イベント・祝日から
+    カレンダーイベントを作り、時系列順に並べて返す。
+    data_version（_calendar_data_version）と表示範囲ごとにキャッシュする。
+    """
+    attendance_events, attendance_keys = _attendance_calendar_events(_df_logs)
+    general_events, general_keys = _general_calendar_events(_df_events)
+    holiday_events, holiday_keys = _holiday_calendar_events(window_start, window_end - timedelta(days=1))
+    events = attendance_events + general_events + holiday_events
+    keys = attendance_keys + general_keys + holiday_keys
+    order = sorted(range(len(events)), key=keys.__getitem__)
+    # start / end は ISO 形式の文字列なので文字列比較で範囲との重なりを判定できる
+    lower, upper = window_start.isoformat(), window_end.isoformat()
+    return [events[i] for i in order if events[i]["start"] < upper and events[i]["end"] > lower]
+
+
+def _calendar_events_for_window(df_logs: pd.DataFrame, df_events: pd.DataFrame, anchor: date) -> list[dict]:
+    """表示月 anchor の前後 CALENDAR_WINDOW_MONTHS か月分だけのカレンダーイベントを返す。"""
+    window_start, window_end = _calendar_window(anchor)
+    if not df_logs.empty and "date" in df_logs.columns:
+        in_window = (df_logs["date"] >= pd.Timestamp(window_start)) & (df_logs["date"] < pd.Timestamp(window_end))
+        df_logs = df_logs[in_window]
+    if not df_events.empty:
+        # 時間指定で日付を跨ぐイベントもあるため前後1日広めに取り、最終的な判定は _build_calendar_events で行う
+        positions = get_event_interval_index(df_events).overlapping(window_start - timedelta(days=1), window_end)
+        df_events = df_events.iloc[positions]
+    return _build_calendar_events(
+        _calendar_data_version(df_logs, df_events),
+        window_start,
+        window_end,
+        df_logs,
+        df_events,
+    )
+
+
+def show_calendar_page():
+    """カレンダーページを表示"""
+    st.header("🗓 カレンダー")
     
-    # calendar_eventsを時系列順にソート（日付と時間を組み合わせて）
-    def get_calendar_event_sort_key(event):
-        """カレンダーイベントのソート用キーを取得"""
-        start_str = event.get("start", "")
-        extended_props = event.get("extendedProps", {})
-        time_range = extended_props.get("time_range", "")
-        
-        if not start_str:
-            return pd.Timestamp.max
-        
-        try:
-            start_date = pd.to_datetime(start_str)
-            
-            # 時間範囲がある場合は時間を抽出
-            if time_range and " - " in time_range:
-                time_part = time_range.split(" - ")[0].strip()
-                try:
-                    time_parts = time_part.split(":")
-                    if len(time_parts) >= 2:
-                        hour = int(time_parts[0])
-                        minute = int(time_parts[1])
-                        return start_date.replace(hour=hour, minute=minute)
-                except:
-                    pass
-            
-            return start_date
-        except:
-            return pd.Timestamp.max
+    spreadsheet_id = get_spreadsheet_id()
+    if not spreadsheet_id:
+        st.error("スプレッドシートIDが設定されていません。サイドバーで設定してください。")
+        return
+    
+    # 勤怠ログを読み込む
+    df_logs = read_attendance_logs(spreadsheet_id)
+    
+    # イベントデータを読み込む
+    df_events = read_events(spreadsheet_id)
+    
+    if df_logs.empty and df_events.empty:
+        st.info("まだ予定が登録されていません。")
+        return
     
-    # ソート実行
-    calendar_events.sort(key=get_calendar_event_sort_key)
+    # 表示中のビューと日付（その日の月の前後 CALENDAR_WINDOW_MONTHS か月分だけをカレンダーに渡す）。
+    # streamlit-calendar はコンポーネント内での月・週の移動を返さないため、移動とビューの切り替えは
+    # 下のボタンで行い、initialView / initialDate として渡す
+    anchor = st.session_state.get(CALENDAR_ANCHOR_SESSION_KEY) or date.today()
+    view_type = st.session_state.get(CALENDAR_VIEW_SESSION_KEY, "dayGridMonth")
+    if view_type not in CALENDAR_VIEWS:
+        view_type = "dayGridMonth"
+    moved = False
+    _, prev_label, current_label, next_label = CALENDAR_VIEWS[view_type]
+    col_prev, col_today, col_next, _, *view_cols = st.columns([1, 1, 1, 3] + [0.6] * len(CALENDAR_VIEWS))
+    with col_prev:
+        if st.button(f"◀ {prev_label}", key="calendar_prev_month"):
+            anchor, moved = _step_calendar_date(view_type, anchor, -1), True
+    with col_today:
+        if st.button(current_label, key="calendar_this_month"):
+            anchor, moved = date.today(), True
+    with col_next:
+        if st.button(f"{next_label} ▶", key="calendar_next_month"):
+            anchor, moved = _step_calendar_date(view_type, anchor, 1), True
+    for col, (candidate, (view_label, *_labels)) in zip(view_cols, CALENDAR_VIEWS.items()):
+        with col:
+            if st.button(
+                view_label,
+                key=f"calendar_view_{candidate}",
+                type="primary" if candidate == view_type else "secondary",
+            ) and candidate != view_type:
+                view_type, moved = candidate, True
+    if moved:
+        st.session_state[CALENDAR_NAV_SESSION_KEY] = st.session_state.get(CALENDAR_NAV_SESSION_KEY, 0) + 1
+        if CALENDAR_VIEWS[view_type][1] != prev_label:
+            # ボタンの表示（前月/前週/前日）をビューに合わせるため描き直す
+            st.session_state[CALENDAR_ANCHOR_SESSION_KEY] = anchor
+            st.session_state[CALENDAR_VIEW_SESSION_KEY] = view_type
+            st.rerun()
+    st.session_state[CALENDAR_ANCHOR_SESSION_KEY] = anchor
+    st.session_state[CALENDAR_VIEW_SESSION_KEY] = view_type
+    window_start, window_end = _calendar_window(anchor)
+
+    # カレンダー用のイベントデータを作成（データと表示範囲が変わらない再実行ではキャッシュを再利用）
+    calendar_events = _calendar_events_for_window(df_logs, df_events, anchor)
     
     # カレンダー表示オプション
     calendar_options = {
@@ -959,12 +1014,14 @@ def show_calendar_page():
         "navLinks": True,
         "dayMaxEvents": False,  # 「+N more」にせず、1日分の予定をすべて表示
         "eventOrder": "start",  # 開始時間順に並べる
+        # 移動とビューの切り替えは上のボタンで行う（読み込む範囲を表示中の日付に合わせるため）
         "headerToolbar": {
-            "left": "prev,next today",
+            "left": "",
             "center": "title",
-            "right": "dayGridMonth,timeGridWeek,timeGridDay"
+            "right": ""
         },
-        "initialView": "dayGridMonth",
+        "initialView": view_type,
+        "initialDate": anchor.isoformat(),
         "locale": "ja",
         "fixedWeekCount": False,
         "expandRows": False,  # 週行をビュー全体の高さまで均等伸長しない
@@ -1009,10 +1066,28 @@ def show_calendar_page():
             vertical-align: top;
         }
         """,
-        key="main_attendance_calendar",
+        # ボタンで移動したときだけ、initialView / initialDate を反映させるため作り直す
+        key=f"main_attendance_calendar_{st.session_state.get(CALENDAR_NAV_SESSION_KEY, 0)}",
     )
     _apply_calendar_selection_from_result(calendar_result)
 
+    # 日付リンク等でコンポーネント内の表示が変わっていたら、ボタンの移動の基準をそれに合わせる。
+    # 読み込み範囲の外に出ていれば、その日を中心に読み直す（コンポーネントは作り直さない）
+    view = _calendar_view_from_result(calendar_result)
+    if view:
+        reported_type, active_start, active_end, view_middle = view
+        if reported_type in CALENDAR_VIEWS:
+            st.session_state[CALENDAR_VIEW_SESSION_KEY] = reported_type
+        outside = (
+            active_start + timedelta(days=1) < window_start
+            or active_end - timedelta(days=1) > window_end
+        )
+        # view の日付は UTC 基準で前後1日ずれうるため、端の日は表示中とみなさず代表日に揃える
+        if not (active_start < anchor < active_end):
+            st.session_state[CALENDAR_ANCHOR_SESSION_KEY] = view_middle
+        if outside or reported_type != view_type:
+            st.rerun()
+
     clicked_event = st.session_state.get(CALENDAR_CLICK_SESSION_KEY)
 
     # イベントクリック時の詳細表示と編集・削除機能（カレンダーの直下に表示）
@@ -1104,9 +1179,7 @@ def show_calendar_page():
 
                 spreadsheet_id = get_spreadsheet_id()
                 df_logs = read_attendance_logs(spreadsheet_id)
-                attendance_row = df_logs[
-                    df_logs["event_id"].astype(str).str.strip() == event_id
-                ]
+                attendance_row = df_logs[df_logs["event_id"] == event_id]
 
                 if attendance_row.empty:
                     st.error("休暇申請データが見つかりません。")
@@ -1200,12 +1273,8 @@ def show_calendar_page():
                                     if not ok:
                                         st.error(err_msg)
                                     elif delete_attendance_log(spreadsheet_id, event_id):
-                                        success_count = 0
-
-                                        for current_date in weekday_dates:
-                                            fiscal_year = calculate_fiscal_year(current_date)
-
-                                            log_data = {
+                                        logs = [
+                                            {
                                                 "event_id": str(uuid.uuid4()),
                                                 "date": current_date.strftime("%Y-%m-%d"),
                                                 "staff_name": staff_name,
@@ -1214,14 +1283,14 @@ def show_calendar_page():
                                                 "end_time": end_str,
                                                 "duration_hours": duration_hours,
                                                 "day_equivalent": day_equivalent,
-                                                "fiscal_year": fiscal_year,
+                                                "fiscal_year": calculate_fiscal_year(current_date),
                                                 "remarks": edit_remarks_input,
                                             }
+                                            for current_date in weekday_dates
+                                        ]
 
-                                            if write_attendance_log(spreadsheet_id, log_data):
-                                                success_count += 1
-
-                                        if success_count == len(weekday_dates):
+                                        # 全日分を1回の append_rows でまとめて登録
+                                        if write_attendance_logs(spreadsheet_id, logs):
                                             if edit_leave_type_input == "代休":
                                                 st.success("✅ 休暇申請を更新しました。代休残高に反映されます。")
                                             else:
@@ -1541,7 +1610,6 @@ def show_leave_application_page():
                 st.error("❌ 指定期間に平日が含まれていません（土日のみの期間は登録できません）。")
                 return
 
-            success_count = 0
             total_days = len(weekday_dates)
 
             # 時間は日付によって変わらないので先に計算（代休の残高チェック用）
@@ -1569,11 +1637,12 @@ def show_leave_application_page():
                     st.error(err_msg)
                     return
 
+            logs = []
             for current_date in weekday_dates:
                 fiscal_year = calculate_fiscal_year(current_date)
                 
                 # ログデータを作成
-                log_data = {
+                logs.append({
                     "event_id": str(uuid.uuid4()),
                     "date": current_date.strftime("%Y-%m-%d"),
                     "staff_name": staff_name,
@@ -1584,17 +1653,12 @@ def show_leave_application_page():
                     "day_equivalent": day_equivalent,
                     "fiscal_year": fiscal_year,
                     "remarks": remarks
-                }
-                
-                # データベースに保存
-                if write_attendance_log(spreadsheet_id, log_data):
-                    success_count += 1
+                })
             
-            if success_count == total_days:
+            # データベースに一括保存（日数に関わらずAPI呼び出し回数は一定）
+            if write_attendance_logs(spreadsheet_id, logs):
                 st.success("✅ 休暇申請が正常に登録されました！")
                 st.balloons()
-            elif success_count > 0:
-                st.warning(f"一部の登録に失敗しました。（成功: {success_count}/{total_days}）")
             else:
                 st.error("休暇申請の登録に失敗しました。")
 
@@ -1737,13 +1801,8 @@ def show_overtime_compensation_page():
             items = []
 
             if not df_ot.empty and "staff_name" in df_ot.columns:
-                df_ot = df_ot.copy()
-                if "overtime_hours" in df_ot.columns:
-                    df_ot["overtime_hours"] = pd.to_numeric(df_ot["overtime_hours"], errors="coerce").fillna(0.0)
-                if "approved" in df_ot.columns:
-                    df_ot["approved"] = df_ot["approved"].astype(str).str.strip()
-                mask = df_ot["staff_name"].astype(str).str.strip() == str(staff_name).strip()
-                for _, r in df_ot[mask].iterrows():
+                mask = df_ot["staff_name"] == str(staff_name).strip()
+                for _, r in df_ot[mask].fillna({"overtime_hours": 0.0}).iterrows():
                     items.append(
                         {
                             "日付": r.get("date", ""),
@@ -1755,14 +1814,9 @@ def show_overtime_compensation_page():
                     )
 
             if not df_att.empty and "staff_name" in df_att.columns:
-                df_att = df_att.copy()
-                if "day_equivalent" in df_att.columns:
-                    df_att["day_equivalent"] = pd.to_numeric(df_att["day_equivalent"], errors="coerce").fillna(0.0)
-                if "type" in df_att.columns:
-                    df_att["type"] = df_att["type"].astype(str).str.strip()
-                mask = (df_att["staff_name"].astype(str).str.strip() == str(staff_name).strip()) & (df_att["type"] == "代休")
-                for _, r in df_att[mask].iterrows():
-                    hours_taken = pd.to_numeric(r.get("duration_hours"), errors="coerce")
+                mask = (df_att["staff_name"] == str(staff_name).strip()) & (df_att["type"] == "代休")
+                for _, r in df_att[mask].fillna({"day_equivalent": 0.0}).iterrows():
+                    hours_taken = r.get("duration_hours")
                     if pd.isna(hours_taken) or float(hours_taken) <= 0:
                         hours_taken = compensatory_days_to_hours(float(r.get("day_equivalent", 0.0)))
                     else:
@@ -1802,9 +1856,10 @@ def show_overtime_compensation_page():
                 st.subheader("全職員の代休残高一覧")
 
                 staff_list = get_staff_list()
+                balances = calculate_compensatory_balances(spreadsheet_id)
                 rows = []
                 for staff in staff_list:
-                    bal = calculate_compensatory_balance(spreadsheet_id, staff)
+                    bal = compensatory_balance_for(balances, staff)
                     rows.append(
                         {
                             "職員名": staff,
@@ -1832,11 +1887,11 @@ def show_overtime_compensation_page():
                 if df_ot.empty or "approved" not in df_ot.columns:
                     st.info("承認待ちの残業申請はありません。")
                 else:
-                    df_ot = df_ot.copy()
-                    df_ot["approved"] = df_ot["approved"].astype(str).str.strip()
-                    df_ot["overtime_hours"] = pd.to_numeric(df_ot.get("overtime_hours", 0.0), errors="coerce").fillna(0.0)
-                    df_ot["date"] = pd.to_datetime(df_ot.get("date", ""), errors="coerce")
-                    pending_df = df_ot[(df_ot["approved"] == "pending")].sort_values("date", ascending=False)
+                    pending_df = (
+                        df_ot[df_ot["approved"] == "pending"]
+                        .fillna({"overtime_hours": 0.0})
+                        .sort_values("date", ascending=False)
+                    )
 
                     if pending_df.empty:
                         st.info("承認待ちの残業申請はありません。")
@@ -3188,50 +3243,45 @@ def show_kibetu_list_page():
         if st.button("🚀 処理を開始", type="primary", use_container_width=True):
             with st.spinner("ファイルを処理しています..."):
                 try:
-                    import tempfile
                     import os
-                    from process_data import process_master_file
+                    from process_data import process_master_bytes
                     
-                    # 一時ファイルとして保存
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(uploaded_file.name)[1]) as tmp_file:
-                        tmp_file.write(uploaded_file.getvalue())
-                        tmp_path = tmp_file.name
+                    # データ処理を実行（同じ内容のファイルは前回の処理結果を再利用）
+                    result, from_cache = process_master_bytes(
+                        uploaded_file.getvalue(),
+                        suffix=os.path.splitext(uploaded_file.name)[1],
+                    )
                     
-                    try:
-                        # データ処理を実行
-                        result = process_master_file(tmp_path)
-                        
-                        # セッションに結果を保存
-                        st.session_state.kibetu_result = result
-                        st.session_state.kibetu_filename = uploaded_file.name
-                        
-                        # localStorageに保存するJavaScript（保存完了後にリロード）
-                        result_json = json.dumps(result, ensure_ascii=False, default=str)
-                        save_script = f"""
-                        <script>
-                        (function() {{
-                            try {{
-                                localStorage.setItem('kibetu_list_result', {json.dumps(result_json)});
-                                localStorage.setItem('kibetu_list_filename', {json.dumps(uploaded_file.name)});
-                                console.log('期別リストデータをlocalStorageに保存完了');
-                                // 保存完了後に少し待ってからリロード
-                                setTimeout(function() {{
-                                    window.location.reload();
-                                }}, 100);
-                            }} catch(e) {{
-                                console.error('localStorage保存エラー:', e);
+                    # セッションに結果を保存
+                    st.session_state.kibetu_result = result
+                    st.session_state.kibetu_filename = uploaded_file.name
+                    
+                    # localStorageに保存するJavaScript（保存完了後にリロード）
+                    result_json = json.dumps(result, ensure_ascii=False, default=str)
+                    save_script = f"""
+                    <script>
+                    (function() {{
+                        try {{
+                            localStorage.setItem('kibetu_list_result', {json.dumps(result_json)});
+                            localStorage.setItem('kibetu_list_filename', {json.dumps(uploaded_file.name)});
+                            console.log('期別リストデータをlocalStorageに保存完了');
+                            // 保存完了後に少し待ってからリロード
+                            setTimeout(function() {{
                                 window.location.reload();
-                            }}
-                        }})();
-                        </script>
-                        """
-                        st.components.v1.html(save_script, height=0)
-                        
+                            }}, 100);
+                        }} catch(e) {{
+                            console.error('localStorage保存エラー:', e);
+                            window.location.reload();
+                        }}
+                    }})();
+                    </script>
+                    """
+                    st.components.v1.html(save_script, height=0)
+                    
+                    if from_cache:
+                        st.success("✅ 同じファイルの処理結果を再利用しました！データを保存中...")
+                    else:
                         st.success("✅ 処理が完了しました！データを保存中...")
-                    finally:
-                        # 一時ファイルを削除
-                        if os.path.exists(tmp_path):
-                            os.unlink(tmp_path)
                             
                 except Exception as e:
                     st.error(f"❌ エラーが発生しました: {str(e)}")
@@ -3239,6 +3289,15 @@ def show_kibetu_list_page():
                     with st.expander("詳細なエラー情報"):
                         st.code(traceback.format_exc())
     
+    # 処理結果キャッシュの削除（管理者のみ）
+    if st.session_state.selected_user == ADMIN_USER and st.session_state.admin_authenticated:
+        with st.expander("🗑 処理結果のキャッシュ"):
+            st.caption("同じ内容のファイルは前回の処理結果を再利用します。結果を作り直したい場合はキャッシュを削除してください。")
+            if st.button("キャッシュを削除", key="kibetu_clear_result_cache"):
+                from process_data import clear_result_cache
+                removed = clear_result_cache()
+                st.success(f"✅ 処理結果のキャッシュを{removed}件削除しました")
+    
     # 結果の表示
     if "kibetu_result" in st.session_state and st.session_state.kibetu_result:
         result = st.session_state.kibetu_result
@@ -3699,9 +3758,10 @@ def show_admin_dashboard_page():
     )
     try:
         staff_members = get_staff_list()
+        balances = calculate_compensatory_balances(spreadsheet_id)
         balance_rows = []
         for staff in staff_members:
-            bal = calculate_compensatory_balance(spreadsheet_id, staff)
+            bal = compensatory_balance_for(balances, staff)
             balance_rows.append(
                 {
                     "職員名": staff,
@@ -3726,7 +3786,7 @@ def show_admin_dashboard_page():
     # 勤怠ログを取得
     df_logs = read_attendance_logs(spreadsheet_id)
     df_events_for_att = read_events(spreadsheet_id)
-    special_holiday_dates = set(_build_special_holiday_dates_from_events(df_events_for_att))
+    event_index = get_event_interval_index(df_events_for_att)
 
     st.markdown("---")
     st.subheader("📗 月別出勤日数（暦ベース・推定）")
@@ -3752,18 +3812,17 @@ def show_admin_dashboard_page():
     )
     leave_by_staff = build_staff_full_day_leave_dates_from_logs(df_logs)
     staff_for_attendance = get_staff_list()
+    att_grid = AttendanceDayGrid.for_years(admin_att_calendar_year, admin_att_calendar_year)
+    att_counts = att_grid.presumed_attendance_days(
+        [leave_by_staff.get(str(staff).strip(), set()) for staff in staff_for_attendance],
+        event_index.special_holiday_days,
+    )
     att_rows = []
-    for staff in staff_for_attendance:
-        fld = leave_by_staff.get(str(staff).strip(), set())
+    for staff, counts in zip(staff_for_attendance, att_counts):
         row = {"職員名": staff}
-        ysum = 0
-        for m in range(1, 13):
-            n = _count_presumed_attendance_days_in_month(
-                admin_att_calendar_year, m, fld, special_holiday_dates
-            )
+        for m, n in enumerate(counts.tolist(), start=1):
             row[f"{m}月"] = n
-            ysum += n
-        row["年間計"] = ysum
+        row["年間計"] = int(counts.sum())
         att_rows.append(row)
 
     df_att_days = pd.DataFrame(att_rows)
@@ -3772,15 +3831,17 @@ def show_admin_dashboard_page():
         _render_static_html_table(df_att_days[["職員名"] + month_cols + ["年間計"]].reset_index(drop=True))
 
     with st.expander("各月の営業日数（同一の土日・祝除き定義・職員共通）"):
+        business_per_month = att_grid.count_per_month(att_grid.business)
+        special_per_month = att_grid.count_per_month(
+            att_grid.business & att_grid.day_mask(event_index.special_holiday_days)
+        )
         wd_table = []
-        for m in range(1, 13):
-            workdays = japanese_business_calendar_dates_in_month(admin_att_calendar_year, m)
-            sh_in_month = workdays & special_holiday_dates
+        for m, n_business, n_special in zip(range(1, 13), business_per_month.tolist(), special_per_month.tolist()):
             wd_table.append({
                 "月": f"{m}月",
-                "営業日数（日）": len(workdays),
-                "特休日数（日）": len(sh_in_month),
-                "出勤可能日数（日）": len(workdays) - len(sh_in_month),
+                "営業日数（日）": n_business,
+                "特休日数（日）": n_special,
+                "出勤可能日数（日）": n_business - n_special,
             })
         _render_static_html_table(pd.DataFrame(wd_table).reset_index(drop=True))
 
@@ -3809,7 +3870,6 @@ def show_admin_dashboard_page():
         
         # 選択された年度のデータをフィルタリング
         # 日付から年度を再計算（スプレッドシートのfiscal_year列は使わない）
-        df_logs["date"] = pd.to_datetime(df_logs["date"], errors="coerce")
         df_logs["calculated_fiscal_year"] = df_logs["date"].apply(lambda x: calculate_fiscal_year(x.date()) if pd.notna(x) else None)
         df_year_full = df_logs[df_logs["calculated_fiscal_year"] == selected_year].copy()
         
@@ -3825,12 +3885,6 @@ def show_admin_dashboard_page():
         elif selected_month_filter != "年間" and df_year.empty:
             st.warning(f"{selected_year}年度の{selected_month_filter}のデータがありません。")
         else:
-            # 職員ごと、休暇種別ごとに集計（表示期間の使用日数）
-            df_year["day_equivalent"] = pd.to_numeric(df_year["day_equivalent"], errors="coerce")
-            
-            # 年間の使用日数も計算（残日数計算用）
-            df_year_full["day_equivalent"] = pd.to_numeric(df_year_full["day_equivalent"], errors="coerce")
-            
             # 集計用のデータフレームを作成
             summary_data = []
             
@@ -3968,8 +4022,7 @@ def show_admin_dashboard_page():
             # 休暇種別の選択（ラジオボタン）
             selected_leave_type = st.radio("休暇種別を選択", LEAVE_TYPES, key="monthly_leave_type", horizontal=True)
             
-            # 日付をdatetime型に変換（年間データを使用）
-            df_year_full["date"] = pd.to_datetime(df_year_full["date"], errors="coerce")
+            # 年間データに月列を付与
             df_year_full["month"] = df_year_full["date"].dt.month
             
             # 選択された休暇種別でフィルタリング（年間データから）
@@ -12,12 +12,15 @@ def _ensure_system_ssl_certs() -> None:
 
 _ensure_system_ssl_certs()
 
+import time
 import gspread
-from gspread.exceptions import SpreadsheetNotFound, APIError
+from gspread.exceptions import SpreadsheetNotFound, WorksheetNotFound, APIError, GSpreadException
+from gspread.utils import numericise_all
 from google.oauth2 import service_account
 import streamlit as st
 import pandas as pd
 from typing import Optional, List, Dict, Any
+from local_store import get_local_store, ensure_reconciler
 
 
 def get_credentials():
@@ -57,16 +60,111 @@ def get_client():
         return None
 
 
-def get_spreadsheet(spreadsheet_id: str):
+# Spreadsheet / Worksheet オブジェクトのキャッシュ
+# open_by_key と worksheet() はどちらもメタデータ取得のAPI呼び出しになるため、TTL付きで使い回す。
+# シート削除などで見つからなくなった場合（WorksheetNotFound / 404）は即座に破棄する。
+_HANDLE_CACHE_TTL_SECONDS = 600
+_SPREADSHEET_HANDLES: Dict[str, tuple[float, Any]] = {}
+_WORKSHEET_HANDLES: Dict[tuple[str, str], tuple[float, Any]] = {}
+
+
+def _get_cached_handle(cache: Dict, key):
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    cached_at, handle = entry
+    if time.monotonic() - cached_at > _HANDLE_CACHE_TTL_SECONDS:
+        cache.pop(key, None)
+        return None
+    return handle
+
+
+def _is_not_found_error(error: Exception) -> bool:
+    """シート・スプレッドシートが存在しないことを示すエラーか。"""
+    if isinstance(error, (SpreadsheetNotFound, WorksheetNotFound)):
+        return True
+    if isinstance(error, APIError):
+        status = getattr(getattr(error, "response", None), "status_code", None)
+        if status == 404:
+            return True
+        # 削除済みシートの sheetId を指定した batch_update は 400 "No grid with id" になる
+        return "No grid with id" in str(error)
+    return False
+
+
+def invalidate_handle_cache(spreadsheet_id: Optional[str] = None, sheet_name: Optional[str] = None) -> None:
     """
-    スプレッドシートを取得
+    Spreadsheet / Worksheet のキャッシュを破棄する（引数なしで全件）。
+    sheet_name 指定時はそのシートのみ、spreadsheet_id のみ指定時はスプレッドシートごと破棄する。
     """
+    if sheet_name is None:
+        for key in list(_SPREADSHEET_HANDLES):
+            if spreadsheet_id is None or key == spreadsheet_id:
+                _SPREADSHEET_HANDLES.pop(key, None)
+    for key in list(_WORKSHEET_HANDLES):
+        if spreadsheet_id is not None and key[0] != spreadsheet_id:
+            continue
+        if sheet_name is not None and key[1] != sheet_name:
+            continue
+        _WORKSHEET_HANDLES.pop(key, None)
+
+
+def _forget_worksheet_handle(worksheet, error: Exception) -> None:
+    """見つからない系のエラーだった場合のみ、そのシートのキャッシュを破棄する。"""
+    if not _is_not_found_error(error):
+        return
+    try:
+        invalidate_handle_cache(worksheet.spreadsheet.id, worksheet.title)
+    except Exception:
+        pass
+
+
+def _open_spreadsheet_cached(spreadsheet_id: str):
+    """
+    スプレッドシートを取得（キャッシュ付き）。失敗時は例外をそのまま送出する。
+    """
+    spreadsheet = _get_cached_handle(_SPREADSHEET_HANDLES, spreadsheet_id)
+    if spreadsheet is not None:
+        return spreadsheet
     client = get_client()
     if client is None:
-        return None
+        raise RuntimeError("gspreadクライアントを取得できませんでした")
     try:
         spreadsheet = client.open_by_key(spreadsheet_id)
-        return spreadsheet
+    except Exception as e:
+        if _is_not_found_error(e):
+            invalidate_handle_cache(spreadsheet_id)
+        raise
+    _SPREADSHEET_HANDLES[spreadsheet_id] = (time.monotonic(), spreadsheet)
+    return spreadsheet
+
+
+def _open_worksheet_cached(spreadsheet, sheet_name: str):
+    """
+    スプレッドシート内のシートを取得（キャッシュ付き）。失敗時は例外をそのまま送出する。
+    """
+    key = (spreadsheet.id, sheet_name)
+    worksheet = _get_cached_handle(_WORKSHEET_HANDLES, key)
+    if worksheet is not None:
+        return worksheet
+    try:
+        worksheet = spreadsheet.worksheet(sheet_name)
+    except Exception as e:
+        if _is_not_found_error(e):
+            invalidate_handle_cache(spreadsheet.id, sheet_name)
+        raise
+    _WORKSHEET_HANDLES[key] = (time.monotonic(), worksheet)
+    return worksheet
+
+
+def get_spreadsheet(spreadsheet_id: str):
+    """
+    スプレッドシートを取得（キャッシュ付き）
+    """
+    if get_client() is None:
+        return None
+    try:
+        return _open_spreadsheet_cached(spreadsheet_id)
     except SpreadsheetNotFound:
         st.error(f"❌ スプレッドシートが見つかりませんでした。")
         st.info(f"""
@@ -105,40 +203,332 @@ def get_spreadsheet(spreadsheet_id: str):
 
 def get_worksheet(spreadsheet_id: str, sheet_name: str):
     """
-    指定したシートを取得
+    指定したシートを取得（Spreadsheet / Worksheet オブジェクトはキャッシュを使用）
     """
     spreadsheet = get_spreadsheet(spreadsheet_id)
     if spreadsheet is None:
         return None
     try:
-        worksheet = spreadsheet.worksheet(sheet_name)
+        worksheet = _open_worksheet_cached(spreadsheet, sheet_name)
         return worksheet
     except Exception as e:
         st.error(f"シート '{sheet_name}' の取得に失敗しました: {e}")
         return None
 
 
+# (スプレッドシートID, シート名) -> ヘッダー行
+# 一度確認したシートはヘッダー確認のための読み込みを省略する（書き込みエラー時に破棄）
+_HEADER_REGISTRY: Dict[tuple[str, str], List[str]] = {}
+
+
+def _header_registry_key(worksheet) -> tuple[str, str]:
+    return (worksheet.spreadsheet.id, worksheet.title)
+
+
+def _read_header_row(worksheet) -> List[str]:
+    """
+    1行目（ヘッダー）を返す。キャッシュ済みならAPIを呼ばない。
+    シートが空の場合は空リストを返す（キャッシュしない）。
+    """
+    key = _header_registry_key(worksheet)
+    cached = _HEADER_REGISTRY.get(key)
+    if cached is not None:
+        return list(cached)
+    headers = worksheet.row_values(1)
+    if headers:
+        _HEADER_REGISTRY[key] = list(headers)
+    return list(headers)
+
+
+def _remember_header_row(worksheet, headers: List[str]) -> None:
+    """書き込んだヘッダー行をキャッシュに登録する。"""
+    _HEADER_REGISTRY[_header_registry_key(worksheet)] = list(headers)
+
+
+def invalidate_header_cache(spreadsheet_id: Optional[str] = None, sheet_name: Optional[str] = None) -> None:
+    """
+    ヘッダーキャッシュを破棄する（引数なしで全件、指定時は一致するものだけ）。
+    シートのヘッダーを手動で編集した場合などに呼び出す。
+    """
+    for key in list(_HEADER_REGISTRY):
+        if spreadsheet_id is not None and key[0] != spreadsheet_id:
+            continue
+        if sheet_name is not None and key[1] != sheet_name:
+            continue
+        _HEADER_REGISTRY.pop(key, None)
+
+
+def _invalidate_worksheet_headers(worksheet, error: Optional[Exception] = None) -> None:
+    """
+    書き込みエラー時に、次回はヘッダーを再確認するようキャッシュを破棄する。
+    シートが見つからないエラーの場合は Worksheet オブジェクトのキャッシュも破棄する。
+    """
+    try:
+        _HEADER_REGISTRY.pop(_header_registry_key(worksheet), None)
+    except Exception:
+        pass
+    if error is not None:
+        _forget_worksheet_handle(worksheet, error)
+
+
+def _local_store_key(worksheet) -> Optional[tuple[str, str]]:
+    """ローカルストアが有効な場合のみ (スプレッドシートID, シート名) を返す。"""
+    if get_local_store() is None:
+        return None
+    try:
+        return (worksheet.spreadsheet.id, worksheet.title)
+    except Exception:
+        return None
+
+
+def _local_store_begin_write(worksheet) -> Optional[tuple[str, str]]:
+    """Sheets への書き込み前に呼び、ローカルストア有効時は (スプレッドシートID, シート名) を返す。"""
+    key = _local_store_key(worksheet)
+    if key is not None:
+        get_local_store().begin_write(key[0], key[1])
+    return key
+
+
+def _append_rows(worksheet, rows: List[list]) -> None:
+    """行を追加する（ローカルストア有効時は同じ行をローカルにも追加）。"""
+    key = _local_store_begin_write(worksheet)
+    worksheet.append_rows(rows)
+    if key is not None:
+        get_local_store().append_rows(key[0], key[1], rows)
+
+
+def _update_range(worksheet, range_name: str, values: List[list]) -> None:
+    """範囲を上書きする（ローカルストア有効時は次回読み込みで Sheets から取り直す）。"""
+    key = _local_store_begin_write(worksheet)
+    worksheet.update(range_name, values)
+    if key is not None:
+        get_local_store().mark_stale(key[0], key[1])
+
+
+def _group_contiguous_rows(row_numbers: List[int]) -> List[tuple[int, int]]:
+    """
+    行番号（1-indexed）を連続する範囲 (開始行, 終了行) にまとめる。
+    後ろの範囲から削除しても前の行番号がずれないよう、降順で返す。
+    """
+    ranges: List[tuple[int, int]] = []
+    for row in sorted(set(row_numbers), reverse=True):
+        if ranges and ranges[-1][0] == row + 1:
+            ranges[-1] = (row, ranges[-1][1])
+        else:
+            ranges.append((row, row))
+    return ranges
+
+
+def _delete_rows_batch(worksheet, all_values: List[List[Any]], row_numbers: List[int]) -> int:
+    """
+    指定した行（1-indexed）を batch_update 1回でまとめて削除し、削除した行数を返す。
+    連続する行は1つの deleteDimension リクエストに集約する。
+    all_values は削除対象を探した get_all_values() の結果で、ローカルストアからは
+    各行の1列目の ID で削除する（行番号はローカルとずれている可能性があるため使わない）。
+    """
+    ranges = _group_contiguous_rows(row_numbers)
+    if not ranges:
+        return 0
+    requests = [
+        {
+            "deleteDimension": {
+                "range": {
+                    "sheetId": worksheet.id,
+                    "dimension": "ROWS",
+                    "startIndex": start - 1,  # 0-indexed（開始を含む）
+                    "endIndex": end,          # 0-indexed（終了を含まない）
+                }
+            }
+        }
+        for start, end in ranges
+    ]
+    key = _local_store_begin_write(worksheet)
+    try:
+        worksheet.spreadsheet.batch_update({"requests": requests})
+    except APIError as e:
+        _forget_worksheet_handle(worksheet, e)
+        raise
+    if key is not None:
+        row_keys = [
+            all_values[row - 1][0] if all_values[row - 1] else ""
+            for row in sorted(set(row_numbers))
+        ]
+        get_local_store().delete_rows(key[0], key[1], row_keys)
+    return sum(end - start + 1 for start, end in ranges)
+
+
+# ========== 全シート一括読み込み（スナップショット） ==========
+_SNAPSHOT_SHEETS = [
+    "attendance_logs",
+    "events",
+    "overtime_logs",
+    "bulletin_board",
+    "staff",
+]
+
+
+def _values_to_records(values: List[List[Any]]) -> List[Dict[str, Any]]:
+    """
+    シートの値（1行目がヘッダー）を worksheet.get_all_records() と同じ形式の辞書リストに変換する。
+    """
+    if not values or values == [[]]:
+        return []
+    width = max(len(row) for row in values)
+    padded = [list(row) + [""] * (width - len(row)) for row in values]
+    keys = padded[0]
+    duplicates = [k for k in dict.fromkeys(keys) if keys.count(k) > 1]
+    if duplicates:
+        raise GSpreadException(f"the header row in the worksheet contains duplicates: {duplicates}")
+    rows = [numericise_all(row, False, "") for row in padded[1:]]
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def _batch_get_sheet_values(spreadsheet, sheet_names: List[str]) -> Dict[str, List[List[Any]]]:
+    response = spreadsheet.values_batch_get([f"'{name}'" for name in sheet_names])
+    value_ranges = response.get("valueRanges", [])
+    return {
+        name: value_range.get("values", [])
+        for name, value_range in zip(sheet_names, value_ranges)
+    }
+
+
+def _fetch_sheet_values(spreadsheet_id: str) -> Optional[Dict[str, List[List[Any]]]]:
+    """
+    全シートの値を values_batch_get 1回で取得する（シート名 -> 行リスト）。
+    存在しないシートは結果に含めない。取得に失敗した場合は None。
+    """
+    if get_client() is None:
+        return None
+    try:
+        spreadsheet = _open_spreadsheet_cached(spreadsheet_id)
+        try:
+            return _batch_get_sheet_values(spreadsheet, _SNAPSHOT_SHEETS)
+        except APIError as e:
+            if "429" in str(e) or "Quota exceeded" in str(e):
+                return None
+            # 未作成のシート（overtime_logs 等）があると範囲指定エラーになるため、存在するシートだけで再取得
+            existing = {ws.title for ws in spreadsheet.worksheets()}
+            sheet_names = [name for name in _SNAPSHOT_SHEETS if name in existing]
+            return _batch_get_sheet_values(spreadsheet, sheet_names) if sheet_names else {}
+    except Exception:
+        return None
+
+
+def _load_sheet_values(spreadsheet_id: str) -> Optional[Dict[str, List[List[Any]]]]:
+    """
+    ローカルストアが有効ならそこから、無効または未同期なら Sheets から全シートの値を取得する。
+    Sheets から取得した値はローカルストアにも保存する。
+    """
+    store = get_local_store()
+    if store is None:
+        return _fetch_sheet_values(spreadsheet_id)
+
+    ensure_reconciler(store, spreadsheet_id, _SNAPSHOT_SHEETS, _fetch_sheet_values)
+    values_by_sheet = store.load_values(spreadsheet_id, _SNAPSHOT_SHEETS)
+    if values_by_sheet is not None:
+        return values_by_sheet
+
+    generations = store.generations(spreadsheet_id, _SNAPSHOT_SHEETS)
+    values_by_sheet = _fetch_sheet_values(spreadsheet_id)
+    if values_by_sheet is None:
+        # Sheets に接続できない（レート制限等）場合は、古くてもローカルの値を返す
+        return store.load_values(spreadsheet_id, _SNAPSHOT_SHEETS, allow_stale=True)
+    store.replace_values(spreadsheet_id, values_by_sheet, _SNAPSHOT_SHEETS, generations)
+    return values_by_sheet
+
+
+class SnapshotUnavailableError(Exception):
+    """全シートの一括読み込みに失敗した（レート制限・一時的なエラー等）。"""
+
+
+@st.cache_data(ttl=60)  # 60秒間キャッシュ
+def read_sheet_snapshot(spreadsheet_id: str) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    全シートを values_batch_get 1回（ローカルストア有効時はローカル）で読み込み、
+    シート名 -> レコードリストの辞書を返す（キャッシュ付き）
+    存在しないシートは結果に含めない。取得に失敗した場合は SnapshotUnavailableError を送出する
+    （例外はキャッシュされないため、次の呼び出しで取り直す）。
+    """
+    values_by_sheet = _load_sheet_values(spreadsheet_id)
+    if values_by_sheet is None:
+        raise SnapshotUnavailableError(spreadsheet_id)
+
+    snapshot: Dict[str, List[Dict[str, Any]]] = {}
+    for name, values in values_by_sheet.items():
+        try:
+            snapshot[name] = _values_to_records(values)
+        except GSpreadException:
+            # ヘッダー重複などは個別読み込み側でエラー表示させる
+            continue
+    return snapshot
+
+
+def _snapshot_records(spreadsheet_id: str, sheet_name: str) -> Optional[List[Dict[str, Any]]]:
+    """スナップショットから指定シートのレコードを返す（無い場合・取得できない場合は None で、呼び出し側は個別読み込みに戻る）。"""
+    try:
+        snapshot = read_sheet_snapshot(spreadsheet_id)
+    except SnapshotUnavailableError:
+        return None
+    return snapshot.get(sheet_name)
+
+
+_ATTENDANCE_LOG_HEADERS = [
+    "event_id", "date", "staff_name", "type",
+    "start_time", "end_time", "duration_hours",
+    "day_equivalent", "fiscal_year", "remarks"
+]
+
+
+def _clean_event_id_column(series: pd.Series) -> pd.Series:
+    """event_id 列を比較可能な文字列に揃える（NaN / 'nan' / 'None' は空文字）。"""
+    cleaned = series.astype(str).str.strip()
+    blank = series.isna() | cleaned.str.lower().isin(["nan", "none", ""])
+    return cleaned.mask(blank, "")
+
+
+def _typed_log_frame(df: pd.DataFrame, float_columns: List[str]) -> pd.DataFrame:
+    """
+    ログ系シートの DataFrame を読み込み時に一度だけ型付けする。
+    date → datetime64（解釈できない値は NaT）、時間・日数 → float（空欄は NaN）、
+    staff_name / type → 前後空白を除いた category、event_id・approved → 正規化済みの文字列。
+    """
+    df.columns = df.columns.str.strip()
+    if "event_id" in df.columns:
+        df["event_id"] = _clean_event_id_column(df["event_id"])
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    for col in float_columns:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(float)
+    for col in ("staff_name", "type"):
+        if col in df.columns:
+            df[col] = df[col].fillna("").astype(str).str.strip().astype("category")
+    if "approved" in df.columns:
+        df["approved"] = df["approved"].fillna("").astype(str).str.strip()
+    return df
+
+
 @st.cache_data(ttl=60)  # 60秒間キャッシュ
 def read_attendance_logs(spreadsheet_id: str) -> pd.DataFrame:
     """
     勤怠ログを読み込む（キャッシュ付き）
     """
-    worksheet = get_worksheet(spreadsheet_id, "attendance_logs")
-    if worksheet is None:
-        return pd.DataFrame()
+    data = _snapshot_records(spreadsheet_id, "attendance_logs")
+    worksheet = None
+    if data is None:
+        worksheet = get_worksheet(spreadsheet_id, "attendance_logs")
+        if worksheet is None:
+            return pd.DataFrame()
     
     try:
-        # ヘッダー行を含めて全データを取得
-        data = worksheet.get_all_records()
+        # ヘッダー行を含めて全データを取得（スナップショットが無い場合のみ個別に取得）
+        if worksheet is not None:
+            data = worksheet.get_all_records()
         if not data:
             # 空の場合はヘッダーのみのDataFrameを返す
-            return pd.DataFrame(columns=[
-                "event_id", "date", "staff_name", "type", 
-                "start_time", "end_time", "duration_hours", 
-                "day_equivalent", "fiscal_year", "remarks"
-            ])
+            return _typed_log_frame(pd.DataFrame(columns=_ATTENDANCE_LOG_HEADERS), ["duration_hours", "day_equivalent"])
         df = pd.DataFrame(data)
-        return df
+        return _typed_log_frame(df, ["duration_hours", "day_equivalent"])
     except APIError as e:
         if "429" in str(e) or "Quota exceeded" in str(e):
             st.error("⚠️ APIのレート制限に達しました。しばらく待ってから再度お試しください。")
@@ -151,44 +541,48 @@ def read_attendance_logs(spreadsheet_id: str) -> pd.DataFrame:
         return pd.DataFrame()
 
 
+def _build_attendance_row(log_data: Dict[str, Any]) -> list:
+    """ヘッダー順に勤怠ログの行データを組み立てる。"""
+    return [log_data.get(h, "") for h in _ATTENDANCE_LOG_HEADERS]
+
+
 def write_attendance_log(spreadsheet_id: str, log_data: Dict[str, Any]):
     """
     勤怠ログを1件追加
     """
+    return write_attendance_logs(spreadsheet_id, [log_data])
+
+
+def write_attendance_logs(spreadsheet_id: str, logs: List[Dict[str, Any]]) -> bool:
+    """
+    勤怠ログを複数件まとめて追加（複数日の休暇申請用）
+    ヘッダー確認は1回、書き込みは append_rows 1回で行うため、日数に関わらずAPI呼び出し回数は一定
+    """
+    if not logs:
+        return True
+
     worksheet = get_worksheet(spreadsheet_id, "attendance_logs")
     if worksheet is None:
         return False
     
     try:
-        # 既存データを確認してヘッダーがあるかチェック
-        existing_data = worksheet.get_all_values()
-        if not existing_data:
-            # ヘッダーがない場合は追加
-            headers = [
-                "event_id", "date", "staff_name", "type",
-                "start_time", "end_time", "duration_hours",
-                "day_equivalent", "fiscal_year", "remarks"
-            ]
-            worksheet.append_row(headers)
+        # ヘッダーがあるかチェック（確認済みならキャッシュを使用）
+        existing_headers = _read_header_row(worksheet)
+        rows = [_build_attendance_row(log_data) for log_data in logs]
+        if not existing_headers:
+            # ヘッダーがない場合は先頭に追加
+            rows.insert(0, list(_ATTENDANCE_LOG_HEADERS))
         
-        # データを追加
-        row = [
-            log_data.get("event_id", ""),
-            log_data.get("date", ""),
-            log_data.get("staff_name", ""),
-            log_data.get("type", ""),
-            log_data.get("start_time", ""),
-            log_data.get("end_time", ""),
-            log_data.get("duration_hours", ""),
-            log_data.get("day_equivalent", ""),
-            log_data.get("fiscal_year", ""),
-            log_data.get("remarks", "")
-        ]
-        worksheet.append_row(row)
+        # データを一括追加
+        _append_rows(worksheet, rows)
+        if not existing_headers:
+            _remember_header_row(worksheet, _ATTENDANCE_LOG_HEADERS)
         # キャッシュをクリアして最新データを反映
         read_attendance_logs.clear()
+        read_sheet_snapshot.clear()
         return True
     except APIError as e:
+        _invalidate_worksheet_headers(worksheet, e)
         if "429" in str(e) or "Quota exceeded" in str(e):
             st.error("⚠️ APIのレート制限に達しました。しばらく待ってから再度お試しください。")
             st.info("💡 ヒント: 1〜2分待ってから再度お試しください。")
@@ -196,6 +590,7 @@ def write_attendance_log(spreadsheet_id: str, log_data: Dict[str, Any]):
             st.error(f"APIエラーが発生しました: {e}")
         return False
     except Exception as e:
+        _invalidate_worksheet_headers(worksheet, e)
         st.error(f"勤怠ログの書き込みに失敗しました: {e}")
         return False
 
@@ -205,12 +600,16 @@ def read_bulletin_board(spreadsheet_id: str) -> pd.DataFrame:
     """
     掲示板データを読み込む（最新順にソート、キャッシュ付き）
     """
-    worksheet = get_worksheet(spreadsheet_id, "bulletin_board")
-    if worksheet is None:
-        return pd.DataFrame()
+    data = _snapshot_records(spreadsheet_id, "bulletin_board")
+    worksheet = None
+    if data is None:
+        worksheet = get_worksheet(spreadsheet_id, "bulletin_board")
+        if worksheet is None:
+            return pd.DataFrame()
     
     try:
-        data = worksheet.get_all_records()
+        if worksheet is not None:
+            data = worksheet.get_all_records()
         if not data:
             return pd.DataFrame(columns=["post_id", "timestamp", "author", "title", "content", "bulletin_color"])
         
@@ -254,19 +653,20 @@ def write_bulletin_post(spreadsheet_id: str, post_data: Dict[str, Any]):
         return False
     
     try:
-        # 既存データを確認してヘッダーがあるかチェック
-        existing_data = worksheet.get_all_values()
-        if not existing_data:
+        # ヘッダーがあるかチェック（確認済みならキャッシュを使用）
+        headers = _read_header_row(worksheet)
+        if not headers:
             # ヘッダーがない場合は追加
             headers = ["post_id", "timestamp", "author", "title", "content", "bulletin_color"]
-            worksheet.append_row(headers)
+            _append_rows(worksheet, [headers])
+            _remember_header_row(worksheet, headers)
         else:
             # 既存ヘッダーに色列がない場合は追加
-            headers = existing_data[0]
             if "bulletin_color" not in headers:
                 headers.append("bulletin_color")
                 header_range = f"A1:{chr(64 + len(headers))}1"
-                worksheet.update(header_range, [headers])
+                _update_range(worksheet, header_range, [headers])
+                _remember_header_row(worksheet, headers)
         
         # post_idを追加（UUIDを使用）
         import uuid
@@ -282,11 +682,13 @@ def write_bulletin_post(spreadsheet_id: str, post_data: Dict[str, Any]):
             post_data.get("content", ""),
             post_data.get("bulletin_color", "#FEF3C7"),
         ]
-        worksheet.append_row(row)
+        _append_rows(worksheet, [row])
         # キャッシュをクリアして最新データを反映
         read_bulletin_board.clear()
+        read_sheet_snapshot.clear()
         return True
     except APIError as e:
+        _invalidate_worksheet_headers(worksheet, e)
         if "429" in str(e) or "Quota exceeded" in str(e):
             st.error("⚠️ APIのレート制限に達しました。しばらく待ってから再度お試しください。")
             st.info("💡 ヒント: 1〜2分待ってから再度お試しください。")
@@ -294,6 +696,7 @@ def write_bulletin_post(spreadsheet_id: str, post_data: Dict[str, Any]):
             st.error(f"APIエラーが発生しました: {e}")
         return False
     except Exception as e:
+        _invalidate_worksheet_headers(worksheet, e)
         st.error(f"掲示板への投稿に失敗しました: {e}")
         return False
 
@@ -316,9 +719,10 @@ def delete_bulletin_post(spreadsheet_id: str, post_id: str) -> bool:
         for i in range(len(all_values) - 1, 0, -1):  # 最後の行から2行目まで
             row = all_values[i]
             if len(row) > 0 and row[0] == post_id:  # post_idは最初の列
-                worksheet.delete_rows(i + 1)  # 1-indexed
+                _delete_rows_batch(worksheet, all_values, [i + 1])  # 1-indexed
                 # キャッシュをクリア
                 read_bulletin_board.clear()
+                read_sheet_snapshot.clear()
                 return True
         
         return False
@@ -353,7 +757,8 @@ def update_bulletin_post(spreadsheet_id: str, post_id: str, post_data: Dict[str,
         if "bulletin_color" not in headers:
             headers.append("bulletin_color")
             header_range = f"A1:{chr(64 + len(headers))}1"
-            worksheet.update(header_range, [headers])
+            _update_range(worksheet, header_range, [headers])
+            _remember_header_row(worksheet, headers)
             all_values = worksheet.get_all_values()
 
         # post_idが一致する行を探して更新
@@ -369,9 +774,10 @@ def update_bulletin_post(spreadsheet_id: str, post_id: str, post_data: Dict[str,
                     post_data.get("content", row[4] if len(row) > 4 else ""),
                     post_data.get("bulletin_color", row[5] if len(row) > 5 else "#FEF3C7"),
                 ]
-                worksheet.update(f"A{i+1}:F{i+1}", [updated_row])  # 1-indexed
+                _update_range(worksheet, f"A{i+1}:F{i+1}", [updated_row])  # 1-indexed
                 # キャッシュをクリア
                 read_bulletin_board.clear()
+                read_sheet_snapshot.clear()
                 return True
         
         return False
@@ -398,6 +804,13 @@ def _is_nonempty_cell(value) -> bool:
     return str(value).strip().lower() not in ("", "nan")
 
 
+def _nonempty_cell_text(column: pd.Series) -> pd.Series:
+    """列の各セルを前後空白を除いた文字列にする（_is_nonempty_cell で空とみなすセルは NaN）。"""
+    text = column[column.notna()].astype(str).str.strip()
+    text = text[~text.str.lower().isin(["", "nan"])]
+    return text.astype(object).reindex(column.index)
+
+
 def _coalesce_duplicate_event_columns(df: pd.DataFrame) -> pd.DataFrame:
     """
     正規化後に同名になる列（例: end_date と end_date |）を行ごとにマージする。
@@ -414,7 +827,6 @@ def _coalesce_duplicate_event_columns(df: pd.DataFrame) -> pd.DataFrame:
         groups.setdefault(name, []).append((i, str(raw_name).strip()))
 
     rows: dict[str, list[str]] = {}
-    n = len(df)
 
     for name, cols in groups.items():
 
@@ -424,25 +836,14 @@ def _coalesce_duplicate_event_columns(df: pd.DataFrame) -> pd.DataFrame:
             has_pipe = "|" in raw
             return (0 if exact else 1, 1 if has_pipe else 0, idx)
 
+        # 優先順に並べた候補列を、空セルを NaN にした文字列の列として横に並べ、
+        # 左から最初の値を取る（行ごとに「優先順で最初の空でない値」）
         ordered = sorted(cols, key=col_rank)
-        merged: list[str] = []
-        for row_idx in range(n):
-            chosen = ""
-            for idx, raw in ordered:
-                val = df.iloc[row_idx, idx]
-                if not _is_nonempty_cell(val):
-                    continue
-                if raw == name:
-                    chosen = str(val).strip()
-                    break
-            if not chosen:
-                for idx, _raw in ordered:
-                    val = df.iloc[row_idx, idx]
-                    if _is_nonempty_cell(val):
-                        chosen = str(val).strip()
-                        break
-            merged.append(chosen)
-        rows[name] = merged
+        candidates = pd.DataFrame(
+            {rank: _nonempty_cell_text(df.iloc[:, idx]) for rank, (idx, _raw) in enumerate(ordered)}
+        )
+        merged = candidates.bfill(axis=1).iloc[:, 0].fillna("")
+        rows[name] = merged.tolist()
 
     out = pd.DataFrame(rows)
     ordered_names = [h for h in _EVENT_HEADERS if h in out.columns]
@@ -457,12 +858,16 @@ def read_events(spreadsheet_id: str, _read_version: int = 3) -> pd.DataFrame:
     """
     イベントデータを読み込む（キャッシュ付き）
     """
-    worksheet = get_worksheet(spreadsheet_id, "events")
-    if worksheet is None:
-        return pd.DataFrame()
+    data = _snapshot_records(spreadsheet_id, "events")
+    worksheet = None
+    if data is None:
+        worksheet = get_worksheet(spreadsheet_id, "events")
+        if worksheet is None:
+            return pd.DataFrame()
     
     try:
-        data = worksheet.get_all_records()
+        if worksheet is not None:
+            data = worksheet.get_all_records()
         if not data:
             return pd.DataFrame(columns=["event_id", "start_date", "end_date", "title", "description", "color", "start_time", "end_time"])
         df = pd.DataFrame(data)
@@ -494,12 +899,13 @@ _EVENT_HEADERS = [
 
 def _ensure_event_headers(worksheet) -> list[str]:
     """events シートのヘッダー行を整え、列名リストを返す。"""
-    existing_data = worksheet.get_all_values()
-    if not existing_data:
-        worksheet.append_row(_EVENT_HEADERS)
+    existing_headers = _read_header_row(worksheet)
+    if not existing_headers:
+        _append_rows(worksheet, [_EVENT_HEADERS])
+        _remember_header_row(worksheet, _EVENT_HEADERS)
         return list(_EVENT_HEADERS)
 
-    headers = [str(h).strip() for h in existing_data[0]]
+    headers = [str(h).strip() for h in existing_headers]
     changed = False
 
     # 旧列名（end_date | 等）を正規名にリネーム（正規列がまだ無い場合のみ）
@@ -516,7 +922,8 @@ def _ensure_event_headers(worksheet) -> list[str]:
             changed = True
     if changed:
         header_range = f"A1:{chr(64 + len(headers))}1"
-        worksheet.update(header_range, [headers])
+        _update_range(worksheet, header_range, [headers])
+        _remember_header_row(worksheet, headers)
     return headers
 
 
@@ -546,10 +953,12 @@ def write_event(spreadsheet_id: str, event_data: Dict[str, Any]):
     
     try:
         headers = _ensure_event_headers(worksheet)
-        worksheet.append_row(_build_event_row(headers, event_data))
+        _append_rows(worksheet, [_build_event_row(headers, event_data)])
         read_events.clear()
+        read_sheet_snapshot.clear()
         return True
     except APIError as e:
+        _invalidate_worksheet_headers(worksheet, e)
         if "429" in str(e) or "Quota exceeded" in str(e):
             st.error("⚠️ APIのレート制限に達しました。しばらく待ってから再度お試しください。")
             st.info("💡 ヒント: 1〜2分待ってから再度お試しください。")
@@ -557,6 +966,7 @@ def write_event(spreadsheet_id: str, event_data: Dict[str, Any]):
             st.error(f"APIエラーが発生しました: {e}")
         return False
     except Exception as e:
+        _invalidate_worksheet_headers(worksheet, e)
         st.error(f"イベントの追加に失敗しました: {e}")
         return False
 
@@ -576,9 +986,10 @@ def delete_all_attendance_logs(spreadsheet_id: str) -> bool:
             return True
         
         # ヘッダー以外の行を削除（2行目から最後まで）
-        worksheet.delete_rows(2, len(all_values))
+        _delete_rows_batch(worksheet, all_values, list(range(2, len(all_values) + 1)))
         # キャッシュをクリア
         read_attendance_logs.clear()
+        read_sheet_snapshot.clear()
         return True
     except APIError as e:
         if "429" in str(e) or "Quota exceeded" in str(e):
@@ -607,9 +1018,10 @@ def delete_all_events(spreadsheet_id: str) -> bool:
             return True
         
         # ヘッダー以外の行を削除（2行目から最後まで）
-        worksheet.delete_rows(2, len(all_values))
+        _delete_rows_batch(worksheet, all_values, list(range(2, len(all_values) + 1)))
         # キャッシュをクリア
         read_events.clear()
+        read_sheet_snapshot.clear()
         return True
     except APIError as e:
         if "429" in str(e) or "Quota exceeded" in str(e):
@@ -638,9 +1050,10 @@ def delete_all_bulletin_posts(spreadsheet_id: str) -> bool:
             return True
         
         # ヘッダー以外の行を削除（2行目から最後まで）
-        worksheet.delete_rows(2, len(all_values))
+        _delete_rows_batch(worksheet, all_values, list(range(2, len(all_values) + 1)))
         # キャッシュをクリア
         read_bulletin_board.clear()
+        read_sheet_snapshot.clear()
         return True
     except APIError as e:
         if "429" in str(e) or "Quota exceeded" in str(e):
@@ -672,17 +1085,18 @@ def delete_attendance_log(spreadsheet_id: str, event_id: str) -> bool:
         if len(all_values) <= 1:  # ヘッダーのみ
             return False
         
-        # event_idが一致する行を後ろから削除（インデックスがずれないように）
-        deleted_count = 0
-        for i in range(len(all_values) - 1, 0, -1):  # 最後の行から2行目まで
-            row = all_values[i]
-            if len(row) > 0 and str(row[0]).strip() == event_id:  # event_idは最初の列
-                worksheet.delete_rows(i + 1)  # 1-indexed
-                deleted_count += 1
+        # event_idが一致する行をまとめて削除（event_idは最初の列、1-indexed）
+        matched_rows = [
+            i + 1
+            for i in range(1, len(all_values))
+            if len(all_values[i]) > 0 and str(all_values[i][0]).strip() == event_id
+        ]
+        deleted_count = _delete_rows_batch(worksheet, all_values, matched_rows)
         
         if deleted_count > 0:
             # キャッシュをクリア
             read_attendance_logs.clear()
+            read_sheet_snapshot.clear()
             return True
         return False
     except APIError as e:
@@ -727,14 +1141,13 @@ def _get_overtime_logs_worksheet(spreadsheet_id: str, create_if_missing: bool =
     """
     overtime_logs シートを取得する（必要なら作成する）
     """
-    client = get_client()
-    if client is None:
+    if get_client() is None:
         return None
 
     try:
-        spreadsheet = client.open_by_key(spreadsheet_id)
+        spreadsheet = _open_spreadsheet_cached(spreadsheet_id)
         try:
-            ws = spreadsheet.worksheet(_OVERTIME_LOG_SHEET)
+            ws = _open_worksheet_cached(spreadsheet, _OVERTIME_LOG_SHEET)
         except Exception:
             if not create_if_missing:
                 return None
@@ -743,20 +1156,23 @@ def _get_overtime_logs_worksheet(spreadsheet_id: str, create_if_missing: bool =
                 rows="1000",
                 cols=str(len(_OVERTIME_LOG_HEADERS)),
             )
-            ws.append_row(_OVERTIME_LOG_HEADERS)
+            _append_rows(ws, [_OVERTIME_LOG_HEADERS])
+            _WORKSHEET_HANDLES[(spreadsheet.id, _OVERTIME_LOG_SHEET)] = (time.monotonic(), ws)
+            _remember_header_row(ws, _OVERTIME_LOG_HEADERS)
             return ws
 
-        # ヘッダーが無い場合は追加
-        all_values = ws.get_all_values()
-        if not all_values:
-            ws.append_row(_OVERTIME_LOG_HEADERS)
+        # ヘッダーが無い場合は追加（確認済みならキャッシュを使用）
+        existing_headers = _read_header_row(ws)
+        if not existing_headers:
+            _append_rows(ws, [_OVERTIME_LOG_HEADERS])
+            _remember_header_row(ws, _OVERTIME_LOG_HEADERS)
             return ws
 
         # ヘッダーが想定と違う場合は上書き（新規運用を前提）
-        existing_headers = all_values[0] if all_values else []
         if not all(h in existing_headers for h in ["event_id", "date", "staff_name", "overtime_hours"]):
             header_range = f"A1:{chr(64 + len(_OVERTIME_LOG_HEADERS))}1"
-            ws.update(header_range, [_OVERTIME_LOG_HEADERS])
+            _update_range(ws, header_range, [_OVERTIME_LOG_HEADERS])
+            _remember_header_row(ws, _OVERTIME_LOG_HEADERS)
         return ws
     except Exception as e:
         st.error(f"残業ログ用シートの取得に失敗しました: {e}")
@@ -768,18 +1184,21 @@ def read_overtime_logs(spreadsheet_id: str) -> pd.DataFrame:
     """
     overtime_logsシートを読み込む（キャッシュ付き）
     """
-    worksheet = _get_overtime_logs_worksheet(spreadsheet_id, create_if_missing=False)
-    if worksheet is None:
-        return pd.DataFrame(columns=_OVERTIME_LOG_HEADERS)
+    data = _snapshot_records(spreadsheet_id, _OVERTIME_LOG_SHEET)
+    worksheet = None
+    if data is None:
+        worksheet = _get_overtime_logs_worksheet(spreadsheet_id, create_if_missing=False)
+        if worksheet is None:
+            return pd.DataFrame(columns=_OVERTIME_LOG_HEADERS)
 
     try:
-        data = worksheet.get_all_records()
+        if worksheet is not None:
+            data = worksheet.get_all_records()
         if not data:
-            return pd.DataFrame(columns=_OVERTIME_LOG_HEADERS)
+            return _typed_log_frame(pd.DataFrame(columns=_OVERTIME_LOG_HEADERS), ["overtime_hours"])
 
         df = pd.DataFrame(data)
-        df.columns = df.columns.str.strip()
-        return df
+        return _typed_log_frame(df, ["overtime_hours"])
     except APIError as e:
         if "429" in str(e) or "Quota exceeded" in str(e):
             st.error("⚠️ APIのレート制限に達しました。しばらく待ってから再度お試しください。")
@@ -810,10 +1229,12 @@ def write_overtime_log(spreadsheet_id: str, log_data: Dict[str, Any]) -> bool:
             log_data.get("approved_by", ""),
             log_data.get("remarks", ""),
         ]
-        worksheet.append_row(row)
+        _append_rows(worksheet, [row])
         read_overtime_logs.clear()
+        read_sheet_snapshot.clear()
         return True
     except APIError as e:
+        _invalidate_worksheet_headers(worksheet, e)
         if "429" in str(e) or "Quota exceeded" in str(e):
             st.error("⚠️ APIのレート制限に達しました。しばらく待ってから再度お試しください。")
             st.info("💡 ヒント: 1〜2分待ってから再度お試しください。")
@@ -821,6 +1242,7 @@ def write_overtime_log(spreadsheet_id: str, log_data: Dict[str, Any]) -> bool:
             st.error(f"APIエラーが発生しました: {e}")
         return False
     except Exception as e:
+        _invalidate_worksheet_headers(worksheet, e)
         st.error(f"残業ログの書き込みに失敗しました: {e}")
         return False
 
@@ -838,15 +1260,16 @@ def delete_overtime_log(spreadsheet_id: str, event_id: str) -> bool:
         if len(all_values) <= 1:
             return False
 
-        deleted_count = 0
-        for i in range(len(all_values) - 1, 0, -1):
-            row = all_values[i]
-            if len(row) > 0 and row[0] == event_id:
-                worksheet.delete_rows(i + 1)  # 1-indexed
-                deleted_count += 1
+        matched_rows = [
+            i + 1  # 1-indexed
+            for i in range(1, len(all_values))
+            if len(all_values[i]) > 0 and all_values[i][0] == event_id
+        ]
+        deleted_count = _delete_rows_batch(worksheet, all_values, matched_rows)
 
         if deleted_count > 0:
             read_overtime_logs.clear()
+            read_sheet_snapshot.clear()
             return True
         return False
     except APIError as e:
@@ -887,9 +1310,10 @@ def update_overtime_log(spreadsheet_id: str, event_id: str, updated_data: Dict[s
                 new_row = [existing.get(h, "") for h in _OVERTIME_LOG_HEADERS]
                 end_col = chr(64 + len(_OVERTIME_LOG_HEADERS))  # 7列なので 'G'
                 update_range = f"A{i+1}:{end_col}{i+1}"  # 1-indexed
-                worksheet.update(update_range, [new_row])
+                _update_range(worksheet, update_range, [new_row])
 
                 read_overtime_logs.clear()
+                read_sheet_snapshot.clear()
                 return True
 
         return False
@@ -919,14 +1343,17 @@ def delete_event(spreadsheet_id: str, event_id: str) -> bool:
         if len(all_values) <= 1:  # ヘッダーのみ
             return False
         
-        # event_idが一致する行を探して削除
-        for i in range(len(all_values) - 1, 0, -1):  # 最後の行から2行目まで
-            row = all_values[i]
-            if len(row) > 0 and row[0] == event_id:  # event_idは最初の列
-                worksheet.delete_rows(i + 1)  # 1-indexed
-                # キャッシュをクリア
-                read_events.clear()
-                return True
+        # event_idが一致する行をまとめて削除（event_idは最初の列、1-indexed）
+        matched_rows = [
+            i + 1
+            for i in range(1, len(all_values))
+            if len(all_values[i]) > 0 and all_values[i][0] == event_id
+        ]
+        if _delete_rows_batch(worksheet, all_values, matched_rows) > 0:
+            # キャッシュをクリア
+            read_events.clear()
+            read_sheet_snapshot.clear()
+            return True
         
         return False
     except APIError as e:
@@ -963,12 +1390,16 @@ def read_staff(spreadsheet_id: str) -> pd.DataFrame:
     Returns:
         pd.DataFrame: 職員データ（カラム: staff_id, name, password）
     """
-    worksheet = get_worksheet(spreadsheet_id, "staff")
-    if worksheet is None:
-        return pd.DataFrame()
+    data = _snapshot_records(spreadsheet_id, "staff")
+    worksheet = None
+    if data is None:
+        worksheet = get_worksheet(spreadsheet_id, "staff")
+        if worksheet is None:
+            return pd.DataFrame()
     
     try:
-        data = worksheet.get_all_records()
+        if worksheet is not None:
+            data = worksheet.get_all_records()
         df = pd.DataFrame(data)
         
         # カラム名の空白を除去
@@ -1015,10 +1446,11 @@ def write_staff(spreadsheet_id: str, staff_data: Dict[str, Any]) -> bool:
             staff_data.get("name", ""),
             staff_data.get("password", "")
         ]
-        worksheet.append_row(row)
+        _append_rows(worksheet, [row])
         
         # キャッシュをクリア
         read_staff.clear()
+        read_sheet_snapshot.clear()
         return True
     except APIError as e:
         if "429" in str(e) or "Quota exceeded" in str(e):
@@ -1053,14 +1485,17 @@ def delete_staff(spreadsheet_id: str, staff_id: str) -> bool:
         if len(all_values) <= 1:  # ヘッダーのみ
             return False
         
-        # staff_idが一致する行を探して削除
-        for i in range(len(all_values) - 1, 0, -1):  # 最後の行から2行目まで
-            row = all_values[i]
-            if len(row) > 0 and row[0] == staff_id:  # staff_idは最初の列
-                worksheet.delete_rows(i + 1)  # 1-indexed
-                # キャッシュをクリア
-                read_staff.clear()
-                return True
+        # staff_idが一致する行をまとめて削除（staff_idは最初の列、1-indexed）
+        matched_rows = [
+            i + 1
+            for i in range(1, len(all_values))
+            if len(all_values[i]) > 0 and all_values[i][0] == staff_id
+        ]
+        if _delete_rows_batch(worksheet, all_values, matched_rows) > 0:
+            # キャッシュをクリア
+            read_staff.clear()
+            read_sheet_snapshot.clear()
+            return True
         
         return False
     except APIError as e:
@@ -2,13 +2,29 @@ import pandas as pd
 from openpyxl import load_workbook, Workbook
 from openpyxl.styles import Font, PatternFill, Alignment
 from openpyxl.utils import get_column_letter
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from pandas.io.parsers import TextParser
 import os
 import re
 import json
+import random
+import tempfile
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 from openai import OpenAI
-from typing import Dict, Optional
+from typing import Callable, Dict, Optional, Tuple
 from dotenv import load_dotenv
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
 # .envファイルから環境変数を読み込む
 load_dotenv()
 
@@ -44,6 +60,179 @@ def mask_exclude_kouki_junyu(df: pd.DataFrame, ki_column: str) -> pd.Series:
     return pat_nn_kouki | pat_kouki_only | pat_junyu | pat_kouki_other
 
 
+# ヘッダー行を探す範囲（先頭からの行数）
+MASTER_HEADER_SEARCH_ROWS = 10
+
+
+def _master_cell_value(cell):
+    """セルの値を pd.read_excel（openpyxl）と同じ形に変換する"""
+    if cell.value is None:
+        return ''
+    if cell.data_type == TYPE_ERROR:
+        return float('nan')
+    if cell.data_type == TYPE_NUMERIC:
+        value = int(cell.value)
+        return value if value == cell.value else float(cell.value)
+    return cell.value
+
+
+def _is_master_header_row(row_values: list) -> bool:
+    row_str = ' '.join(str(v) for v in row_values if v != '' and pd.notna(v))
+    return '年度' in row_str and '名前' in row_str
+
+
+# マスターの列ごとに固定する型（process_master_file で使う列の読み込み時に指定）
+MASTER_COLUMN_DTYPES = {
+    '年度': 'Int16',
+    '学年': 'Int16',
+    '進路': 'category',
+    '性別': 'category',
+    '専門科': 'category',
+}
+
+
+def _apply_master_dtypes(df: pd.DataFrame, dtypes: Dict[str, str]) -> pd.DataFrame:
+    """
+    列の型を固定する。整数型は全ての値が整数として読める場合だけ変換する
+    （'2020年度' のような値が混ざる列は元の型のまま残す）
+    """
+    for column, dtype in dtypes.items():
+        if column not in df.columns:
+            continue
+        if dtype == 'category':
+            df[column] = df[column].astype('category')
+            continue
+        numeric = pd.to_numeric(df[column], errors='coerce')
+        convertible = (
+            numeric.notna().sum() == df[column].notna().sum()
+            and (numeric.dropna() % 1 == 0).all()
+        )
+        if convertible:
+            try:
+                df[column] = numeric.astype(dtype)
+                continue
+            except (TypeError, ValueError, OverflowError):
+                pass
+        print(f"[WARNING] 列 '{column}' を {dtype} に変換できないため元の型のまま読み込みます")
+    return df
+
+
+def load_master_sheet(master_path: str, sheet_name: str = 'main', verbose: bool = False,
+                      usecols: Optional[Callable[[str], bool]] = None,
+                      dtypes: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """
+    マスターファイルのシートを読み込む（ヘッダー行は'年度'と'名前'を含む行を先頭から探す）
+    
+    ブックは read_only で1回だけ開き、同じ行の走査でヘッダー行の検出と DataFrame の作成を行う。
+    値の変換は pd.read_excel(header=ヘッダー行) と同じ。Unnamed 列・空の列・空行は除く。
+    
+    Parameters:
+    -----------
+    master_path : str
+        マスターファイルのパス
+    sheet_name : str
+        読み込むシート名（デフォルト: main）
+    verbose : bool
+        Trueの場合は先頭行とヘッダー行の内容を表示する
+    usecols : callable, optional
+        列名を受け取り、読み込む列なら True を返す関数（ヘッダー行より下は該当する列のセルだけを変換する）
+    dtypes : dict, optional
+        {列名: 型} 固定する型（例: MASTER_COLUMN_DTYPES）
+    
+    Returns:
+    --------
+    pd.DataFrame
+        マスターデータ
+    """
+    wb = load_workbook(master_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        if sheet_name not in wb.sheetnames:
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+        ws = wb[sheet_name]
+        ws.reset_dimensions()
+        
+        data = []
+        header_row = None
+        column_indices = None
+        last_row_with_data = -1
+        for row_number, row in enumerate(ws.rows):
+            if column_indices is not None:
+                values = [_master_cell_value(row[i]) if i < len(row) else '' for i in column_indices]
+            else:
+                values = [_master_cell_value(cell) for cell in row]
+            while values and values[-1] == '':
+                values.pop()
+            if values:
+                last_row_with_data = row_number
+            data.append(values)
+            if header_row is None:
+                if _is_master_header_row(values):
+                    header_row = row_number
+                    if usecols is not None:
+                        # ヘッダー行までに読んだ行も必要な列だけに絞る
+                        column_indices = [i for i, name in enumerate(values) if name != '' and usecols(str(name))]
+                        data = [[r[i] if i < len(r) else '' for i in column_indices] for r in data]
+                        last_row_with_data = max(
+                            (n for n, r in enumerate(data) if any(v != '' for v in r)), default=-1
+                        )
+                elif row_number + 1 >= MASTER_HEADER_SEARCH_ROWS:
+                    break
+    finally:
+        wb.close()
+    
+    # 末尾の空行を除き、各行を最大列数にそろえる（pd.read_excel と同じ）
+    data = data[:last_row_with_data + 1]
+    if data:
+        width = max(len(values) for values in data)
+        data = [values + [''] * (width - len(values)) for values in data]
+    
+    if verbose:
+        print(f"\n最初の{MASTER_HEADER_SEARCH_ROWS}行を確認:")
+        print(TextParser(data[:MASTER_HEADER_SEARCH_ROWS], header=None, skip_blank_lines=False).read())
+    
+    if header_row is None:
+        raise ValueError("ヘッダー行が見つかりません。'年度'と'名前'を含む行を探しましたが見つかりませんでした。")
+    
+    if verbose:
+        print(f"\n[OK] ヘッダー行を発見: {header_row + 1}行目")
+        print(f"ヘッダー内容: {data[header_row]}")
+    
+    df_master = TextParser(data, header=header_row, skip_blank_lines=False).read()
+    
+    # 空白列を削除（Unnamed列や完全に空の列）
+    df_master = df_master.loc[:, ~df_master.columns.str.contains('^Unnamed')]
+    df_master = df_master.dropna(axis=1, how='all')
+    
+    # 空白行を削除
+    df_master = df_master.dropna(how='all')
+    
+    if dtypes:
+        df_master = _apply_master_dtypes(df_master, dtypes)
+    
+    return df_master
+
+
+def select_final_records(df: pd.DataFrame, end_statuses: list) -> pd.DataFrame:
+    """
+    各期・各人（期番号, 名前_正規化）の最終記録を1行ずつ選ぶ
+    - 終了進路（end_statuses）の記録があれば、その中で年度が最大の行
+    - なければ年度が最大の行（同じ年度が複数ある場合は元の並びで先の行）
+    名前_正規化が空の行は除く。結果は 期番号, 名前_正規化 の順に並ぶ
+    """
+    df = df[df['名前_正規化'].astype(bool)]
+    is_end = df['進路'].isin(end_statuses)
+    # 安定ソートで「終了進路 → 年度の大きい順」に並べ、各人の先頭行を残す
+    order = pd.DataFrame({
+        '期番号': df['期番号'].array,
+        '名前_正規化': df['名前_正規化'].array,
+        '終了進路': is_end.array,
+        '年度': df['年度'].array,
+    }).sort_values(['期番号', '名前_正規化', '終了進路', '年度'],
+                   ascending=[True, True, False, False], na_position='last', kind='stable')
+    first = ~order.duplicated(['期番号', '名前_正規化'])
+    return df.iloc[order.index[first.to_numpy()]]
+
+
 # 沖縄県の施設リスト（正規化前）
 OKINAWA_FACILITIES_RAW = [
     "県立宮古病院", "県立北部病院", "県立八重山病院", "県立中部病院",
@@ -63,29 +252,401 @@ OKINAWA_FACILITIES_RAW = [
     "琉大附属病院", "浦添総合病院", "琉球大学医学部附属病院　泌尿器科"
 ]
 
+# 施設名の別名（照合キー化した別名 → OKINAWA_FACILITIES_RAW の施設名）
+_FACILITY_ALIASES = {
+    "琉球大学病院": "琉大病院",
+    "琉球大学附属病院": "琉大附属病院",
+    "琉球大学医学部附属病院": "琉大附属病院",
+    "琉大医学部附属病院": "琉大附属病院",
+    "沖縄赤十字病院": "日本赤十字センター",
+    "日本赤十字社沖縄赤十字病院": "日本赤十字センター",
+    "南部医療センターこども医療センター": "南部医療センター",
+    "県立南部医療センターこども医療センター": "南部医療センター",
+}
+
+# 施設名の前に付いていても沖縄県内の施設名として扱う接頭辞（部分一致の条件）
+_OKINAWA_FACILITY_PREFIXES = ("沖縄県立", "沖縄県", "県立", "沖縄")
+
+# 前方一致・部分一致に使う施設名キーの最小文字数（「病院」などの短い語で誤一致しないように）
+_FACILITY_MATCH_MIN_KEY_LENGTH = 4
+# あいまい一致を試すキーの最小文字数
+_FACILITY_FUZZY_MIN_KEY_LENGTH = 7
+# 1文字違いでも別の施設になる文字（東部/南部、北大東/南大東 など）。あいまい一致では補わない
+_FACILITY_DISTINGUISHING_CHARS = frozenset("東西南北中上下大小新旧")
+
+
+def _facility_key(name: str) -> str:
+    """
+    施設名の照合キー（NFKC 正規化し、空白・中黒を除き、付属/所属を附属に、沖縄県立を県立に揃える）
+    """
+    key = unicodedata.normalize("NFKC", name)
+    key = re.sub(r"[\s・･]", "", key)
+    key = key.replace("付属", "附属").replace("所属", "附属")
+    if key.startswith("沖縄県立"):
+        key = key[2:]
+    return key
+
+
+def _build_facility_index() -> Dict[str, str]:
+    """照合キー → OKINAWA_FACILITIES_RAW の施設名（同じキーになる施設名は先に出てきたものを使う）"""
+    index: Dict[str, str] = {}
+    for facility in OKINAWA_FACILITIES_RAW:
+        index.setdefault(_facility_key(facility), facility.strip())
+    for alias, canonical in _FACILITY_ALIASES.items():
+        index.setdefault(_facility_key(alias), canonical)
+    return index
+
+
+_FACILITY_INDEX = _build_facility_index()
+# 前方一致用に長いキーから順に並べたもの（より具体的な施設名を優先する）
+_FACILITY_KEYS_BY_LENGTH = sorted(
+    (key for key in _FACILITY_INDEX if len(key) >= _FACILITY_MATCH_MIN_KEY_LENGTH),
+    key=len, reverse=True,
+)
+
+
+def _extra_character(longer: str, shorter: str) -> Optional[str]:
+    """longer が shorter に1文字足しただけの文字列ならその文字を返す（それ以外は None）"""
+    if len(longer) != len(shorter) + 1:
+        return None
+    for i, ch in enumerate(shorter):
+        if longer[i] != ch:
+            return longer[i] if longer[i + 1:] == shorter[i:] else None
+    return longer[-1]
+
+
+def _fuzzy_facility_match(key: str) -> Optional[str]:
+    """
+    1文字の脱落・重複（例: 「南部医療センタ」「県立八重山病病院」）だけを補い、候補が1つに絞れる場合に返す
+    
+    1文字の置き換え（「東部」と「南部」など）は別の施設の可能性があるため一致とせず、
+    API による正規化に回す。脱落・重複した文字が東西南北などの区別に使う文字の場合も同様
+    """
+    if len(key) < _FACILITY_FUZZY_MIN_KEY_LENGTH:
+        return None
+    matches = set()
+    for candidate_key, canonical in _FACILITY_INDEX.items():
+        if len(candidate_key) < _FACILITY_FUZZY_MIN_KEY_LENGTH:
+            continue
+        extra = _extra_character(key, candidate_key) or _extra_character(candidate_key, key)
+        if extra is None or extra in _FACILITY_DISTINGUISHING_CHARS:
+            continue
+        matches.add(canonical)
+    return matches.pop() if len(matches) == 1 else None
+
+
+@lru_cache(maxsize=4096)
+def match_okinawa_facility(facility_name: str) -> Optional[str]:
+    """
+    施設名を OKINAWA_FACILITIES_RAW の施設名にローカルで照合する（API は使わない）
+    
+    完全一致（照合キー）→ 別名 → 前方一致（診療科などが後ろに付いた表記）→
+    沖縄県/県立などの接頭辞付きの部分一致 → 1文字の脱落・重複だけを補うあいまい一致 の順に試し、
+    確実に判定できたものだけを返す（1文字の置き換えは一致としない）。
+    
+    Parameters:
+    -----------
+    facility_name : str
+        施設名
+    
+    Returns:
+    --------
+    str or None
+        一致した沖縄県内施設名（判定できない場合は None）
+    """
+    key = _facility_key(str(facility_name).strip())
+    if not key:
+        return None
+    
+    # 完全一致・別名
+    if key in _FACILITY_INDEX:
+        return _FACILITY_INDEX[key]
+    
+    # 前方一致（例: 「琉大病院 麻酔科」「宮古病院内科」）と、接頭辞付きの部分一致（例: 「沖縄県宮古病院」）
+    for candidate_key in _FACILITY_KEYS_BY_LENGTH:
+        position = key.find(candidate_key)
+        if position == 0 or (position > 0 and key[:position] in _OKINAWA_FACILITY_PREFIXES):
+            return _FACILITY_INDEX[candidate_key]
+    
+    # 1文字の脱落・重複（例: 「南部医療センタ」）
+    return _fuzzy_facility_match(key)
+
+
+# 施設名正規化に使うモデルとプロンプトの版（変更したら版を上げ、古いキャッシュを使わないようにする）
+FACILITY_NORMALIZATION_MODEL = "gpt-4o-mini"
+FACILITY_PROMPT_VERSION = 3
+
+# 1回の API 呼び出しでまとめて正規化する施設名の数
+FACILITY_BATCH_SIZE = 50
+# 同時に投げる API 呼び出しの上限
+FACILITY_MAX_WORKERS = 4
+# レート制限・一時的なエラー時の再試行回数と初回待ち時間（秒、以降は倍々）
+FACILITY_MAX_RETRIES = 4
+FACILITY_RETRY_BASE_DELAY = 1.0
+
+_FACILITY_SYSTEM_PROMPT = "あなたは医療施設名を正規化する専門家です。JSON形式で正確に回答してください。"
+
+_FACILITY_PROMPT_EXAMPLES = """沖縄県内の主要な施設名の例：
+- 県立宮古病院
+- 県立北部病院
+- 県立八重山病院
+- 県立中部病院
+- 琉大病院（琉球大学医学部附属病院）
+- 南部医療センター
+- 宮古病院
+- 北部病院
+- 中部病院
+- 八重山病院
+- 各種診療所（伊平屋、伊是名、西表、小浜、座間味、阿嘉、大原、粟国、渡名喜、波照間、北大東、南大東など）"""
+
+# まとめて正規化するときの応答形式（入力配列の index ごとに1件）
+_FACILITY_BATCH_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "facility_normalization",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "results": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "index": {"type": "integer"},
+                            "is_okinawa": {"type": "boolean"},
+                            "normalized_name": {"type": "string"},
+                        },
+                        "required": ["index", "is_okinawa", "normalized_name"],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["results"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+# 正規化結果の保存先（環境変数 KIBETU_FACILITY_CACHE_PATH で変更可）
+DEFAULT_FACILITY_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "facility_normalization.json"
+)
+
+_facility_cache_file_lock = threading.Lock()
+
+
+@contextmanager
+def _exclusive_file_lock(lock_path: str):
+    """lock_path のファイルをロックし、プロセスをまたいで排他する（解放は with を抜けたとき）"""
+    with open(lock_path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _facility_cache_namespace() -> str:
+    return f"{FACILITY_NORMALIZATION_MODEL}/prompt-v{FACILITY_PROMPT_VERSION}"
+
+
+class FacilityNameCache(dict):
+    """
+    施設名正規化結果のキャッシュ（生の施設名 → 正規化後の施設名）。
+    dict としてそのまま normalize_facility_name の cache に渡せる。
+    remember() で登録した結果（API で正常に判定できたもの）だけを save() でディスクに保存し、
+    アップロードやプロセスをまたいで再利用する。エラー時のフォールバック値は保存しない。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        super().__init__()
+        self.path = path
+        self.namespace = _facility_cache_namespace()
+        self._persistable: set = set()
+        if path:
+            entries = self._read_entries()
+            self.update(entries)
+            self._persistable.update(entries)
+
+    def _read_all(self) -> dict:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"[WARNING] 施設名キャッシュを読み込めませんでした ({self.path}): {e}")
+            return {}
+
+    def _read_entries(self) -> Dict[str, str]:
+        entries = self._read_all().get(self.namespace, {})
+        return {str(k): str(v) for k, v in entries.items()} if isinstance(entries, dict) else {}
+
+    def remember(self, facility_name: str, normalized: str) -> None:
+        """正常に判定できた結果を登録する（save() で保存対象になる）。"""
+        self[facility_name] = normalized
+        self._persistable.add(facility_name)
+
+    def save(self) -> None:
+        """
+        保存対象の結果をファイルに書き出す（他プロセスが追記した内容とはマージする）。
+        読み込み→マージ→置き換えの間は、スレッド間はロック、プロセス間は横の .lock ファイルで排他する。
+        """
+        if not self.path or not self._persistable:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with _facility_cache_file_lock, _exclusive_file_lock(f"{self.path}.lock"):
+                data = self._read_all()
+                entries = data.get(self.namespace)
+                if not isinstance(entries, dict):
+                    entries = {}
+                entries.update({k: self[k] for k in self._persistable if k in self})
+                data[self.namespace] = entries
+                fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False, indent=1, sort_keys=True)
+                os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[WARNING] 施設名キャッシュを保存できませんでした ({self.path}): {e}")
+
+
+def load_facility_cache(path: Optional[str] = None) -> FacilityNameCache:
+    """
+    ディスク上の施設名キャッシュを読み込む
+
+    Parameters:
+    -----------
+    path : str, optional
+        キャッシュファイルのパス（省略時は KIBETU_FACILITY_CACHE_PATH またはモジュール横の .cache/）
+    """
+    if path is None:
+        path = os.getenv('KIBETU_FACILITY_CACHE_PATH') or DEFAULT_FACILITY_CACHE_PATH
+    return FacilityNameCache(path)
+
+
+def _store_facility_result(cache: Optional[Dict[str, str]], facility_str: str, normalized: str, persist: bool) -> None:
+    if cache is None:
+        return
+    if persist and isinstance(cache, FacilityNameCache):
+        cache.remember(facility_str, normalized)
+    else:
+        cache[facility_str] = normalized
+
+
+def _parse_json_response(result_text: str):
+    """API の応答テキストから JSON を取り出してパースする（コードブロックがある場合は除去）。"""
+    result_text = result_text.strip()
+    if "```json" in result_text:
+        result_text = result_text.split("```json")[1].split("```")[0].strip()
+    elif "```" in result_text:
+        result_text = result_text.split("```")[1].split("```")[0].strip()
+    return json.loads(result_text)
+
+
+def _is_retryable_api_error(error: Exception) -> bool:
+    """レート制限（429）やサーバー側の一時的なエラーかどうか。"""
+    status = getattr(error, "status_code", None)
+    if status == 429 or (isinstance(status, int) and status >= 500):
+        return True
+    name = type(error).__name__
+    if name in ("RateLimitError", "APIConnectionError", "APITimeoutError", "InternalServerError"):
+        return True
+    message = str(error).lower()
+    return "429" in message or "rate limit" in message
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _create_completion_with_retry(client: OpenAI, **kwargs):
+    """chat.completions.create を呼び、レート制限などの一時的なエラーは待ってから再試行する。"""
+    for attempt in range(FACILITY_MAX_RETRIES + 1):
+        try:
+            return client.chat.completions.create(**kwargs)
+        except Exception as e:
+            if attempt >= FACILITY_MAX_RETRIES or not _is_retryable_api_error(e):
+                raise
+            delay = _retry_after_seconds(e)
+            if delay is None:
+                delay = FACILITY_RETRY_BASE_DELAY * (2 ** attempt) * (1 + random.random() * 0.25)
+            print(f"[WARNING] OpenAI API の一時的なエラーのため {delay:.1f} 秒後に再試行します: {e}")
+            time.sleep(delay)
+
+
+def _clean_facility_name(facility_name) -> str:
+    if pd.isna(facility_name) or not facility_name:
+        return ''
+    return str(facility_name).strip()
+
+
+def _canonical_facility_name(normalized_name: str) -> str:
+    """API が返した標準名を、ローカルの施設名リストにある表記に揃える（無ければそのまま）"""
+    return match_okinawa_facility(normalized_name) or normalized_name
+
+
+def _create_openai_client() -> Optional[OpenAI]:
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        print("[WARNING] OPENAI_API_KEY環境変数が設定されていません。施設名の正規化をスキップします。")
+        return None
+    return OpenAI(api_key=api_key)
+
 
 def normalize_facility_name(facility_name: str, client: Optional[OpenAI] = None, cache: Optional[Dict[str, str]] = None) -> str:
     """
-    OpenAI APIを使って施設名を正規化する
+    施設名を正規化する（match_okinawa_facility で判定できない場合だけ OpenAI API を使う）
     
     Parameters:
     -----------
     facility_name : str
         正規化する施設名
     client : OpenAI, optional
-        OpenAIクライアント（Noneの場合はAPIキーを環境変数から取得）
+        OpenAIクライアント（Noneの場合はAPIキーを環境変数から取得）。
+        client.chat.completions.create(**kwargs) を持ち、戻り値の choices[0].message.content に
+        JSON 文字列を返すものであれば OpenAI 以外（テスト用のスタブなど）も渡せる
     cache : dict, optional
-        キャッシュ辞書（同じ名前の再処理を避ける）
+        キャッシュ辞書（同じ名前の再処理を避ける）。FacilityNameCache を渡すと
+        正常に判定できた結果が save() でディスクに保存される
     
     Returns:
     --------
     str
         正規化された施設名（沖縄県内の施設の場合は標準名、それ以外は元の名前）
     """
-    if pd.isna(facility_name) or not facility_name or str(facility_name).strip() == '':
+    facility_str = _clean_facility_name(facility_name)
+    if not facility_str:
         return ''
     
-    facility_str = str(facility_name).strip()
+    # ローカルの施設名リストで判定できるものは API を使わない
+    matched = match_okinawa_facility(facility_str)
+    if matched:
+        _store_facility_result(cache, facility_str, matched, persist=False)
+        return matched
     
     # キャッシュをチェック
     if cache is not None and facility_str in cache:
@@ -93,27 +654,14 @@ def normalize_facility_name(facility_name: str, client: Optional[OpenAI] = None,
     
     # クライアントが提供されていない場合は作成
     if client is None:
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            print("[WARNING] OPENAI_API_KEY環境変数が設定されていません。施設名の正規化をスキップします。")
+        client = _create_openai_client()
+        if client is None:
             return facility_str
-        client = OpenAI(api_key=api_key)
     
     try:
         # OpenAI APIで施設名を正規化
         prompt = f"""以下の施設名が沖縄県内の医療施設かどうかを判定し、沖縄県内の施設の場合は標準名に正規化してください。
-沖縄県内の主要な施設名の例：
-- 県立宮古病院
-- 県立北部病院
-- 県立八重山病院
-- 県立中部病院
-- 琉大病院（琉球大学医学部附属病院）
-- 南部医療センター
-- 宮古病院
-- 北部病院
-- 中部病院
-- 八重山病院
-- 各種診療所（伊平屋、伊是名、西表、小浜、座間味、阿嘉、大原、粟国、渡名喜、波照間、北大東、南大東など）
+{_FACILITY_PROMPT_EXAMPLES}
 
 入力施設名: {facility_str}
 
@@ -121,45 +669,156 @@ JSON形式で回答してください：
 {{"is_okinawa": true/false, "normalized_name": "正規化された施設名（沖縄県内の場合のみ）", "original": "{facility_str}"}}
 沖縄県外の施設の場合は、is_okinawaをfalseにし、normalized_nameは空文字列にしてください。"""
         
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
+        response = _create_completion_with_retry(
+            client,
+            model=FACILITY_NORMALIZATION_MODEL,
             messages=[
-                {"role": "system", "content": "あなたは医療施設名を正規化する専門家です。JSON形式で正確に回答してください。"},
+                {"role": "system", "content": _FACILITY_SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.1
         )
         
-        result_text = response.choices[0].message.content.strip()
-        
-        # JSONをパース
-        # コードブロックがある場合は除去
-        if "```json" in result_text:
-            result_text = result_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in result_text:
-            result_text = result_text.split("```")[1].split("```")[0].strip()
-        
-        result = json.loads(result_text)
+        result = _parse_json_response(response.choices[0].message.content)
         
         if result.get("is_okinawa", False) and result.get("normalized_name"):
-            normalized = result["normalized_name"]
+            normalized = _canonical_facility_name(str(result["normalized_name"]))
         else:
             normalized = facility_str
         
         # キャッシュに保存
-        if cache is not None:
-            cache[facility_str] = normalized
+        _store_facility_result(cache, facility_str, normalized, persist=True)
         
         return normalized
         
     except Exception as e:
         print(f"[WARNING] 施設名の正規化でエラーが発生しました ({facility_str}): {e}")
-        # エラー時は元の名前を返す
-        if cache is not None:
-            cache[facility_str] = facility_str
+        # エラー時は元の名前を返す（次回のアップロードで再判定できるよう保存はしない）
+        _store_facility_result(cache, facility_str, facility_str, persist=False)
         return facility_str
 
 
+def _normalize_facility_chunk(chunk: list, client: OpenAI) -> Dict[str, str]:
+    """
+    施設名のリストを1回の API 呼び出しで正規化する（API エラーは呼び出し元に送出）。
+    応答に含まれなかった施設名は結果に入らない。
+    """
+    prompt = f"""以下のJSON配列の各施設名が沖縄県内の医療施設かどうかを判定し、沖縄県内の施設の場合は標準名に正規化してください。
+{_FACILITY_PROMPT_EXAMPLES}
+
+各施設名について、配列の index（0始まり）、is_okinawa、normalized_name を results 配列で回答してください。
+沖縄県外の施設の場合は、is_okinawaをfalseにし、normalized_nameは空文字列にしてください。
+
+入力施設名:
+{json.dumps(chunk, ensure_ascii=False)}"""
+
+    response = _create_completion_with_retry(
+        client,
+        model=FACILITY_NORMALIZATION_MODEL,
+        messages=[
+            {"role": "system", "content": _FACILITY_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.1,
+        response_format=_FACILITY_BATCH_RESPONSE_FORMAT,
+    )
+    result = _parse_json_response(response.choices[0].message.content)
+    if not isinstance(result, dict):
+        raise ValueError(f"results を含む JSON オブジェクトではありません: {type(result).__name__}")
+
+    normalized: Dict[str, str] = {}
+    for item in result.get("results", []):
+        if not isinstance(item, dict):
+            continue
+        index = item.get("index")
+        if not isinstance(index, int) or not 0 <= index < len(chunk):
+            continue
+        facility_str = chunk[index]
+        if item.get("is_okinawa", False) and item.get("normalized_name"):
+            normalized[facility_str] = _canonical_facility_name(str(item["normalized_name"]))
+        else:
+            normalized[facility_str] = facility_str
+    return normalized
+
+
+def normalize_facility_names(facility_names: list, client: Optional[OpenAI] = None,
+                             cache: Optional[Dict[str, str]] = None,
+                             batch_size: int = FACILITY_BATCH_SIZE,
+                             max_workers: int = FACILITY_MAX_WORKERS) -> Dict[str, str]:
+    """
+    複数の施設名をまとめて正規化する（normalize_facility_name のバッチ版）
+    
+    重複と空欄を除き、match_okinawa_facility で判定できず、キャッシュにも無い施設名だけを
+    batch_size 件ずつ1回の API 呼び出しで判定してキャッシュに登録する。API 呼び出しは最大 max_workers 件まで並行して行い、
+    レート制限などの一時的なエラーは待ってから再試行する。応答が JSON として読めない場合や応答から漏れた施設名は
+    1件ずつ判定し直す。
+    
+    Parameters:
+    -----------
+    facility_names : list
+        正規化する施設名のリスト
+    client : OpenAI, optional
+        OpenAIクライアント（Noneの場合はAPIキーを環境変数から取得）。
+        normalize_facility_name と同じく、chat.completions.create を持つスタブも渡せる
+    cache : dict, optional
+        キャッシュ辞書（FacilityNameCache を渡すと正常に判定できた結果がディスク保存の対象になる）
+    batch_size : int
+        1回の API 呼び出しで送る施設名の数
+    max_workers : int
+        同時に行う API 呼び出しの上限
+    
+    Returns:
+    --------
+    dict
+        {元の施設名（前後空白除去済み）: 正規化された施設名}
+    """
+    unique_names = list(dict.fromkeys(
+        name for name in (_clean_facility_name(n) for n in facility_names) if name
+    ))
+    if cache is None:
+        cache = {}
+    pending = []
+    for name in unique_names:
+        # ローカルの施設名リストで判定できるものは API に送らない
+        matched = match_okinawa_facility(name)
+        if matched:
+            _store_facility_result(cache, name, matched, persist=False)
+        elif name not in cache:
+            pending.append(name)
+
+    if pending and client is None:
+        client = _create_openai_client()
+    if pending and client is not None:
+        size = max(1, batch_size)
+        chunks = [pending[start:start + size] for start in range(0, len(pending), size)]
+        # API 呼び出しだけをワーカーで並行させ、キャッシュへの登録は呼び出し元のスレッドで行う
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+            futures = [executor.submit(_normalize_facility_chunk, chunk, client) for chunk in chunks]
+        for chunk, future in zip(chunks, futures):
+            try:
+                results = future.result()
+            except ValueError as e:
+                # 応答が JSON として読めない場合は、1件ずつ判定し直す
+                print(f"[WARNING] 施設名の一括正規化の応答を解釈できませんでした（{len(chunk)}件、1件ずつ再判定します）: {e}")
+                for facility_str in chunk:
+                    normalize_facility_name(facility_str, client=client, cache=cache)
+                continue
+            except Exception as e:
+                print(f"[WARNING] 施設名の一括正規化でエラーが発生しました（{len(chunk)}件）: {e}")
+                # エラー時は元の名前を使う（次回のアップロードで再判定できるよう保存はしない）
+                for facility_str in chunk:
+                    _store_facility_result(cache, facility_str, facility_str, persist=False)
+                continue
+            for facility_str in chunk:
+                if facility_str in results:
+                    _store_facility_result(cache, facility_str, results[facility_str], persist=True)
+                else:
+                    # 応答から漏れた施設名は1件ずつ判定し直す
+                    normalize_facility_name(facility_str, client=client, cache=cache)
+
+    return {name: cache.get(name, name) for name in unique_names}
+
+
 def is_okinawa_birthplace(birthplace: str) -> bool:
     """
     本籍が沖縄県かどうかを判定する
@@ -250,10 +909,35 @@ def classify_status(status: str) -> str:
         return '研修中'
 
 
-def get_names_by_category(df_final: pd.DataFrame, facility_cache: Dict[str, str], 
-                         okinawa_facilities_set: set, client: Optional[OpenAI] = None) -> Dict[str, list]:
+# 集計カテゴリ（calculate_statistics / get_names_by_category の結果のキー順）
+SUMMARY_CATEGORIES = [
+    '研修中',
+    '沖縄出身_沖縄内_転出・修了',
+    '沖縄出身_沖縄外_転出・修了',
+    '沖縄外出身_沖縄内_転出・修了',
+    '沖縄外出身_沖縄外_転出・修了',
+    '中断',
+    '退職',
+]
+
+_OKINAWA_BIRTHPLACE_PATTERN = '沖縄|おきなわ|OKINAWA|okinawa'
+
+
+def _classify_status_column(status: pd.Series) -> pd.Series:
+    """classify_status を列全体に適用したものと同じ結果を返す"""
+    status_str = status.astype('string').str.strip()
+    explicit = status_str.isin(['転出', '修了', '中断', '退職']).fillna(False).astype(bool)
+    return status_str.where(explicit, '研修中').astype(object)
+
+
+def summarize_final_records(df_final: pd.DataFrame, facility_cache: Dict[str, str],
+                            okinawa_facilities_set: set,
+                            client: Optional[OpenAI] = None) -> Tuple[Dict[str, int], Dict[str, list]]:
     """
-    各カテゴリに該当する名前のリストを取得する
+    各期の統計とカテゴリごとの名前リストを1回の走査でまとめて求める
+    
+    進路の分類・本籍が沖縄か・転出先が沖縄県内施設かを列単位で判定してから集計する。
+    施設名の正規化は転出・修了者の施設名ごとに1回だけ行う。
     
     Parameters:
     -----------
@@ -268,76 +952,85 @@ def get_names_by_category(df_final: pd.DataFrame, facility_cache: Dict[str, str]
     
     Returns:
     --------
-    dict
-        カテゴリごとの名前リストの辞書
+    tuple
+        (統計結果の辞書, カテゴリごとの名前リストの辞書)
     """
-    names_by_category = {
-        '研修中': [],
-        '沖縄出身_沖縄内_転出・修了': [],
-        '沖縄出身_沖縄外_転出・修了': [],
-        '沖縄外出身_沖縄内_転出・修了': [],
-        '沖縄外出身_沖縄外_転出・修了': [],
-        '中断': [],
-        '退職': []
-    }
-    
-    # 本籍と動向調査の列を確認
-    birthplace_col = '本籍' if '本籍' in df_final.columns else None
-    facility_col = '動向調査' if '動向調査' in df_final.columns else None
-    status_col = '進路' if '進路' in df_final.columns else None
-    name_col = '名前' if '名前' in df_final.columns else None
-    
-    if not status_col or not name_col:
-        return names_by_category
-    
-    for _, row in df_final.iterrows():
-        status = classify_status(row[status_col] if status_col else '')
-        name = row[name_col] if name_col and name_col in row.index else ''
+    stats = {category: 0 for category in SUMMARY_CATEGORIES}
+    names_by_category = {category: [] for category in SUMMARY_CATEGORIES}
+    
+    if '進路' not in df_final.columns:
+        return stats, names_by_category
+    
+    category = _classify_status_column(df_final['進路'])
+    moved = category.isin(['転出', '修了'])
+    
+    if moved.any():
+        # 出身地を判定
+        if '本籍' in df_final.columns:
+            is_okinawa_born = (
+                df_final['本籍'].astype('string').str.strip()
+                .str.contains(_OKINAWA_BIRTHPLACE_PATTERN, regex=True).fillna(False).astype(bool)
+            )
+        else:
+            is_okinawa_born = pd.Series(False, index=df_final.index)
         
-        if pd.isna(name) or not name:
-            continue
+        # 転出先施設が沖縄県内かを施設名ごとに判定
+        if '動向調査' in df_final.columns:
+            facilities = df_final.loc[moved, '動向調査']
+            facility_flags = {}
+            for facility in facilities.dropna().unique():
+                normalized_facility = normalize_facility_name(facility, client=client, cache=facility_cache) if facility else ''
+                facility_flags[facility] = is_okinawa_facility(normalized_facility, okinawa_facilities_set) if normalized_facility else False
+            is_okinawa_dest = facilities.map(facility_flags).fillna(False).astype(bool).reindex(df_final.index, fill_value=False)
+        else:
+            is_okinawa_dest = pd.Series(False, index=df_final.index)
         
-        if status == '研修中':
-            names_by_category['研修中'].append(str(name))
-        elif status == '中断':
-            names_by_category['中断'].append(str(name))
-        elif status == '退職':
-            names_by_category['退職'].append(str(name))
-        elif status in ['転出', '修了']:
-            # 出身地を判定
-            birthplace = row[birthplace_col] if birthplace_col and birthplace_col in row.index else ''
-            is_okinawa_born = is_okinawa_birthplace(birthplace)
-            
-            # 転出先施設を取得
-            facility = row[facility_col] if facility_col and facility_col in row.index else ''
-            
-            # 施設名を正規化
-            normalized_facility = normalize_facility_name(facility, client=client, cache=facility_cache) if facility else ''
-            
-            # 沖縄県内施設かどうかを判定
-            is_okinawa_facility_flag = is_okinawa_facility(normalized_facility, okinawa_facilities_set) if normalized_facility else False
-            
-            # カテゴリを決定（転出と修了は一緒にカウント）
-            if is_okinawa_born:
-                if is_okinawa_facility_flag:
-                    key = '沖縄出身_沖縄内_転出・修了'
-                else:
-                    key = '沖縄出身_沖縄外_転出・修了'
-            else:
-                if is_okinawa_facility_flag:
-                    key = '沖縄外出身_沖縄内_転出・修了'
-                else:
-                    key = '沖縄外出身_沖縄外_転出・修了'
-            
+        # カテゴリを決定（転出と修了は一緒にカウント）
+        born = is_okinawa_born.map({True: '沖縄出身', False: '沖縄外出身'})
+        dest = is_okinawa_dest.map({True: '沖縄内', False: '沖縄外'})
+        category = category.where(~moved, born + '_' + dest + '_転出・修了')
+    
+    counts = category.value_counts()
+    for key in SUMMARY_CATEGORIES:
+        stats[key] = int(counts.get(key, 0))
+    
+    if '名前' in df_final.columns:
+        names = df_final['名前']
+        has_name = names.notna() & names.astype(bool)
+        for key, name in zip(category[has_name], names[has_name]):
             names_by_category[key].append(str(name))
     
-    return names_by_category
+    return stats, names_by_category
+
+
+def get_names_by_category(df_final: pd.DataFrame, facility_cache: Dict[str, str], 
+                         okinawa_facilities_set: set, client: Optional[OpenAI] = None) -> Dict[str, list]:
+    """
+    各カテゴリに該当する名前のリストを取得する（統計も必要な場合は summarize_final_records を使う）
+    
+    Parameters:
+    -----------
+    df_final : pd.DataFrame
+        最終記録のDataFrame
+    facility_cache : dict
+        施設名の正規化キャッシュ
+    okinawa_facilities_set : set
+        沖縄県内施設名のセット
+    client : OpenAI, optional
+        OpenAIクライアント
+    
+    Returns:
+    --------
+    dict
+        カテゴリごとの名前リストの辞書
+    """
+    return summarize_final_records(df_final, facility_cache, okinawa_facilities_set, client=client)[1]
 
 
 def calculate_statistics(df_final: pd.DataFrame, facility_cache: Dict[str, str], 
                         okinawa_facilities_set: set, client: Optional[OpenAI] = None) -> Dict[str, int]:
     """
-    各期の統計を計算する
+    各期の統計を計算する（名前リストも必要な場合は summarize_final_records を使う）
     
     Parameters:
     -----------
@@ -353,62 +1046,7 @@ def calculate_statistics(df_final: pd.DataFrame, facility_cache: Dict[str, str],
     dict
         統計結果の辞書
     """
-    stats = {
-        '研修中': 0,
-        '沖縄出身_沖縄内_転出・修了': 0,
-        '沖縄出身_沖縄外_転出・修了': 0,
-        '沖縄外出身_沖縄内_転出・修了': 0,
-        '沖縄外出身_沖縄外_転出・修了': 0,
-        '中断': 0,
-        '退職': 0
-    }
-    
-    # 本籍と動向調査の列を確認
-    birthplace_col = '本籍' if '本籍' in df_final.columns else None
-    facility_col = '動向調査' if '動向調査' in df_final.columns else None
-    status_col = '進路' if '進路' in df_final.columns else None
-    
-    if not status_col:
-        return stats
-    
-    for _, row in df_final.iterrows():
-        status = classify_status(row[status_col] if status_col else '')
-        
-        if status == '研修中':
-            stats['研修中'] += 1
-        elif status == '中断':
-            stats['中断'] += 1
-        elif status == '退職':
-            stats['退職'] += 1
-        elif status in ['転出', '修了']:
-            # 出身地を判定
-            birthplace = row[birthplace_col] if birthplace_col and birthplace_col in row.index else ''
-            is_okinawa_born = is_okinawa_birthplace(birthplace)
-            
-            # 転出先施設を取得
-            facility = row[facility_col] if facility_col and facility_col in row.index else ''
-            
-            # 施設名を正規化
-            normalized_facility = normalize_facility_name(facility, client=client, cache=facility_cache) if facility else ''
-            
-            # 沖縄県内施設かどうかを判定
-            is_okinawa_facility_flag = is_okinawa_facility(normalized_facility, okinawa_facilities_set) if normalized_facility else False
-            
-            # カテゴリを決定（転出と修了は一緒にカウント）
-            if is_okinawa_born:
-                if is_okinawa_facility_flag:
-                    key = '沖縄出身_沖縄内_転出・修了'
-                else:
-                    key = '沖縄出身_沖縄外_転出・修了'
-            else:
-                if is_okinawa_facility_flag:
-                    key = '沖縄外出身_沖縄内_転出・修了'
-                else:
-                    key = '沖縄外出身_沖縄外_転出・修了'
-            
-            stats[key] = stats.get(key, 0) + 1
-    
-    return stats
+    return summarize_final_records(df_final, facility_cache, okinawa_facilities_set, client=client)[0]
 
 
 def create_period_sheets_from_master(master_file="研修医マスタ.xlsm", output_file="研修医データ_期別.xlsx"):
@@ -447,34 +1085,7 @@ def create_period_sheets_from_master(master_file="研修医マスタ.xlsm", outp
     # mainシートからマスターデータを読み込む（ヘッダー行を探す）
     print("\n研修医マスターデータ（mainシート）を読み込み中...")
 
-    # まず最初の数行を確認してヘッダー行を探す
-    df_temp = pd.read_excel(master_path, sheet_name='main', engine='openpyxl', header=None, nrows=10)
-    print("\n最初の10行を確認:")
-    print(df_temp)
-
-    # ヘッダー行を探す（'年度'や'名前'などの列が含まれる行）
-    header_row = None
-    for idx in range(len(df_temp)):
-        row_values = df_temp.iloc[idx].values
-        row_str = ' '.join([str(v) for v in row_values if pd.notna(v)])
-        if '年度' in row_str and '名前' in row_str:
-            header_row = idx
-            print(f"\n[OK] ヘッダー行を発見: {idx + 1}行目")
-            print(f"ヘッダー内容: {row_values}")
-            break
-
-    if header_row is None:
-        raise ValueError("ヘッダー行が見つかりません。'年度'と'名前'を含む行を探しましたが見つかりませんでした。")
-
-    # ヘッダー行を指定して再度読み込み
-    df_master = pd.read_excel(master_path, sheet_name='main', engine='openpyxl', header=header_row)
-
-    # 空白列を削除（Unnamed列や完全に空の列）
-    df_master = df_master.loc[:, ~df_master.columns.str.contains('^Unnamed')]
-    df_master = df_master.dropna(axis=1, how='all')
-
-    # 空白行を削除
-    df_master = df_master.dropna(how='all')
+    df_master = load_master_sheet(master_path, sheet_name='main', verbose=True)
 
     print(f"\n読み込み完了: {len(df_master)}行")
     print(f"列名: {list(df_master.columns)}")
@@ -587,11 +1198,18 @@ def create_period_sheets_from_master(master_file="研修医マスタ.xlsm", outp
     else:
         print("[WARNING] OPENAI_API_KEY環境変数が設定されていません。施設名の正規化をスキップします。")
 
-    # 施設名正規化のキャッシュ
-    facility_cache = {}
+    # 施設名正規化のキャッシュ（ディスクに保存して再実行時に再利用）
+    facility_cache = load_facility_cache()
     
-    # 沖縄県内施設のセットを作成（正規化後の名前を収集）
+    # 沖縄県内施設リストと転出・修了者の動向調査をまとめて正規化しておく
     print("\n施設名の正規化を実行中...")
+    facilities_to_normalize = list(OKINAWA_FACILITIES_RAW)
+    if '動向調査' in df_filtered.columns:
+        moved = df_filtered['進路'].apply(classify_status).isin(['転出', '修了'])
+        facilities_to_normalize.extend(df_filtered.loc[moved, '動向調査'].tolist())
+    normalize_facility_names(facilities_to_normalize, client=client, cache=facility_cache)
+
+    # 沖縄県内施設のセットを作成（正規化後の名前を収集）
     okinawa_facilities_set = set()
     for facility in OKINAWA_FACILITIES_RAW:
         normalized = normalize_facility_name(facility, client=client, cache=facility_cache)
@@ -700,15 +1318,12 @@ def create_period_sheets_from_master(master_file="研修医マスタ.xlsm", outp
             adjusted_width = min(max_length + 2, 50)
             ws.column_dimensions[column_letter].width = adjusted_width
 
-        # 集計を実行
-        statistics = calculate_statistics(df_final, facility_cache, okinawa_facilities_set, client=client)
+        # 集計を実行（各カテゴリの名前リストも同時に取得）
+        statistics, names_by_category = summarize_final_records(df_final, facility_cache, okinawa_facilities_set, client=client)
         statistics['期'] = int(ki_num)
         all_statistics.append(statistics)
         print(f"  [OK] 集計完了: 研修中={statistics['研修中']}名, 中断={statistics['中断']}名, 退職={statistics['退職']}名")
 
-        # 各カテゴリの名前リストを取得
-        names_by_category = get_names_by_category(df_final, facility_cache, okinawa_facilities_set, client=client)
-
         # 各期のシートに集計結果を追加
         last_data_row = len(df_final) + 1  # データの最後の行番号（ヘッダー含む）
         summary_start_row = last_data_row + 3  # データの下に2行空けて開始
@@ -884,6 +1499,8 @@ def create_period_sheets_from_master(master_file="研修医マスタ.xlsm", outp
     
     print("[OK] 集計結果シートを作成しました")
 
+    facility_cache.save()
+
     # ファイルを保存
     print(f"\n\nファイルを保存中: {output_path}")
     wb.save(output_path)
@@ -0,0 +1,322 @@
+"""Optional local SQLite mirror of the Google Sheets data.
+
+有効化すると、各シートの値（1行目ヘッダーを含む行リスト）をローカル SQLite に保持し、
+読み込みはここから返す。書き込みは Sheets に反映した後に同じ操作をローカルにも適用する
+（write-through）。別プロセスや手作業での変更はバックグラウンドの同期スレッドが
+一定間隔で Sheets から取り込み直す。
+
+有効化: secrets.toml の ``local_store_path`` または環境変数 ``KINTAI_LOCAL_STORE`` に
+SQLite ファイルのパスを指定する。同期間隔（秒）は ``local_store_sync_interval``
+（環境変数 ``KINTAI_LOCAL_STORE_SYNC_INTERVAL``）で変更できる。
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+import streamlit as st
+
+_DEFAULT_SYNC_INTERVAL_SECONDS = 120
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sheet_rows (
+    spreadsheet_id TEXT NOT NULL,
+    sheet_name TEXT NOT NULL,
+    row_number INTEGER NOT NULL,
+    row_json TEXT NOT NULL,
+    PRIMARY KEY (spreadsheet_id, sheet_name, row_number)
+);
+CREATE TABLE IF NOT EXISTS sheet_state (
+    spreadsheet_id TEXT NOT NULL,
+    sheet_name TEXT NOT NULL,
+    present INTEGER NOT NULL,
+    stale INTEGER NOT NULL,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (spreadsheet_id, sheet_name)
+);
+"""
+
+
+def _get_setting(secret_key: str, env_key: str) -> str | None:
+    try:
+        value = st.secrets[secret_key]
+        if value is not None and str(value).strip():
+            return str(value).strip()
+    except (KeyError, TypeError, FileNotFoundError, AttributeError):
+        pass
+    value = os.getenv(env_key, "").strip()
+    return value or None
+
+
+def _to_cell_text(value: Any) -> str:
+    """Sheets に RAW で書き込んだ値が読み戻されるときの表示文字列に揃える。"""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class LocalSheetStore:
+    """シート単位で行リストを保持する SQLite ストア。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        # シートごとの書き込み世代。write-through の前後で進め、取得中に書き込みがあった同期結果を捨てる
+        self._generations: dict[tuple[str, str], int] = {}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """ロックを取って接続を開き、正常終了時にコミット、最後に必ず閉じる。"""
+        with self._lock:
+            conn = sqlite3.connect(self.path, timeout=30)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                with conn:
+                    yield conn
+            finally:
+                conn.close()
+
+    # ----- 読み込み -----
+
+    def load_values(
+        self,
+        spreadsheet_id: str,
+        sheet_names: list[str],
+        allow_stale: bool = False,
+    ) -> dict[str, list[list[str]]] | None:
+        """
+        指定シートの値を返す。未同期のシート、または要再同期（stale）のシートが1つでもあれば None。
+        allow_stale=True の場合は stale でも返す（Sheets に接続できないときの代替）。
+        Sheets 側に存在しないシートは結果に含めない。
+        """
+        with self._connect() as conn:
+            states = {
+                name: (present, stale)
+                for name, present, stale in conn.execute(
+                    "SELECT sheet_name, present, stale FROM sheet_state WHERE spreadsheet_id = ?",
+                    (spreadsheet_id,),
+                )
+            }
+            if any(name not in states for name in sheet_names):
+                return None
+            if not allow_stale and any(states[name][1] for name in sheet_names):
+                return None
+            out: dict[str, list[list[str]]] = {}
+            for name in sheet_names:
+                if not states[name][0]:
+                    continue
+                rows = conn.execute(
+                    "SELECT row_json FROM sheet_rows WHERE spreadsheet_id = ? AND sheet_name = ? "
+                    "ORDER BY row_number",
+                    (spreadsheet_id, name),
+                )
+                out[name] = [json.loads(r[0]) for r in rows]
+            return out
+
+    # ----- 同期（Sheets → ローカル） -----
+
+    def generations(self, spreadsheet_id: str, sheet_names: list[str]) -> dict[str, int]:
+        """Sheets から取得を始める前に控えておく各シートの書き込み世代（replace_values に渡す）。"""
+        with self._lock:
+            return {name: self._generations.get((spreadsheet_id, name), 0) for name in sheet_names}
+
+    def _bump_generation(self, spreadsheet_id: str, sheet_name: str) -> None:
+        with self._lock:
+            key = (spreadsheet_id, sheet_name)
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def replace_values(
+        self,
+        spreadsheet_id: str,
+        values_by_sheet: dict[str, list[list[Any]]],
+        sheet_names: list[str],
+        generations: dict[str, int] | None = None,
+    ) -> None:
+        """
+        Sheets から取得した値でシートを丸ごと置き換える（values_by_sheet に無いシートは未作成扱い）。
+        generations（取得前の generations() の値）を渡すと、取得中に write-through があったシートは
+        置き換えずに残す（取得した値にその書き込みが含まれているか分からないため）。
+        """
+        now = time.time()
+        with self._connect() as conn:
+            for name in sheet_names:
+                if generations is not None and self._generations.get((spreadsheet_id, name), 0) != generations[name]:
+                    continue
+                conn.execute(
+                    "DELETE FROM sheet_rows WHERE spreadsheet_id = ? AND sheet_name = ?",
+                    (spreadsheet_id, name),
+                )
+                values = values_by_sheet.get(name)
+                if values is not None:
+                    conn.executemany(
+                        "INSERT INTO sheet_rows VALUES (?, ?, ?, ?)",
+                        [
+                            (spreadsheet_id, name, i + 1, json.dumps([_to_cell_text(v) for v in row], ensure_ascii=False))
+                            for i, row in enumerate(values)
+                        ],
+                    )
+                conn.execute(
+                    "INSERT OR REPLACE INTO sheet_state VALUES (?, ?, ?, 0, ?)",
+                    (spreadsheet_id, name, 1 if values is not None else 0, now),
+                )
+
+    # ----- write-through（ローカルへの同一操作の適用） -----
+
+    def begin_write(self, spreadsheet_id: str, sheet_name: str) -> None:
+        """Sheets への書き込みの直前に呼ぶ（並行して取得中の同期結果でこの書き込みを上書きしないため）。"""
+        self._bump_generation(spreadsheet_id, sheet_name)
+
+    def _load_sheet(self, conn: sqlite3.Connection, spreadsheet_id: str, sheet_name: str) -> list[list[str]] | None:
+        state = conn.execute(
+            "SELECT stale FROM sheet_state WHERE spreadsheet_id = ? AND sheet_name = ?",
+            (spreadsheet_id, sheet_name),
+        ).fetchone()
+        if state is None or state[0]:
+            return None
+        return [
+            json.loads(r[0])
+            for r in conn.execute(
+                "SELECT row_json FROM sheet_rows WHERE spreadsheet_id = ? AND sheet_name = ? ORDER BY row_number",
+                (spreadsheet_id, sheet_name),
+            )
+        ]
+
+    def _store_sheet(self, conn: sqlite3.Connection, spreadsheet_id: str, sheet_name: str, rows: list[list[str]]) -> None:
+        conn.execute(
+            "DELETE FROM sheet_rows WHERE spreadsheet_id = ? AND sheet_name = ?",
+            (spreadsheet_id, sheet_name),
+        )
+        conn.executemany(
+            "INSERT INTO sheet_rows VALUES (?, ?, ?, ?)",
+            [
+                (spreadsheet_id, sheet_name, i + 1, json.dumps(row, ensure_ascii=False))
+                for i, row in enumerate(rows)
+            ],
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO sheet_state VALUES (?, ?, 1, 0, "
+            "COALESCE((SELECT synced_at FROM sheet_state WHERE spreadsheet_id = ? AND sheet_name = ?), 0))",
+            (spreadsheet_id, sheet_name, spreadsheet_id, sheet_name),
+        )
+        self._bump_generation(spreadsheet_id, sheet_name)
+
+    def _set_stale(self, conn: sqlite3.Connection, spreadsheet_id: str, sheet_name: str) -> None:
+        conn.execute(
+            "UPDATE sheet_state SET stale = 1 WHERE spreadsheet_id = ? AND sheet_name = ?",
+            (spreadsheet_id, sheet_name),
+        )
+        self._bump_generation(spreadsheet_id, sheet_name)
+
+    def append_rows(self, spreadsheet_id: str, sheet_name: str, rows: list[list[Any]]) -> None:
+        """Sheets の append_rows と同じ行をローカル末尾に追加する（未同期なら何もしない）。"""
+        with self._connect() as conn:
+            current = self._load_sheet(conn, spreadsheet_id, sheet_name)
+            if current is None:
+                return
+            current.extend([_to_cell_text(v) for v in row] for row in rows)
+            self._store_sheet(conn, spreadsheet_id, sheet_name, current)
+
+    def delete_rows(self, spreadsheet_id: str, sheet_name: str, row_keys: list[str]) -> None:
+        """
+        Sheets で削除した行を、1列目の ID（row_keys は削除した各行の1列目の値）でローカルからも削除する。
+        行番号は使わない（ローカルと Sheets の行の並びがずれていると別の行を消してしまうため）。
+        ローカルで一致する行数が削除した行数と違う場合はずれているとみなし、stale にして取り直す。
+        """
+        targets = {_to_cell_text(key) for key in row_keys}
+        with self._connect() as conn:
+            current = self._load_sheet(conn, spreadsheet_id, sheet_name)
+            if current is None:
+                return
+            header, body = current[:1], current[1:]
+            kept = [row for row in body if (row[0] if row else "") not in targets]
+            if len(body) - len(kept) != len(row_keys):
+                self._set_stale(conn, spreadsheet_id, sheet_name)
+                return
+            self._store_sheet(conn, spreadsheet_id, sheet_name, header + kept)
+
+    def mark_stale(self, spreadsheet_id: str, sheet_name: str) -> None:
+        """ローカルで再現しにくい更新（範囲の上書き等）の後、次回読み込み時に Sheets から取り直す。"""
+        with self._connect() as conn:
+            self._set_stale(conn, spreadsheet_id, sheet_name)
+
+
+class _Reconciler(threading.Thread):
+    """一定間隔で Sheets の内容をローカルに取り込み直すバックグラウンドスレッド。"""
+
+    def __init__(
+        self,
+        store: LocalSheetStore,
+        spreadsheet_id: str,
+        sheet_names: list[str],
+        fetch_values: Callable[[str], dict[str, list[list[Any]]] | None],
+        interval: float,
+    ):
+        super().__init__(name=f"local-store-sync-{spreadsheet_id[:8]}", daemon=True)
+        self.store = store
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_names = sheet_names
+        self.fetch_values = fetch_values
+        self.interval = interval
+
+    def run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            try:
+                generations = self.store.generations(self.spreadsheet_id, self.sheet_names)
+                values_by_sheet = self.fetch_values(self.spreadsheet_id)
+                if values_by_sheet is not None:
+                    self.store.replace_values(
+                        self.spreadsheet_id, values_by_sheet, self.sheet_names, generations
+                    )
+            except Exception as e:
+                print(f"[WARNING] ローカルストアの同期に失敗しました: {e}")
+
+
+_reconcilers: dict[str, _Reconciler] = {}
+_reconcilers_lock = threading.Lock()
+
+
+@st.cache_resource
+def get_local_store() -> LocalSheetStore | None:
+    """設定されていればローカルストアを返す（未設定なら None）。"""
+    path = _get_setting("local_store_path", "KINTAI_LOCAL_STORE")
+    if not path:
+        return None
+    try:
+        return LocalSheetStore(path)
+    except Exception as e:
+        print(f"[WARNING] ローカルストアを開けませんでした ({path}): {e}")
+        return None
+
+
+def ensure_reconciler(
+    store: LocalSheetStore,
+    spreadsheet_id: str,
+    sheet_names: list[str],
+    fetch_values: Callable[[str], dict[str, list[list[Any]]] | None],
+) -> None:
+    """スプレッドシートごとに同期スレッドを1本だけ起動する。"""
+    with _reconcilers_lock:
+        if spreadsheet_id in _reconcilers and _reconcilers[spreadsheet_id].is_alive():
+            return
+        raw_interval = _get_setting("local_store_sync_interval", "KINTAI_LOCAL_STORE_SYNC_INTERVAL")
+        try:
+            interval = float(raw_interval) if raw_interval else _DEFAULT_SYNC_INTERVAL_SECONDS
+        except ValueError:
+            interval = _DEFAULT_SYNC_INTERVAL_SECONDS
+        reconciler = _Reconciler(store, spreadsheet_id, list(sheet_names), fetch_values, max(interval, 10.0))
+        reconciler.start()
+        _reconcilers[spreadsheet_id] = reconciler
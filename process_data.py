@@ -2,26 +2,65 @@
 データ処理用のモジュール
 Excelファイルを読み込んで、Web表示用のデータを返す
 """
+import hashlib
+import json
 import os
+import tempfile
+import threading
+from functools import lru_cache
 import pandas as pd
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from kibetu_list import (
     normalize_name, normalize_facility_name, is_okinawa_birthplace,
-    is_okinawa_facility, classify_status, calculate_statistics,
-    get_names_by_category, OKINAWA_FACILITIES_RAW,
-    mask_exclude_kouki_junyu,
+    is_okinawa_facility, classify_status, summarize_final_records,
+    OKINAWA_FACILITIES_RAW, mask_exclude_kouki_junyu, load_facility_cache,
+    normalize_facility_names, select_final_records, load_master_sheet,
+    MASTER_COLUMN_DTYPES,
 )
 from openai import OpenAI
 
 
-def process_master_file(master_file_path: str) -> Dict:
+# 処理結果キャッシュの保存先（環境変数 KIBETU_RESULT_CACHE_DIR で変更可）と保持件数の上限
+DEFAULT_RESULT_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "kibetu_results"
+)
+RESULT_CACHE_MAX_ENTRIES = 20
+
+_result_cache_lock = threading.Lock()
+
+# Web表示に使う列（'初・後' は期を表す列に読み替える）
+DISPLAY_HEADERS = ['年度', '学年', '初・後', 'PHS', '名前', 'ふりがな', '性別',
+                   '専門科', '進路', '動向調査', '本籍', '出身大学', '備考']
+
+
+def _is_master_column_used(column_name: str) -> bool:
+    """process_master_file で使う列か（表示列と、期を表す列の候補）"""
+    return column_name in DISPLAY_HEADERS or any(c in column_name for c in ('初', '後', '期'))
+
+
+def _period_fingerprint(df_period: pd.DataFrame) -> str:
+    """期の行（正規化済みの名前を含む全列）と処理コードの版から、その期の集計が変わったかを判定するハッシュを作る"""
+    digest = hashlib.sha256()
+    digest.update(_processing_code_version().encode())
+    digest.update(b'openai' if os.getenv('OPENAI_API_KEY') else b'offline')
+    digest.update(json.dumps([str(col) for col in df_period.columns], ensure_ascii=False).encode())
+    digest.update(pd.util.hash_pandas_object(df_period, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def process_master_file(master_file_path: str, previous_result: Optional[Dict] = None) -> Dict:
     """
     マスターファイルを処理して、Web表示用のデータを返す
     
+    previous_result を渡すと、期ごとのフィンガープリント（その期の行のハッシュ）が
+    前回と同じ期は前回の集計結果と名前リストを再利用し、変わった期だけを集計し直す。
+    
     Parameters:
     -----------
     master_file_path : str
         マスターファイルのパス
+    previous_result : dict, optional
+        前回の process_master_file の結果
     
     Returns:
     --------
@@ -32,7 +71,8 @@ def process_master_file(master_file_path: str) -> Dict:
                     'period': 47,
                     'data': [...],  # 各期のデータ
                     'statistics': {...},  # 集計結果
-                    'names_by_category': {...}  # カテゴリごとの名前リスト
+                    'names_by_category': {...},  # カテゴリごとの名前リスト
+                    'fingerprint': '...'  # その期の行のハッシュ
                 }
             ],
             'summary_statistics': [...]  # 全体の集計結果
@@ -42,28 +82,9 @@ def process_master_file(master_file_path: str) -> Dict:
     if not os.path.exists(master_file_path):
         raise FileNotFoundError(f"ファイルが見つかりません: {master_file_path}")
     
-    # mainシートからマスターデータを読み込む（ヘッダー行を探す）
-    df_temp = pd.read_excel(master_file_path, sheet_name='main', engine='openpyxl', header=None, nrows=10)
-    
-    # ヘッダー行を探す
-    header_row = None
-    for idx in range(len(df_temp)):
-        row_values = df_temp.iloc[idx].values
-        row_str = ' '.join([str(v) for v in row_values if pd.notna(v)])
-        if '年度' in row_str and '名前' in row_str:
-            header_row = idx
-            break
-    
-    if header_row is None:
-        raise ValueError("ヘッダー行が見つかりません。'年度'と'名前'を含む行を探しましたが見つかりませんでした。")
-    
-    # ヘッダー行を指定して再度読み込み
-    df_master = pd.read_excel(master_file_path, sheet_name='main', engine='openpyxl', header=header_row)
-    
-    # 空白列を削除
-    df_master = df_master.loc[:, ~df_master.columns.str.contains('^Unnamed')]
-    df_master = df_master.dropna(axis=1, how='all')
-    df_master = df_master.dropna(how='all')
+    # mainシートからマスターデータを読み込む（ヘッダー行を探し、使う列だけを型を固定して読み込む）
+    df_master = load_master_sheet(master_file_path, sheet_name='main',
+                                  usecols=_is_master_column_used, dtypes=MASTER_COLUMN_DTYPES)
     
     # 正規化された名前列を追加
     df_master['名前_正規化'] = df_master['名前'].apply(normalize_name)
@@ -104,48 +125,35 @@ def process_master_file(master_file_path: str) -> Dict:
         except Exception as e:
             print(f"[WARNING] OpenAI APIクライアントの初期化に失敗しました: {e}")
     
-    # 施設名正規化のキャッシュ
-    facility_cache = {}
+    # 施設名正規化のキャッシュ（ディスクに保存し、アップロード・プロセスをまたいで再利用）
+    facility_cache = load_facility_cache()
     
-    # 沖縄県内施設のセットを作成
-    okinawa_facilities_set = set()
-    for facility in OKINAWA_FACILITIES_RAW:
-        normalized = normalize_facility_name(facility, client=client, cache=facility_cache)
-        if normalized:
-            okinawa_facilities_set.add(normalized)
+    # 期ごとのフィンガープリントを求め、前回と同じ期は集計結果を再利用する
+    fingerprints = {
+        int(ki_num): _period_fingerprint(df_period)
+        for ki_num, df_period in df_filtered.groupby('期番号', sort=True)
+    }
+    reusable_periods = {}
+    for period in (previous_result or {}).get('periods', []):
+        try:
+            ki_num = int(period['period'])
+            if (period.get('fingerprint') == fingerprints.get(ki_num)
+                    and isinstance(period.get('statistics'), dict)
+                    and isinstance(period.get('names_by_category'), dict)):
+                reusable_periods[ki_num] = period
+        except (KeyError, TypeError, ValueError):
+            continue
     
-    # 各期ごとに処理
-    periods_data = []
-    all_statistics = []
+    # 各期・各人の最終記録を全体で一度に決定し、期ごとに分ける
+    finals = []
+    df_final_all = select_final_records(df_filtered, end_statuses)
     
-    for ki_num in range(47, 61):
-        df_ki = df_filtered[df_filtered['期番号'] == ki_num].copy()
-        
-        if len(df_ki) == 0:
-            continue
-        
-        # 正規化された名前でグループ化し、各人の最終年データを取得
-        final_records = []
-        
-        for normalized_name, group in df_ki.groupby('名前_正規化'):
-            if not normalized_name:
-                continue
-
-            end_records = group[group['進路'].isin(end_statuses)]
-
-            if len(end_records) > 0:
-                final_record = end_records.loc[end_records['年度'].idxmax()]
-            else:
-                final_record = group.loc[group['年度'].idxmax()]
-
-            final_records.append(final_record)
-        
-        # DataFrameに変換
-        df_final = pd.DataFrame(final_records)
+    for ki_num, df_final in df_final_all.groupby('期番号', sort=True):
+        ki_num = int(ki_num)
         
         # ふりがなでソート
         if 'ふりがな' in df_final.columns:
-            df_final['ソートキー'] = df_final['ふりがな'].fillna(df_final['名前'])
+            df_final = df_final.assign(ソートキー=df_final['ふりがな'].fillna(df_final['名前']))
             df_final = df_final.sort_values('ソートキー')
             df_final = df_final.drop(columns=['ソートキー'])
         else:
@@ -155,16 +163,41 @@ def process_master_file(master_file_path: str) -> Dict:
         cols_to_drop = ['期番号', '名前_正規化']
         df_final = df_final.drop(columns=[col for col in cols_to_drop if col in df_final.columns])
         
-        # 集計を実行
-        statistics = calculate_statistics(df_final, facility_cache, okinawa_facilities_set, client=client)
+        finals.append((ki_num, df_final))
+    
+    # 施設名の正規化をまとめて実行（沖縄県内施設リストと、集計し直す期の転出・修了者の動向調査）
+    facilities_to_normalize = list(OKINAWA_FACILITIES_RAW)
+    for ki_num, df_final in finals:
+        if ki_num in reusable_periods:
+            continue
+        if '進路' in df_final.columns and '動向調査' in df_final.columns:
+            moved = df_final['進路'].apply(classify_status).isin(['転出', '修了'])
+            facilities_to_normalize.extend(df_final.loc[moved, '動向調査'].tolist())
+    normalize_facility_names(facilities_to_normalize, client=client, cache=facility_cache)
+    
+    # 沖縄県内施設のセットを作成
+    okinawa_facilities_set = set()
+    for facility in OKINAWA_FACILITIES_RAW:
+        normalized = normalize_facility_name(facility, client=client, cache=facility_cache)
+        if normalized:
+            okinawa_facilities_set.add(normalized)
+    
+    # 各期ごとに集計
+    periods_data = []
+    all_statistics = []
+    
+    for ki_num, df_final in finals:
+        if ki_num in reusable_periods:
+            # 行が変わっていない期は前回の集計結果を使う
+            statistics = dict(reusable_periods[ki_num]['statistics'])
+            names_by_category = {key: list(names) for key, names in reusable_periods[ki_num]['names_by_category'].items()}
+        else:
+            # 集計を実行（各カテゴリの名前リストも同時に取得）
+            statistics, names_by_category = summarize_final_records(df_final, facility_cache, okinawa_facilities_set, client=client)
         statistics['期'] = int(ki_num)
         
-        # 各カテゴリの名前リストを取得
-        names_by_category = get_names_by_category(df_final, facility_cache, okinawa_facilities_set, client=client)
-        
         # データを辞書形式に変換
-        display_headers = ['年度', '学年', ki_column, 'PHS', '名前', 'ふりがな', '性別',
-                           '専門科', '進路', '動向調査', '本籍', '出身大学', '備考']
+        display_headers = [ki_column if header == '初・後' else header for header in DISPLAY_HEADERS]
         
         period_data = []
         for _, row in df_final.iterrows():
@@ -182,12 +215,164 @@ def process_master_file(master_file_path: str) -> Dict:
             'period': int(ki_num),
             'data': period_data,
             'statistics': statistics,
-            'names_by_category': names_by_category
+            'names_by_category': names_by_category,
+            'fingerprint': fingerprints[ki_num]
         })
         
         all_statistics.append(statistics)
     
+    facility_cache.save()
+    
     return {
         'periods': periods_data,
         'summary_statistics': all_statistics
     }
+
+
+def _result_cache_dir() -> str:
+    return os.getenv('KIBETU_RESULT_CACHE_DIR') or DEFAULT_RESULT_CACHE_DIR
+
+
+@lru_cache(maxsize=1)
+def _processing_code_version() -> str:
+    """処理コード（このモジュールと kibetu_list）の内容のハッシュ。コードが変われば古い結果は使わない"""
+    digest = hashlib.sha256()
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    for filename in ('process_data.py', 'kibetu_list.py'):
+        try:
+            with open(os.path.join(module_dir, filename), 'rb') as f:
+                digest.update(f.read())
+        except OSError:
+            digest.update(filename.encode())
+    return digest.hexdigest()
+
+
+def result_cache_key(file_bytes: bytes) -> str:
+    """アップロードされたファイルの内容と処理コードの版から結果キャッシュのキーを作る"""
+    digest = hashlib.sha256()
+    digest.update(_processing_code_version().encode())
+    # API キーの有無で施設名の判定結果が変わるため、キーに含める
+    digest.update(b'openai' if os.getenv('OPENAI_API_KEY') else b'offline')
+    digest.update(file_bytes)
+    return digest.hexdigest()
+
+
+def _load_cached_result(key: str) -> Optional[Dict]:
+    path = os.path.join(_result_cache_dir(), f"{key}.json")
+    try:
+        with open(path, encoding='utf-8') as f:
+            result = json.load(f)
+        # 最近使った結果として残るよう更新日時を新しくする
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"[WARNING] 処理結果のキャッシュを読み込めませんでした ({path}): {e}")
+        return None
+    return result if isinstance(result, dict) else None
+
+
+def _latest_cached_result() -> Optional[Dict]:
+    """最後に使った処理結果（別のファイルの結果でも、変わっていない期の集計の再利用に使える）"""
+    try:
+        entries = [entry for entry in os.scandir(_result_cache_dir()) if entry.name.endswith('.json')]
+    except FileNotFoundError:
+        return None
+    if not entries:
+        return None
+    latest = max(entries, key=lambda entry: entry.stat().st_mtime)
+    try:
+        with open(latest.path, encoding='utf-8') as f:
+            result = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[WARNING] 処理結果のキャッシュを読み込めませんでした ({latest.path}): {e}")
+        return None
+    return result if isinstance(result, dict) else None
+
+
+def _store_cached_result(key: str, result: Dict) -> None:
+    directory = _result_cache_dir()
+    with _result_cache_lock:
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, os.path.join(directory, f"{key}.json"))
+            
+            # 上限を超えた分は使われていない順に削除
+            entries = sorted(
+                (entry for entry in os.scandir(directory) if entry.name.endswith('.json')),
+                key=lambda entry: entry.stat().st_mtime,
+                reverse=True,
+            )
+            for entry in entries[RESULT_CACHE_MAX_ENTRIES:]:
+                os.remove(entry.path)
+        except OSError as e:
+            print(f"[WARNING] 処理結果のキャッシュを保存できませんでした ({directory}): {e}")
+
+
+def clear_result_cache() -> int:
+    """
+    処理結果のキャッシュをすべて削除する
+    
+    Returns:
+    --------
+    int
+        削除した件数
+    """
+    directory = _result_cache_dir()
+    removed = 0
+    with _result_cache_lock:
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            if entry.name.endswith(('.json', '.tmp')):
+                os.remove(entry.path)
+                removed += 1
+    return removed
+
+
+def process_master_bytes(file_bytes: bytes, suffix: str = '.xlsx', use_cache: bool = True) -> Tuple[Dict, bool]:
+    """
+    アップロードされたマスターファイルの内容を処理する（同じ内容なら前回の結果を再利用）
+    
+    結果はファイル内容の SHA-256 と処理コードの版をキーにディスクへ保存し、
+    RESULT_CACHE_MAX_ENTRIES 件を超えたら使われていない順に削除する。
+    内容が変わったファイルは、最後に使った結果から行の変わっていない期の集計を再利用する。
+    
+    Parameters:
+    -----------
+    file_bytes : bytes
+        マスターファイルの内容
+    suffix : str
+        一時ファイルの拡張子（.xlsm / .xlsx）
+    use_cache : bool
+        Falseの場合はキャッシュを使わずに処理する
+    
+    Returns:
+    --------
+    tuple
+        (process_master_file と同じ形式の結果, キャッシュから返した場合True)
+    """
+    key = result_cache_key(file_bytes) if use_cache else None
+    if key:
+        cached = _load_cached_result(key)
+        if cached is not None:
+            return cached, True
+    
+    # 一時ファイルとして保存して処理
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+        tmp_file.write(file_bytes)
+        tmp_path = tmp_file.name
+    try:
+        result = process_master_file(tmp_path, previous_result=_latest_cached_result() if use_cache else None)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    
+    if key:
+        _store_cached_result(key, result)
+    return result, False
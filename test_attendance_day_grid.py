@@ -0,0 +1,61 @@
+"""AttendanceDayGrid（月別出勤日数の計算）の確認"""
+from datetime import date
+
+import numpy as np
+import pytest
+
+import utils
+from utils import AttendanceDayGrid
+
+
+@pytest.fixture(autouse=True)
+def _business_calendar_in_tmp(tmp_path, monkeypatch):
+    # 営業日テーブルをソースツリーに保存しないよう、保存先とプロセス内のテーブルを差し替える
+    monkeypatch.setenv("BUSINESS_CALENDAR_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(utils, "_BUSINESS_DAY_TABLES", {})
+
+
+def test_business_days_in_a_month():
+    # 2025年11月: 平日20日から文化の日（3日）と勤労感謝の日の振替休日（24日）を除く
+    grid = AttendanceDayGrid(2025, 11, 1)
+    assert grid.count_per_month(grid.business).tolist() == [18]
+
+
+def test_grid_across_year_boundary():
+    grid = AttendanceDayGrid(2025, 11, 4)
+    assert grid.months == [(2025, 11), (2025, 12), (2026, 1), (2026, 2)]
+    assert len(grid.days) == 30 + 31 + 31 + 28
+    assert grid.count_per_month(grid.business).tolist() == [18, 23, 20, 18]
+
+
+def test_leave_on_holiday_or_special_day_is_not_subtracted_twice():
+    grid = AttendanceDayGrid(2025, 11, 2)
+    leave = [
+        {
+            date(2025, 11, 3),   # 文化の日（もともと営業日ではない）
+            date(2025, 11, 8),   # 土曜日
+            date(2025, 11, 4),   # 特休日と重なる
+            date(2025, 11, 5),
+            date(2025, 12, 1),
+        },
+        set(),
+    ]
+    special = np.array(["2025-11-04", "2025-12-26"], dtype="datetime64[D]")
+    counts = grid.presumed_attendance_days(leave, special)
+    assert counts.tolist() == [[18 - 2, 23 - 2], [18 - 1, 23 - 1]]
+
+
+def test_empty_staff_list():
+    grid = AttendanceDayGrid.for_years(2025, 2025)
+    counts = grid.presumed_attendance_days([], [date(2025, 5, 1)])
+    assert counts.shape == (0, 12)
+
+
+def test_dates_outside_the_grid_are_ignored():
+    grid = AttendanceDayGrid(2025, 11, 1)
+    assert grid.presumed_attendance_days([{date(2025, 10, 31), date(2025, 12, 1)}]).tolist() == [[18]]
+
+
+def test_months_must_be_positive():
+    with pytest.raises(ValueError):
+        AttendanceDayGrid(2025, 1, 0)
@@ -0,0 +1,70 @@
+"""年ごとの営業日テーブル（business_day_table など）の確認"""
+import os
+from datetime import date
+
+import pytest
+
+import utils
+from utils import (
+    business_day_table,
+    business_days_in_fiscal_year,
+    business_days_per_month,
+    calculate_fiscal_year,
+    is_business_day,
+    japanese_business_calendar_dates_in_month,
+)
+
+# 2025年の各月の営業日数（土日・国民祝日・振替休日を除く）
+_BUSINESS_DAYS_2025 = [21, 18, 20, 21, 20, 21, 22, 20, 20, 22, 18, 23]
+
+
+@pytest.fixture(autouse=True)
+def _business_calendar_in_tmp(tmp_path, monkeypatch):
+    # 営業日テーブルをソースツリーに保存しないよう、保存先とプロセス内のテーブルを差し替える
+    monkeypatch.setenv("BUSINESS_CALENDAR_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(utils, "_BUSINESS_DAY_TABLES", {})
+    return tmp_path
+
+
+def test_business_days_per_month():
+    assert business_days_per_month(2025).tolist() == _BUSINESS_DAYS_2025
+    assert len(business_day_table(2024)) == 366
+
+
+def test_is_business_day():
+    assert is_business_day(date(2025, 11, 4))
+    assert not is_business_day(date(2025, 11, 3))   # 文化の日
+    assert not is_business_day(date(2025, 11, 24))  # 振替休日
+    assert not is_business_day(date(2025, 11, 8))   # 土曜日
+
+
+def test_dates_in_month_match_table():
+    dates = japanese_business_calendar_dates_in_month(2025, 11)
+    assert len(dates) == 18
+    assert date(2025, 11, 3) not in dates and date(2025, 11, 4) in dates
+
+
+def test_fiscal_year_with_default_start_month():
+    assert calculate_fiscal_year(date(2025, 3, 1)) == 2025
+    assert business_days_in_fiscal_year(2025) == sum(_BUSINESS_DAYS_2025) == 246
+
+
+def test_fiscal_year_starting_in_july(monkeypatch):
+    monkeypatch.setattr(utils, "FISCAL_YEAR_START_MONTH", 7)
+    assert calculate_fiscal_year(date(2026, 6, 30)) == 2025
+    assert calculate_fiscal_year(date(2026, 7, 1)) == 2026
+    # 2025年7月〜2026年6月
+    expected = sum(_BUSINESS_DAYS_2025[6:]) + sum(business_days_per_month(2026).tolist()[:6])
+    assert business_days_in_fiscal_year(2025) == expected == 245
+
+
+def test_table_is_saved_and_reloaded(_business_calendar_in_tmp, monkeypatch):
+    table = business_day_table(2025)
+    saved = [name for name in os.listdir(_business_calendar_in_tmp) if name.startswith("2025_")]
+    assert len(saved) == 1
+
+    monkeypatch.setattr(utils, "_BUSINESS_DAY_TABLES", {})
+    monkeypatch.setattr(utils, "_build_business_day_table", lambda year: pytest.fail("ディスクから読み込まれていない"))
+    assert (business_day_table(2025) == table).all()
+    with pytest.raises(ValueError):
+        business_day_table(2025)[0] = False
@@ -0,0 +1,35 @@
+"""_coalesce_duplicate_event_columns の確認（正規化後に同名になる列のマージ）"""
+import pandas as pd
+
+from database import _coalesce_duplicate_event_columns
+
+
+def test_all_empty_duplicate_columns():
+    df = pd.DataFrame({
+        "event_id": ["e1", "e2", "e3"],
+        "end_date": [None, "", float("nan")],
+        "end_date |": ["nan", " ", None],
+        "| end_date": [float("nan"), "NaN", ""],
+    })
+    result = _coalesce_duplicate_event_columns(df)
+    assert list(result.columns) == ["event_id", "end_date"]
+    assert result["event_id"].tolist() == ["e1", "e2", "e3"]
+    assert result["end_date"].tolist() == ["", "", ""]
+
+
+def test_whitespace_only_cells_fall_back_to_alias():
+    df = pd.DataFrame({
+        "end_date": ["  ", "\t", "2025-01-03 "],
+        "end_date |": [" 2025-01-01", "2025-01-02", "2025-01-09"],
+    })
+    assert _coalesce_duplicate_event_columns(df)["end_date"].tolist() == ["2025-01-01", "2025-01-02", "2025-01-03"]
+
+
+def test_nan_mixed_with_strings():
+    df = pd.DataFrame({
+        "end_date": [float("nan"), "2025-02-01", None, "nan", 20250203],
+        "end_date |": ["2025-02-05", float("nan"), "x", None, "y"],
+    })
+    assert _coalesce_duplicate_event_columns(df)["end_date"].tolist() == [
+        "2025-02-05", "2025-02-01", "x", "", "20250203",
+    ]
@@ -0,0 +1,61 @@
+"""build_staff_full_day_leave_dates_from_logs の確認"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from utils import build_staff_full_day_leave_dates_from_logs
+
+
+def _logs(rows):
+    """(date, staff_name, start_time, end_time) の行から勤怠ログを作る（date は read_attendance_logs と同じく datetime 型）"""
+    df = pd.DataFrame(rows, columns=["date", "staff_name", "start_time", "end_time"])
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    return df
+
+
+def test_full_day_rows_grouped_by_staff():
+    df = _logs([
+        ("2025-04-01", "田中", "08:30", "17:00"),
+        ("2025-04-02", "田中", "8:30", "17:0"),        # 0 埋めなしも 08:30〜17:00
+        ("2025-04-03", " 田中 ", " 08:30 ", "17:00 "),  # 前後の空白は除く
+        ("2025-04-01", "佐藤", "08:30", "17:00"),
+        ("2025-04-01", "佐藤", "08:30", "17:00"),      # 同じ日は1つ
+    ])
+    assert build_staff_full_day_leave_dates_from_logs(df) == {
+        "田中": {date(2025, 4, 1), date(2025, 4, 2), date(2025, 4, 3)},
+        "佐藤": {date(2025, 4, 1)},
+    }
+
+
+def test_partial_and_unparsable_times_are_skipped():
+    df = _logs([
+        ("2025-04-01", "田中", "09:00", "17:00"),
+        ("2025-04-02", "田中", "08:30", "12:00"),
+        ("2025-04-03", "田中", "08:30", "17:00:00"),
+        ("2025-04-04", "田中", "08:3", "17:00"),
+        ("2025-04-05", "田中", np.nan, "17:00"),
+        ("2025-04-06", "田中", "08:30", None),
+        ("2025-04-07", "田中", "nan", "NaN"),
+        ("2025-04-08", "田中", "08:30", "17:00"),
+    ])
+    assert build_staff_full_day_leave_dates_from_logs(df) == {"田中": {date(2025, 4, 8)}}
+
+
+def test_blank_staff_and_missing_date_are_skipped():
+    df = _logs([
+        ("2025-04-01", "", "08:30", "17:00"),
+        ("2025-04-01", "   ", "08:30", "17:00"),
+        ("2025-04-01", None, "08:30", "17:00"),
+        (None, "田中", "08:30", "17:00"),
+        ("不明", "田中", "08:30", "17:00"),
+        ("2025-04-09", "鈴木", "08:30", "17:00"),
+    ])
+    assert build_staff_full_day_leave_dates_from_logs(df) == {"鈴木": {date(2025, 4, 9)}}
+
+
+def test_empty_or_missing_columns():
+    assert build_staff_full_day_leave_dates_from_logs(None) == {}
+    assert build_staff_full_day_leave_dates_from_logs(pd.DataFrame()) == {}
+    assert build_staff_full_day_leave_dates_from_logs(pd.DataFrame({"date": [pd.Timestamp("2025-04-01")]})) == {}
+    assert build_staff_full_day_leave_dates_from_logs(_logs([("2025-04-01", "田中", "09:00", "12:00")])) == {}
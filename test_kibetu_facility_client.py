@@ -0,0 +1,115 @@
+"""施設名の一括正規化（normalize_facility_names）をスタブのクライアントで確認する"""
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import kibetu_list
+from kibetu_list import normalize_facility_names
+
+# ローカルの施設名リストでは判定できず、API に送られる施設名
+_NAMES = ["県立中武病院", "大阪市立総合医療センター", "東部医療センター"]
+# スタブの API が沖縄県内と判定する施設名 → 返す標準名
+_OKINAWA = {"県立中武病院": "沖縄県立中部病院"}
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class StubClient:
+    """
+    chat.completions.create だけを持つ OpenAI クライアントの代わり。
+    batch_reply / single_reply に渡した関数で応答本文（文字列）を作り、呼び出しを記録する。
+    """
+
+    def __init__(self, batch_reply=None, single_reply=None, failures=0):
+        self.batch_reply = batch_reply or _batch_reply
+        self.single_reply = single_reply or _single_reply
+        self.failures = failures
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        if self.failures:
+            self.failures -= 1
+            self.calls.append(("error", None))
+            raise RateLimitError("429 Rate limit reached")
+        if "入力施設名: " in prompt:
+            name = prompt.split("入力施設名: ", 1)[1].split("\n", 1)[0]
+            self.calls.append(("single", name))
+            content = self.single_reply(name)
+        else:
+            names = json.loads(prompt[prompt.rindex("["):prompt.rindex("]") + 1])
+            self.calls.append(("batch", names))
+            content = self.batch_reply(names)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def _judge(name):
+    return {"is_okinawa": name in _OKINAWA, "normalized_name": _OKINAWA.get(name, "")}
+
+
+def _batch_reply(names):
+    return json.dumps({"results": [dict(index=i, **_judge(n)) for i, n in enumerate(names)]}, ensure_ascii=False)
+
+
+def _single_reply(name):
+    return json.dumps(dict(original=name, **_judge(name)), ensure_ascii=False)
+
+
+# API の標準名はローカルの施設名リストの表記（県立中部病院）に揃う
+_EXPECTED = {"県立中武病院": "県立中部病院", "大阪市立総合医療センター": "大阪市立総合医療センター", "東部医療センター": "東部医療センター"}
+
+
+@pytest.fixture(autouse=True)
+def _no_retry_wait(monkeypatch):
+    monkeypatch.setattr(kibetu_list, "FACILITY_RETRY_BASE_DELAY", 0.0)
+
+
+def test_successful_batch_uses_one_call():
+    client = StubClient()
+    cache = {}
+    assert normalize_facility_names(_NAMES + [_NAMES[0], "", None], client=client, cache=cache) == _EXPECTED
+    assert [kind for kind, _ in client.calls] == ["batch"]
+    assert client.calls[0][1] == _NAMES
+    assert cache == _EXPECTED
+
+    # キャッシュ済みの施設名は API に送らない
+    normalize_facility_names(_NAMES, client=client, cache=cache)
+    assert len(client.calls) == 1
+
+
+def test_locally_matched_names_are_not_sent():
+    client = StubClient()
+    result = normalize_facility_names(["沖縄県立中部病院", "大阪市立総合医療センター"], client=client, cache={})
+    assert result == {"沖縄県立中部病院": "県立中部病院", "大阪市立総合医療センター": "大阪市立総合医療センター"}
+    assert client.calls == [("batch", ["大阪市立総合医療センター"])]
+
+
+def test_malformed_json_falls_back_to_single_requests():
+    client = StubClient(batch_reply=lambda names: "results: これはJSONではありません")
+    assert normalize_facility_names(_NAMES, client=client, cache={}) == _EXPECTED
+    assert client.calls == [("batch", _NAMES)] + [("single", name) for name in _NAMES]
+
+
+def test_missing_items_are_retried_one_by_one():
+    def partial_reply(names):
+        return json.dumps({"results": [dict(index=0, **_judge(names[0]))]}, ensure_ascii=False)
+
+    client = StubClient(batch_reply=partial_reply)
+    assert normalize_facility_names(_NAMES, client=client, cache={}) == _EXPECTED
+    assert client.calls == [("batch", _NAMES)] + [("single", name) for name in _NAMES[1:]]
+
+
+def test_rate_limit_is_retried():
+    client = StubClient(failures=2)
+    assert normalize_facility_names(_NAMES, client=client, cache={}) == _EXPECTED
+    assert [kind for kind, _ in client.calls] == ["error", "error", "batch"]
+
+
+def test_batches_are_split_by_batch_size():
+    client = StubClient()
+    normalize_facility_names(_NAMES, client=client, cache={}, batch_size=2, max_workers=1)
+    assert [names for _, names in client.calls] == [_NAMES[:2], _NAMES[2:]]
@@ -0,0 +1,31 @@
+"""施設名のローカル照合（match_okinawa_facility）の確認"""
+import pytest
+
+from kibetu_list import match_okinawa_facility
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("南部医療センター", "南部医療センター"),
+    ("沖縄県立中部病院", "県立中部病院"),
+    ("琉大病院 麻酔科", "琉大病院　麻酔科"),
+    ("琉球大学病院", "琉大病院"),
+    # 1文字の脱落・重複は補う
+    ("南部医療センタ", "南部医療センター"),
+    ("県立八重山病病院", "県立八重山病院"),
+])
+def test_matches_okinawa_facility(name, expected):
+    assert match_okinawa_facility(name) == expected
+
+
+@pytest.mark.parametrize("name", [
+    # 1文字違いの別施設を沖縄県内の施設と判定しない
+    "東部医療センター",
+    "西部医療センター",
+    "北部医療センター",
+    "県立東部医療センター",
+    "沖縄県立西部医療センター",
+    "大阪市立総合医療センター",
+    "",
+])
+def test_does_not_match_other_facilities(name):
+    assert match_okinawa_facility(name) is None
@@ -5,20 +5,31 @@
 from __future__ import annotations
 
 import calendar
-from collections import defaultdict
-from datetime import date, datetime
+import os
+import tempfile
+from datetime import date, datetime, timedelta
 from functools import lru_cache
-from typing import Dict, Set, Tuple
+from importlib import metadata
+from typing import Dict, Iterable, Sequence, Set, Tuple
 
 import jpholiday
+import numpy as np
 
 # この日以降の残業・代休だけを積立・残高に計上する（それ以前は「その他」申請で管理）
 COMPENSATORY_LEAVE_EFFECTIVE_DATE = date(2026, 7, 1)
 
+# 年度の開始月（1 = 1月〜12月を1年度とする）
+FISCAL_YEAR_START_MONTH = 1
+
+# 年ごとの営業日テーブルの保存先（環境変数 BUSINESS_CALENDAR_CACHE_DIR で変更可）
+DEFAULT_BUSINESS_CALENDAR_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "business_calendar"
+)
+
 
 def calculate_fiscal_year(target_date: date) -> int:
     """
-    日付から年度を計算（1月1日〜12月31日を1年度とする）
+    日付から年度を計算（FISCAL_YEAR_START_MONTH 月1日から1年間を1年度とする。既定は1月1日〜12月31日）
     
     Args:
         target_date: 対象日付
@@ -34,8 +45,10 @@ def calculate_fiscal_year(target_date: date) -> int:
         >>> calculate_fiscal_year(date(2026, 6, 15))
         2026
     """
-    # 1月〜12月をそのまま年度とする
-    return target_date.year
+    # 開始月以降はその年、開始月より前は前年の年度（開始月が1月なら暦年と同じ）
+    if target_date.month >= FISCAL_YEAR_START_MONTH:
+        return target_date.year
+    return target_date.year - 1
 
 
 def calculate_duration_hours(start_time: str, end_time: str) -> float:
@@ -132,21 +145,117 @@ def parse_time_string(time_str: str) -> Tuple[int, int]:
         return 0, 0
 
 
-@lru_cache(maxsize=120)
+_BUSINESS_DAY_TABLES: dict[int, np.ndarray] = {}
+
+
+@lru_cache(maxsize=1)
+def _jpholiday_version() -> str:
+    try:
+        return metadata.version("jpholiday")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def _business_calendar_cache_path(year: int) -> str:
+    directory = os.getenv("BUSINESS_CALENDAR_CACHE_DIR") or DEFAULT_BUSINESS_CALENDAR_CACHE_DIR
+    # 祝日法の改正は jpholiday の更新で入るため、版ごとに別ファイルにする
+    return os.path.join(directory, f"{year}_jpholiday-{_jpholiday_version()}.npy")
+
+
+def _days_in_year(year: int) -> int:
+    return 366 if calendar.isleap(year) else 365
+
+
+def _build_business_day_table(year: int) -> np.ndarray:
+    first = date(year, 1, 1)
+    days = np.arange(_days_in_year(year), dtype=np.int64)
+    # 1月1日の曜日から各日の曜日（月曜=0）を求める
+    table = (days + first.weekday()) % 7 < 5
+    holidays = [(d - first).days for d, _name in jpholiday.between(first, date(year, 12, 31))]
+    table[holidays] = False
+    return table
+
+
+def _load_business_day_table(path: str, n_days: int) -> np.ndarray | None:
+    try:
+        packed = np.load(path, allow_pickle=False)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"[WARNING] 営業日テーブルを読み込めませんでした ({path}): {e}")
+        return None
+    if packed.dtype != np.uint8 or packed.shape != ((n_days + 7) // 8,):
+        return None
+    return np.unpackbits(packed, count=n_days).astype(bool)
+
+
+def _store_business_day_table(path: str, table: np.ndarray) -> None:
+    directory = os.path.dirname(path)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, np.packbits(table), allow_pickle=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"[WARNING] 営業日テーブルを保存できませんでした ({directory}): {e}")
+
+
+def business_day_table(year: int) -> np.ndarray:
+    """
+    指定年の営業日テーブル（1月1日から順に、土日・国民祝日・振替休日以外なら True の bool 配列）。
+    年ごとに初回だけ作り、プロセス内とディスク（ビット列）に保存して使い回す。読み取り専用。
+    """
+    table = _BUSINESS_DAY_TABLES.get(year)
+    if table is None:
+        path = _business_calendar_cache_path(year)
+        table = _load_business_day_table(path, _days_in_year(year))
+        if table is None:
+            table = _build_business_day_table(year)
+            _store_business_day_table(path, table)
+        table.setflags(write=False)
+        _BUSINESS_DAY_TABLES[year] = table
+    return table
+
+
+def is_business_day(target_date: date) -> bool:
+    """土日・国民祝日・振替休日以外の日か。"""
+    offset = target_date.toordinal() - date(target_date.year, 1, 1).toordinal()
+    return bool(business_day_table(target_date.year)[offset])
+
+
+@lru_cache(maxsize=None)
+def _month_offsets(year: int) -> np.ndarray:
+    """各月1日の、1月1日からの日数。"""
+    offsets = np.array([date(year, m, 1).toordinal() for m in range(1, 13)], dtype=np.int64)
+    offsets -= offsets[0]
+    offsets.setflags(write=False)
+    return offsets
+
+
+def business_days_per_month(year: int) -> np.ndarray:
+    """1月〜12月の営業日数（長さ12の整数配列）。"""
+    return np.add.reduceat(business_day_table(year), _month_offsets(year), dtype=np.int64)
+
+
+def business_days_in_fiscal_year(fiscal_year: int) -> int:
+    """calculate_fiscal_year と同じ区切り（FISCAL_YEAR_START_MONTH 始まり）の年度の営業日数。"""
+    start = FISCAL_YEAR_START_MONTH - 1
+    count = int(business_days_per_month(fiscal_year)[start:].sum())
+    if start:
+        count += int(business_days_per_month(fiscal_year + 1)[:start].sum())
+    return count
+
+
 def japanese_business_calendar_dates_in_month(year: int, month: int) -> frozenset[date]:
     """
     指定月について、土日および国民祝日・振替休日を除いた日の集合（出勤ベースの暦算用）。
     """
     _, last_day = calendar.monthrange(year, month)
-    bucket: list[date] = []
-    for day in range(1, last_day + 1):
-        d = date(year, month, day)
-        if d.weekday() >= 5:
-            continue
-        if jpholiday.is_holiday(d):
-            continue
-        bucket.append(d)
-    return frozenset(bucket)
+    offset = int(_month_offsets(year)[month - 1])
+    first = date(year, month, 1)
+    in_month = np.flatnonzero(business_day_table(year)[offset:offset + last_day])
+    return frozenset(first + timedelta(days=int(i)) for i in in_month)
 
 
 def count_presumed_attendance_days_in_month(
@@ -159,13 +268,79 @@ def count_presumed_attendance_days_in_month(
     return len(workdays - full_day_leave_dates)
 
 
+class AttendanceDayGrid:
+    """
+    連続する月の期間を1日1要素のブール配列で表し、出勤可能日数を月ごとにまとめて数える。
+    営業日（business_day_table）、特休日、職員×日の終日休暇を配列で持ち、
+    月の区切りで np.add.reduceat して職員×月の表を一度に求める。複数年の期間にも使える。
+    """
+
+    def __init__(self, first_year: int, first_month: int, months: int):
+        if months < 1:
+            raise ValueError("months は1以上を指定してください")
+        index = first_year * 12 + first_month - 1
+        self.months: list[tuple[int, int]] = [
+            ((index + i) // 12, (index + i) % 12 + 1) for i in range(months)
+        ]
+        bounds = [date(y, m, 1) for y, m in self.months]
+        end_index = index + months
+        bounds.append(date(end_index // 12, end_index % 12 + 1, 1))
+
+        self.start = bounds[0]
+        self._origin = np.datetime64(self.start, "D")
+        self.days = np.arange(self._origin, np.datetime64(bounds[-1], "D"), dtype="datetime64[D]")
+        self.month_offsets = np.array(
+            [(np.datetime64(b, "D") - self._origin).astype(np.int64) for b in bounds[:-1]], dtype=np.int64
+        )
+
+        # 年ごとの営業日テーブルをつないで期間分を切り出す
+        last = bounds[-1] - timedelta(days=1)
+        tables = np.concatenate([business_day_table(y) for y in range(self.start.year, last.year + 1)])
+        head = self.start.toordinal() - date(self.start.year, 1, 1).toordinal()
+        self.business = tables[head:head + len(self.days)].copy()
+
+    @classmethod
+    def for_years(cls, first_year: int, last_year: int) -> "AttendanceDayGrid":
+        """first_year 1月〜last_year 12月（暦年）の期間。"""
+        return cls(first_year, 1, (last_year - first_year + 1) * 12)
+
+    def day_mask(self, dates: Iterable) -> np.ndarray:
+        """dates（date / datetime64 の列）のうち期間内の日を True にした配列。"""
+        mask = np.zeros(len(self.days), dtype=bool)
+        if not isinstance(dates, np.ndarray):
+            dates = list(dates)
+        values = np.asarray(dates, dtype="datetime64[D]")
+        if values.size:
+            offsets = (values - self._origin).astype(np.int64)
+            mask[offsets[(offsets >= 0) & (offsets < len(self.days))]] = True
+        return mask
+
+    def count_per_month(self, mask: np.ndarray) -> np.ndarray:
+        """日ごとの配列（最後の軸が日）を月ごとの日数にする。"""
+        return np.add.reduceat(mask, self.month_offsets, axis=-1, dtype=np.int64)
+
+    def presumed_attendance_days(
+        self,
+        leave_dates_by_staff: Sequence[Iterable],
+        special_holiday_days: Iterable = (),
+    ) -> np.ndarray:
+        """
+        職員ごとに、営業日から終日休暇と特休日を除いた出勤可能日数を月別に返す。
+        戻り値は (職員数, 月数) の整数配列（行は leave_dates_by_staff の順）。
+        """
+        available = self.business & ~self.day_mask(special_holiday_days)
+        leave = np.zeros((len(leave_dates_by_staff), len(self.days)), dtype=bool)
+        for row, dates in enumerate(leave_dates_by_staff):
+            leave[row] = self.day_mask(dates)
+        return self.count_per_month(available & ~leave)
+
+
 def build_staff_full_day_leave_dates_from_logs(df_logs) -> Dict[str, Set[date]]:
     """
     勤怠ログのうち、アプリが「1日休み」と同様に登録される 08:30〜17:00 の記録を職員別の日付集合にまとめる。
     """
     import pandas as pd
 
-    out: dict[str, set[date]] = defaultdict(set)
     if df_logs is None or getattr(df_logs, "empty", True):
         return {}
 
@@ -173,43 +348,36 @@ def build_staff_full_day_leave_dates_from_logs(df_logs) -> Dict[str, Set[date]]:
     if not needed <= set(df_logs.columns):
         return {}
 
-    for _, row in df_logs.iterrows():
-        st_raw = row.get("start_time", "")
-        et_raw = row.get("end_time", "")
-        if pd.isna(st_raw) or pd.isna(et_raw):
-            continue
-        st = str(st_raw).strip()
-        et = str(et_raw).strip()
-        if st.lower() == "nan" or et.lower() == "nan":
-            continue
-
-        try:
-            t_st = datetime.strptime(st, "%H:%M").time()
-            t_et = datetime.strptime(et, "%H:%M").time()
-        except (ValueError, TypeError):
-            continue
-
-        if (
-            t_st.hour != 8
-            or t_st.minute != 30
-            or t_et.hour != 17
-            or t_et.minute != 0
-        ):
-            continue
-
-        ds = pd.to_datetime(row.get("date"), errors="coerce")
-        if pd.isna(ds):
-            continue
-        dt = ds.date()
-
-        staff = row.get("staff_name", "")
-        if pd.isna(staff):
-            continue
-        name = str(staff).strip()
-        if name:
-            out[name].add(dt)
-
-    return dict(out)
+    present = (
+        df_logs["start_time"].notna()
+        & df_logs["end_time"].notna()
+        & df_logs["staff_name"].notna()
+    )
+    rows = df_logs.loc[present, ["date", "staff_name", "start_time", "end_time"]]
+    if rows.empty:
+        return {}
+
+    full_day = _clock_matches(rows["start_time"], 8, 30) & _clock_matches(rows["end_time"], 17, 0)
+    rows = rows[full_day]
+    # date 列は read_attendance_logs で datetime 型（変換できない値は NaT）になっている
+    dates = rows["date"]
+    names = rows["staff_name"].astype(str).str.strip()
+    keep = dates.notna() & (names != "")
+    if not keep.any():
+        return {}
+
+    dates = pd.Series(dates[keep].dt.date, dtype=object)
+    out: dict[str, set[date]] = {}
+    for name, group in dates.groupby(names[keep], sort=False):
+        out[name] = set(group.tolist())
+    return out
+
+
+def _clock_matches(values, hour: int, minute: int):
+    """時刻列（HH:MM）が hour:minute と一致するか。解析は重複を除いた値ごとに1回だけ行う。"""
+    text = values.astype(str).str.strip()
+    hits = {v: parse_time_string(v) == (hour, minute) for v in text.unique()}
+    return text.map(hits).astype(bool)
 
 
 def format_time_string(hour: int, minute: int) -> str:
@@ -232,6 +400,146 @@ def format_time_string(hour: int, minute: int) -> str:
     return f"{hour:02d}:{minute:02d}"
 
 
+_COMPENSATORY_BALANCE_FIELDS = [
+    "overtime_hours",
+    "comp_taken_hours",
+    "balance_hours",
+    "overtime_days_earned",
+    "comp_taken_days",
+    "balance_days",
+    "pending_hours",
+]
+
+
+def _round2(series):
+    """Python の round() と同じ丸め（2桁）を要素ごとに適用する。"""
+    return series.map(lambda v: round(float(v), 2))
+
+
+def _compensatory_balances_from_frames(df_ot, df_att, exclude_event_ids: list[str] | None = None):
+    """
+    overtime_logs / attendance_logs の DataFrame から全職員の代休残高を計算する。
+    read_overtime_logs / read_attendance_logs が返す型付け済みの DataFrame を前提に、
+    staff_name ごとの groupby で集計する。
+    """
+    import pandas as pd
+
+    cutoff = pd.Timestamp(COMPENSATORY_LEAVE_EFFECTIVE_DATE)
+    empty = pd.Series(dtype=float)
+
+    def _staff_key(df):
+        if "staff_name" in df.columns:
+            # category のままだと未出現の職員も groupby に現れるため文字列に戻す
+            return df["staff_name"].astype(str)
+        return pd.Series([""] * len(df), index=df.index)
+
+    def _effective(df):
+        if "date" in df.columns:
+            return df["date"].notna() & (df["date"] >= cutoff)
+        return pd.Series([True] * len(df), index=df.index)
+
+    # overtime_logs（適用日以降の日付のみ）
+    approved_by_staff = empty
+    pending_by_staff = empty
+    if df_ot is not None and not df_ot.empty and "overtime_hours" in df_ot.columns:
+        staff_ot = _staff_key(df_ot)
+        hours = df_ot["overtime_hours"].fillna(0.0)
+        status = (
+            df_ot["approved"]
+            if "approved" in df_ot.columns
+            else pd.Series([""] * len(df_ot), index=df_ot.index)
+        )
+        effective = _effective(df_ot)
+        approved_mask = effective & (status == "approved")
+        pending_mask = effective & (status == "pending")
+        approved_by_staff = hours[approved_mask].groupby(staff_ot[approved_mask]).sum()
+        pending_by_staff = hours[pending_mask].groupby(staff_ot[pending_mask]).sum()
+
+    # 代休取得（attendance_logs 側に type="代休" として記録される、適用日以降のみ）
+    comp_by_staff = empty
+    if df_att is not None and not df_att.empty:
+        staff_att = _staff_key(df_att)
+        leave_type = (
+            df_att["type"].astype(str)
+            if "type" in df_att.columns
+            else pd.Series([""] * len(df_att), index=df_att.index)
+        )
+        mask_comp = (leave_type == "代休") & _effective(df_att)
+        exclude_set = {
+            str(x).strip()
+            for x in (exclude_event_ids or [])
+            if x is not None and str(x).strip() and str(x).strip().lower() not in ("nan", "none")
+        }
+        if exclude_set and "event_id" in df_att.columns:
+            mask_comp = mask_comp & ~df_att["event_id"].isin(exclude_set)
+
+        staff_comp = staff_att[mask_comp]
+        day_equivalent = None
+        if "day_equivalent" in df_att.columns:
+            day_equivalent = df_att["day_equivalent"].fillna(0.0)[mask_comp]
+
+        if "duration_hours" in df_att.columns:
+            duration = df_att["duration_hours"].fillna(0.0)[mask_comp]
+            # 時間が未入力（0以下）の行は日数換算から時間を補う
+            missing_hours = duration.isna() | (duration <= 0)
+            comp_by_staff = duration.where(~missing_hours, 0.0).groupby(staff_comp).sum()
+            if day_equivalent is not None:
+                missing_days = day_equivalent.where(missing_hours, 0.0).groupby(staff_comp).sum()
+                comp_by_staff = comp_by_staff + _round2(missing_days * COMPENSATORY_HOURS_PER_DAY)
+        elif day_equivalent is not None:
+            comp_by_staff = _round2(day_equivalent.groupby(staff_comp).sum() * COMPENSATORY_HOURS_PER_DAY)
+
+    names = approved_by_staff.index.union(pending_by_staff.index).union(comp_by_staff.index)
+    overtime_hours = _round2(approved_by_staff.reindex(names, fill_value=0.0).astype(float))
+    pending_hours = _round2(pending_by_staff.reindex(names, fill_value=0.0).astype(float))
+    comp_taken_hours = _round2(comp_by_staff.reindex(names, fill_value=0.0).astype(float))
+    balance_hours = _round2(overtime_hours - comp_taken_hours)
+
+    result = pd.DataFrame(
+        {
+            "overtime_hours": overtime_hours,
+            "comp_taken_hours": comp_taken_hours,
+            "balance_hours": balance_hours,
+            "overtime_days_earned": _round2(overtime_hours / COMPENSATORY_HOURS_PER_DAY),
+            "comp_taken_days": _round2(comp_taken_hours / COMPENSATORY_HOURS_PER_DAY),
+            "balance_days": _round2(balance_hours / COMPENSATORY_HOURS_PER_DAY),
+            "pending_hours": pending_hours,
+        },
+        index=names,
+        columns=_COMPENSATORY_BALANCE_FIELDS,
+    )
+    result.index.name = "staff_name"
+    return result
+
+
+def calculate_compensatory_balances(
+    spreadsheet_id: str,
+    exclude_event_ids: list[str] | None = None,
+):
+    """
+    全職員の代休残高をまとめて計算し、staff_name をインデックスとする DataFrame を返す。
+    列は calculate_compensatory_balance の返り値のキーと同じ。
+    ログに記録の無い職員は行が無い（compensatory_balance_for で 0 として扱う）。
+    """
+    # utils.py は database.py を参照して計算する（依存方向は app.py→utils.py と同じ）
+    from database import read_overtime_logs, read_attendance_logs
+
+    return _compensatory_balances_from_frames(
+        read_overtime_logs(spreadsheet_id),
+        read_attendance_logs(spreadsheet_id),
+        exclude_event_ids,
+    )
+
+
+def compensatory_balance_for(balances, staff_name: str) -> dict:
+    """calculate_compensatory_balances の結果から1職員分の残高を dict で取り出す。"""
+    staff_name = str(staff_name).strip()
+    if staff_name in balances.index:
+        row = balances.loc[staff_name]
+        return {field: float(row[field]) for field in _COMPENSATORY_BALANCE_FIELDS}
+    return {field: 0.0 for field in _COMPENSATORY_BALANCE_FIELDS}
+
+
 def calculate_compensatory_balance(
     spreadsheet_id: str,
     staff_name: str,
@@ -243,6 +551,9 @@ def calculate_compensatory_balance(
 
     COMPENSATORY_LEAVE_EFFECTIVE_DATE 以降の残業・代休取得のみを集計する。
     残高は時間（h）ベースで直接計算する（日数換算の丸め誤差を避ける）。
+    全職員分を calculate_compensatory_balances で計算し、該当職員の行を返す。
+    複数職員を表示する場合は calculate_compensatory_balances を1回呼んで
+    compensatory_balance_for で取り出すこと。
 
     返り値：
     {
@@ -255,99 +566,5 @@ def calculate_compensatory_balance(
         "pending_hours": float          # 承認待ちの残業時間
     }
     """
-    # utils.py は database.py を参照して計算する（依存方向は app.py→utils.py と同じ）
-    import pandas as pd
-    from database import read_overtime_logs, read_attendance_logs
-
-    df_ot = read_overtime_logs(spreadsheet_id)
-    df_att = read_attendance_logs(spreadsheet_id)
-
-    staff_name = str(staff_name).strip()
-    cutoff = pd.Timestamp(COMPENSATORY_LEAVE_EFFECTIVE_DATE)
-
-    # overtime_logs（適用日以降の日付のみ）
-    overtime_hours_approved = 0.0
-    overtime_hours_pending = 0.0
-    if not df_ot.empty:
-        df_ot = df_ot.copy()
-        # 列が無い場合もあるため安全に変換
-        if "overtime_hours" in df_ot.columns:
-            df_ot["overtime_hours"] = pd.to_numeric(df_ot["overtime_hours"], errors="coerce").fillna(0.0)
-        if "approved" in df_ot.columns:
-            df_ot["approved"] = df_ot["approved"].astype(str).str.strip()
-
-        mask_staff = df_ot.get("staff_name", pd.Series([""] * len(df_ot))).astype(str).str.strip() == staff_name
-        if "date" in df_ot.columns:
-            ot_dates = pd.to_datetime(df_ot["date"], errors="coerce")
-            mask_effective = ot_dates.notna() & (ot_dates >= cutoff)
-        else:
-            mask_effective = pd.Series([True] * len(df_ot), index=df_ot.index)
-
-        approved_mask = mask_staff & mask_effective & (df_ot.get("approved", "").astype(str) == "approved")
-        pending_mask = mask_staff & mask_effective & (df_ot.get("approved", "").astype(str) == "pending")
-
-        overtime_hours_approved = float(df_ot.loc[approved_mask, "overtime_hours"].sum()) if "overtime_hours" in df_ot.columns else 0.0
-        overtime_hours_pending = float(df_ot.loc[pending_mask, "overtime_hours"].sum()) if "overtime_hours" in df_ot.columns else 0.0
-
-    overtime_hours_approved = round(float(overtime_hours_approved), 2)
-    pending_hours = round(overtime_hours_pending, 2)
-
-    # 代休取得（attendance_logs 側に type="代休" として記録される、適用日以降のみ）
-    comp_taken_hours = 0.0
-    if not df_att.empty:
-        df_att = df_att.copy()
-        if "duration_hours" in df_att.columns:
-            df_att["duration_hours"] = pd.to_numeric(df_att["duration_hours"], errors="coerce").fillna(0.0)
-        if "day_equivalent" in df_att.columns:
-            df_att["day_equivalent"] = pd.to_numeric(df_att["day_equivalent"], errors="coerce").fillna(0.0)
-
-        mask_staff = df_att.get("staff_name", pd.Series([""] * len(df_att))).astype(str).str.strip() == staff_name
-        mask_type = df_att.get("type", pd.Series([""] * len(df_att))).astype(str).str.strip() == "代休"
-        if "date" in df_att.columns:
-            att_dates = pd.to_datetime(df_att["date"], errors="coerce")
-            mask_effective_att = att_dates.notna() & (att_dates >= cutoff)
-        else:
-            mask_effective_att = pd.Series([True] * len(df_att), index=df_att.index)
-
-        mask_comp = mask_staff & mask_type & mask_effective_att
-        exclude_set = {
-            str(x).strip()
-            for x in (exclude_event_ids or [])
-            if x is not None and str(x).strip() and str(x).strip().lower() not in ("nan", "none")
-        }
-        if exclude_set and "event_id" in df_att.columns:
-            mask_comp = mask_comp & ~df_att["event_id"].astype(str).str.strip().isin(exclude_set)
-
-        comp_rows = df_att.loc[mask_comp]
-        if not comp_rows.empty:
-            if "duration_hours" in comp_rows.columns:
-                hours_series = comp_rows["duration_hours"]
-                missing_hours = hours_series.isna() | (hours_series <= 0)
-                comp_taken_hours = float(hours_series.loc[~missing_hours].sum())
-                if missing_hours.any() and "day_equivalent" in comp_rows.columns:
-                    comp_taken_hours += float(
-                        compensatory_days_to_hours(
-                            comp_rows.loc[missing_hours, "day_equivalent"].sum()
-                        )
-                    )
-            elif "day_equivalent" in comp_rows.columns:
-                comp_taken_hours = compensatory_days_to_hours(
-                    float(comp_rows["day_equivalent"].sum())
-                )
-
-    comp_taken_hours = round(comp_taken_hours, 2)
-    balance_hours = round(overtime_hours_approved - comp_taken_hours, 2)
-
-    overtime_days_earned = round(overtime_hours_approved / COMPENSATORY_HOURS_PER_DAY, 2)
-    comp_taken_days = round(comp_taken_hours / COMPENSATORY_HOURS_PER_DAY, 2)
-    balance_days = round(balance_hours / COMPENSATORY_HOURS_PER_DAY, 2)
-
-    return {
-        "overtime_hours": overtime_hours_approved,
-        "comp_taken_hours": comp_taken_hours,
-        "balance_hours": balance_hours,
-        "overtime_days_earned": overtime_days_earned,
-        "comp_taken_days": comp_taken_days,
-        "balance_days": balance_days,
-        "pending_hours": pending_hours,
-    }
+    balances = calculate_compensatory_balances(spreadsheet_id, exclude_event_ids)
+    return compensatory_balance_for(balances, staff_name)